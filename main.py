@@ -1,45 +1,75 @@
 import os
+import sys
 import datetime
-from data_fetcher import fetch_stock_data
-from analyzer import StockAnalyzer
-from visualizer import generate_chart
-from utils import save_report
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from stock_analysis_github import StockAnalyzer
+from pipeline import ArtifactCache, Pipeline, Stage
+from reporting import ReportRenderer, ReportTemplate, report_context
 
 # 配置参数
 SYMBOLS = ['AAPL', '000001.SZ', 'TSLA']  # 监控的股票列表
 PERIOD = '1mo'                           # 数据周期
 OUTPUT_DIR = 'charts'                    # 图表输出目录
 REPORT_TEMPLATE = 'reports/template.md'  # 报告模板路径
+REPORT_DIR = 'reports/generated'         # 报告输出目录（含索引页、哈希清单和 changed.txt）
+ARTIFACT_DIR = 'data_cache/artifacts/reports'  # 各阶段产物缓存，行情未变化的股票不再重算
+CHART_DPI = 100
 
 def main():
     # 创建输出目录
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
+
     # 获取当前时间戳
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # 分析每支股票
-    for symbol in SYMBOLS:
-        print(f"Processing {symbol}...")
-        
-        # 获取数据
-        data = fetch_stock_data(symbol, PERIOD)
-        if not data:
-            print(f"Failed to fetch data for {symbol}")
-            continue
-            
-        # 运行分析
-        analyzer = StockAnalyzer(symbol, data)
-        report_data = analyzer.generate_report()
-        
-        # 生成图表
-        chart_path = f"{OUTPUT_DIR}/{symbol}_{timestamp}.png"
-        generate_chart(analyzer.chart_data, chart_path)
-        
-        # 生成报告
-        report_path = f"reports/{symbol}_report_{timestamp}.html"
-        save_report(report_template, report_data, report_path)
-        
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    analyzer = StockAnalyzer()
+
+    def fetch(symbols, inputs):
+        # 批量获取所有股票数据
+        all_data = analyzer.fetch_many(symbols, PERIOD)
+        for symbol, data in all_data.items():
+            if data is None:
+                print(f"Failed to fetch data for {symbol}")
+        return [all_data.get(symbol) for symbol in symbols]
+
+    def indicators(symbols, inputs):
+        # 行情有变化的股票一次算出指标
+        return analyzer.calculate_universe_indicators([item['fetch'] for item in inputs])
+
+    def report(symbol, inputs, period):
+        data = inputs['indicators']
+        chart_path = os.path.join(OUTPUT_DIR, f"{data['symbol']}.png")
+        report = analyzer.generate_report(data, data)
+        report.pop('timestamp', None)  # 生成时间在输出时按本次运行填入，不进入缓存
+        return report_context(report, period=period,
+                              chart_path=os.path.relpath(chart_path, REPORT_DIR).replace(os.sep, '/'))
+
+    def chart(symbols, inputs, dpi):
+        items = [(item['indicators'], item['indicators'], os.path.join(OUTPUT_DIR, f"{item['indicators']['symbol']}.png"))
+                 for item in inputs]
+        saved = set(analyzer.plot_many_charts(items, dpi=dpi))
+        return [path if path in saved else None for _, _, path in items]
+
+    # 行情内容、参数都未变化的阶段直接使用上次的产物（周末和节假日几乎不做计算）
+    pipeline = Pipeline([
+        Stage('fetch', fetch, batch=True, volatile=True),
+        Stage('indicators', indicators, deps=('fetch',), batch=True, version='2'),
+        Stage('report', report, deps=('indicators',), params={'period': PERIOD}),
+        Stage('chart', chart, deps=('indicators',), batch=True, params={'dpi': CHART_DPI},
+              valid=os.path.exists),
+    ], ArtifactCache(ARTIFACT_DIR))
+    outputs = pipeline.run(SYMBOLS)
+    removed = pipeline.cache.prune(outputs.artifacts())
+    print(f"Stages: {outputs.stats}, stale artifacts removed: {removed}")
+
+    # 模板只编译一次；一次渲染全部报告和索引页，输入未变化的文件跳过
+    renderer = ReportRenderer(ReportTemplate.from_file(REPORT_TEMPLATE), REPORT_DIR)
+    contexts = [{**outputs.value('report', symbol), 'timestamp': timestamp}
+                for symbol in SYMBOLS if outputs.key('report', symbol) is not None]
+    stats = renderer.render_all(contexts)
+    print(f"Reports written: {len(stats.written)}, unchanged: {stats.skipped}")
     print("Analysis completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+离线基准测试 - fetch → indicators → report → chart 各阶段耗时与峰值内存，以及命令行启动耗时
+
+全部使用模拟行情和本地桩数据源，不访问 yfinance/AkShare。
+结果写入 JSON，可与保存的基线比较，超过阈值的退化返回非零退出码。
+安装了 TA-Lib 时同时测量两个指标后端，并检查两者结果的一致性（超出容差同样返回非零退出码）。
+
+用法:
+    python scripts/benchmark.py                          # 默认规模
+    python scripts/benchmark.py --symbols 10,100 --bars 250,1000
+    python scripts/benchmark.py --save-baseline          # 更新基线
+    python scripts/benchmark.py --baseline benchmarks/baseline.json --threshold 0.25
+    python scripts/benchmark.py --backends numpy,talib --parity-tolerance 1e-8
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas as pd
+
+from backtest import parameter_grid, run_backtest, sweep
+from comparison import RollingComparison
+from data_store import OHLCVStore
+from fetch_pool import ConcurrentFetcher, SourceLimits
+from indicators import _load_talib, compute_frame, compute_universe, make_backend
+from parallel import analyze_panel
+from resample import resample_many
+from simulation import simulate_market
+from stock_analysis_github import StockAnalyzer
+
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results.json')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+
+class StubProvider:
+    """本地桩数据源：按区间切片预先生成的模拟行情，可模拟网络延迟"""
+
+    def __init__(self, market, latency=0.0):
+        self.frames = {symbol: market.frame(i) for i, symbol in enumerate(market.symbols)}
+        self.latency = latency
+        self.calls = 0
+
+    def fetch_range(self, symbol):
+        def fetch(start, end):
+            self.calls += 1
+            if self.latency:
+                time.sleep(self.latency)
+            df = self.frames[symbol]
+            return df[(df['date'] >= start) & (df['date'] <= end)]
+        return fetch
+
+
+def measure(func, repeat=1):
+    """返回 (最短耗时秒数, 峰值内存 MB, 结果)；内存单独跑一次以免 tracemalloc 影响计时"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024 / 1024, result
+
+
+def available_backends(names):
+    """可用的指标后端；未安装 TA-Lib 时跳过 talib"""
+    return [make_backend(name) for name in names if name != 'talib' or _load_talib() is not None]
+
+
+def run_parity(n_symbols, n_bars, tolerance):
+    """
+    比较 NumPy 与 TA-Lib 后端的全部指标：一半股票截短（面板左侧补 NaN），一只股票中间停牌一天。
+    返回每列的 {最大相对误差, NaN 位置是否一致}
+    """
+    market = simulate_market(n_symbols, n_bars, seed=7)
+    frames = [market.frame(i).iloc[(i % 2) * n_bars // 3:].reset_index(drop=True) for i in range(n_symbols)]
+    frames[0].loc[n_bars // 2, ['open', 'high', 'low', 'close']] = np.nan
+    expected, actual = (compute_universe(frames, backend=name) for name in ('numpy', 'talib'))
+    report = {}
+    for name in expected[0].columns:
+        x = np.concatenate([table[name].to_numpy() for table in expected])
+        y = np.concatenate([table[name].to_numpy() for table in actual])
+        same_nan = bool((np.isnan(x) == np.isnan(y)).all())
+        both = ~np.isnan(x) & ~np.isnan(y)
+        error = float(np.max(np.abs(x[both] - y[both]) / np.maximum(np.abs(x[both]), 1.0), initial=0.0))
+        report[name] = {'max_rel_error': error, 'same_nan': same_nan, 'ok': same_nan and error <= tolerance}
+        print(f"  {name:<22} {error:>12.2e} {'✅' if report[name]['ok'] else '❌'}")
+    return report
+
+
+def run_case(n_symbols, n_bars, n_charts, repeat, latency, processes=2, backends=()):
+    """对一个 (股票数, K线数) 组合测量全部阶段"""
+    market = simulate_market(n_symbols, n_bars, seed=42)
+    start, end = pd.Timestamp(market.dates[0]), pd.Timestamp(market.dates[-1])
+    analyzer = StockAnalyzer(cache_dir=None)
+    stubs = StubProvider(market, latency)
+    results = []
+
+    def record(stage, func, stage_repeat=repeat):
+        seconds, peak_mb, value = measure(func, stage_repeat)
+        results.append({'stage': stage, 'symbols': n_symbols, 'bars': n_bars,
+                        'seconds': round(seconds, 6), 'peak_mb': round(peak_mb, 3)})
+        print(f"  {stage:<22} {n_symbols:>6} x {n_bars:<6} {seconds * 1000:>10.1f} ms {peak_mb:>9.1f} MB")
+        return value
+
+    # fetch：冷缓存经桩数据源并发拉取，再测热缓存读取
+    cache_dir = tempfile.mkdtemp(prefix='bench_cache_')
+    try:
+        store = OHLCVStore(cache_dir)
+        fetcher = ConcurrentFetcher({'stub': SourceLimits(max_concurrency=16)})
+
+        def fetch_all():
+            return fetcher.fetch_many(
+                market.symbols,
+                lambda symbol: store.get_or_fetch('stub', symbol, start, end, stubs.fetch_range(symbol)),
+                source_of=lambda symbol: 'stub')
+
+        def cold_fetch():
+            store.clear()
+            return fetch_all()
+
+        record('fetch_cold', cold_fetch, 1)
+        frames = list(record('fetch_warm', fetch_all).values())
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    stock_data = market.to_stock_data()
+
+    record('indicators_per_symbol', lambda: [analyzer.calculate_technical_indicators(d['data'].copy())
+                                             for d in stock_data])
+    record('indicators_panel', lambda: compute_universe(frames))
+    for backend in backends:
+        # 单只股票逐个计算（technical_analysis 的路径）与整个面板一次计算
+        record(f'indicators_frame_{backend.name}', lambda: [compute_frame(df, backend=backend) for df in frames])
+        record(f'indicators_panel_{backend.name}', lambda: compute_universe(frames, backend=backend))
+    closes = [d['data']['close'].to_numpy(dtype=float) for d in stock_data]
+    record('rsi', lambda: [analyzer._calculate_rsi(c, 14) for c in closes])
+
+    close_panel = market.close.astype(np.float64)
+    record('backtest', lambda: run_backtest(close_panel, 'ma_cross', fast=5, slow=20))
+    grid = parameter_grid(fast=[5, 10], slow=[20, 50])
+    record('backtest_sweep', lambda: sweep(close_panel, 'ma_cross', grid), 1)
+
+    returns = np.full_like(close_panel, np.nan)
+    returns[:, 1:] = close_panel[:, 1:] / close_panel[:, :-1] - 1
+    window = min(252, n_bars - 1)
+    comparison = record('correlation_fit', lambda: RollingComparison(market.symbols, window).fit(returns[:, :-1]))
+    record('correlation_update', lambda: comparison.update(returns[:, -1]), 1)
+    record('correlation_matrix', comparison.correlation)
+
+    series = market.to_series()
+    record('indicators_series', lambda: analyzer.calculate_universe_indicators(series))
+    record('resample_weekly', lambda: resample_many(series, 'W'))
+    if processes > 1:
+        record('indicators_shared', lambda: analyze_panel(close_panel, market.volume, processes), 1)
+
+    indicator_frames = [analyzer.calculate_technical_indicators(d['data'].copy()) for d in stock_data]
+    record('report', lambda: [analyzer.generate_report(d, ind) for d, ind in zip(stock_data, indicator_frames)])
+    record('report_series', lambda: [analyzer.generate_report(s, s) for s in series])
+
+    if n_charts:
+        chart_dir = tempfile.mkdtemp(prefix='bench_charts_')
+        try:
+            items = [(d, ind, os.path.join(chart_dir, f"{d['symbol']}.png"))
+                     for d, ind in list(zip(stock_data, indicator_frames))[:n_charts]]
+            record('chart', lambda: analyzer.plot_many_charts(items), 1)
+        finally:
+            shutil.rmtree(chart_dir, ignore_errors=True)
+
+    return results
+
+
+STARTUP_COMMANDS = {
+    'startup_cli_help': [os.path.join('src', 'main.py'), '--help'],
+    'startup_import_src': ['-c', 'import sys; sys.path.insert(0, "src"); '
+                                 'import data_fetcher, analyzer, visualizer'],
+}
+
+
+def run_startup(repeat, details=False):
+    """测量命令行启动/导入耗时（子进程，取最短）"""
+    results = []
+    for stage, args in STARTUP_COMMANDS.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=ROOT, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - start)
+        results.append({'stage': stage, 'symbols': 0, 'bars': 0,
+                        'seconds': round(best, 6), 'peak_mb': 0.0})
+        print(f"  {stage:<22} {'-':>6}   {'-':<6} {best * 1000:>10.1f} ms")
+
+        if details:
+            # -X importtime 输出各模块的累计导入耗时，列出最慢的几个
+            proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            rows = []
+            for line in proc.stderr.splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    rows.append((int(parts[1]), parts[2].strip()))
+            for cumulative, module in sorted(rows, reverse=True)[:10]:
+                print(f"      {cumulative / 1000:>8.1f} ms  {module}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基线逐项比较，返回退化的条目"""
+    index = {(r['stage'], r['symbols'], r['bars']): r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        base = index.get((r['stage'], r['symbols'], r['bars']))
+        if not base or base['seconds'] <= 0:
+            continue
+        ratio = r['seconds'] / base['seconds']
+        if ratio > 1 + threshold:
+            regressions.append({**r, 'baseline_seconds': base['seconds'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(x) for x in text.split(',') if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='股票分析流水线离线基准测试')
+    parser.add_argument('--symbols', default='10,100', help='股票数，逗号分隔')
+    parser.add_argument('--bars', default='250,1000', help='K线数，逗号分隔')
+    parser.add_argument('--charts', type=int, default=2, help='每个组合渲染的图表数，0 表示跳过')
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数（取最短）')
+    parser.add_argument('--latency', type=float, default=0.0, help='桩数据源每次请求的模拟延迟（秒）')
+    parser.add_argument('--processes', type=int, default=2, help='共享内存并行指标阶段的进程数，1 表示跳过')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='结果 JSON 路径')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线 JSON 路径')
+    parser.add_argument('--threshold', type=float, default=0.25, help='允许的耗时增长比例')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--skip-startup', action='store_true', help='跳过启动/导入耗时测量')
+    parser.add_argument('--import-details', action='store_true', help='列出导入最慢的模块')
+    parser.add_argument('--backends', default='numpy,talib', help='分别测量的指标后端，逗号分隔（未安装 TA-Lib 时跳过）')
+    parser.add_argument('--parity-tolerance', type=float, default=1e-8, help='两个指标后端允许的最大相对误差')
+    args = parser.parse_args()
+    backends = available_backends([name.strip() for name in args.backends.split(',') if name.strip()])
+
+    results = []
+    if not args.skip_startup:
+        print("▶ 启动耗时")
+        results.extend(run_startup(args.repeat, args.import_details))
+    for n_symbols in parse_sizes(args.symbols):
+        for n_bars in parse_sizes(args.bars):
+            print(f"▶ {n_symbols} 只 × {n_bars} 根K线")
+            results.extend(run_case(n_symbols, n_bars, args.charts, args.repeat, args.latency, args.processes,
+                                    backends))
+
+    parity = None
+    if _load_talib() is not None:
+        print("▶ 指标后端一致性（NumPy vs TA-Lib，最大相对误差）")
+        parity = run_parity(20, 500, args.parity_tolerance)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'talib': getattr(_load_talib(), '__version__', None),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    if parity is not None:
+        report['parity'] = parity
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📄 结果已写入 {args.output}")
+
+    if parity is not None and not all(entry['ok'] for entry in parity.values()):
+        print(f"❌ 指标后端结果不一致（容差 {args.parity_tolerance:g}）")
+        return 1
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        shutil.copyfile(args.output, args.baseline)
+        print(f"📌 基线已更新 {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} 项超过阈值 {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"   {r['stage']} {r['symbols']}x{r['bars']}: "
+                      f"{r['baseline_seconds']:.4f}s → {r['seconds']:.4f}s (×{r['ratio']})")
+            return 1
+        print("✅ 未发现性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+复权 - 只保存不复权行情和复权因子，前/后复权序列按需换算并缓存
+
+A股行情以不复权（adjust=""）取得并缓存在 OHLCVStore 中；复权因子表（除权除息日 →
+累计后复权因子）每只股票一次请求即覆盖全部历史，按 ttl 定期刷新。
+后复权价 = 不复权价 × 当日因子，前复权价 = 后复权价 / 最新因子：因子按日期
+searchsorted 后整列相乘，两种复权方式都不需要再向上游请求行情。
+
+后复权结果缓存在 store 中（interval 为 adjust_hfq），meta 记录所依据的因子表。
+新的除权除息只改变其日期及之后的后复权价，因此只从最早变化的日期（或最后一根
+缓存K线）起重新换算，之前的行原样保留；前复权只是再除以一个标量。
+
+用法:
+    adjustments = AdjustmentCache(store, registry)
+    df = adjustments.adjusted(source, '600519', 'qfq', start, end)
+    df = adjustments.adjust_frame(source, key, df, 'hfq')    # 对已取得的不复权表换算
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_sources import SourceUnavailable
+
+logger = logging.getLogger(__name__)
+
+ADJUST_MODES = ('none', 'qfq', 'hfq')
+ADJUSTED_COLUMNS = ('open', 'high', 'low', 'close')
+FACTOR_INTERVAL = 'adjust_factor'
+HFQ_INTERVAL = 'adjust_hfq'
+DEFAULT_TTL = 24 * 3600  # 除权除息公告后当天即可生效，因子每天刷新一次
+DEFAULT_FAILURE_TTL = 300  # 因子请求失败后 5 分钟内不再重试
+
+
+def normalize_mode(mode):
+    """'none'/'qfq'/'hfq'；None 和 ''（AkShare 的写法）视为不复权"""
+    mode = (mode or 'none').lower()
+    if mode not in ADJUST_MODES:
+        raise ValueError(f"不支持的复权方式: {mode}")
+    return mode
+
+
+def factors_at(factor_dates, factors, dates):
+    """每个日期适用的累计因子：该日及之前最后一次除权的因子，第一次除权之前为 1"""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    if not len(factors):
+        return np.ones(len(dates))
+    idx = np.searchsorted(factor_dates, dates, side='right') - 1
+    return np.where(idx >= 0, factors[np.maximum(idx, 0)], 1.0)
+
+
+def apply_factors(df, factor_dates, factors, mode):
+    """不复权表 → mode 复权表（价格列乘以因子，成交量不变）"""
+    mode = normalize_mode(mode)
+    if mode == 'none' or not len(factors):
+        return df
+    scale = factors_at(factor_dates, factors, df['date'].to_numpy(dtype='datetime64[ns]'))
+    out = df.copy()
+    for name in ADJUSTED_COLUMNS:
+        out[name] = df[name].to_numpy(dtype=np.float64) * scale
+        if mode == 'qfq':
+            out[name] /= factors[-1]
+    return out
+
+
+def first_change(old, new):
+    """两张因子表 (日期, 因子) 第一个给出不同因子的日期；完全一致时返回 None"""
+    dates = np.union1d(old[0], new[0])
+    differ = np.flatnonzero(factors_at(*old, dates) != factors_at(*new, dates))
+    return dates[differ[0]] if len(differ) else None
+
+
+def _to_meta(table, prefix=''):
+    dates, factors = table
+    return {f'{prefix}dates': [pd.Timestamp(d).isoformat() for d in dates],
+            f'{prefix}factors': [float(f) for f in factors]}
+
+
+def _from_meta(meta, prefix=''):
+    if meta is None or f'{prefix}dates' not in meta:
+        return None
+    return (pd.to_datetime(meta[f'{prefix}dates']).to_numpy(dtype='datetime64[ns]'),
+            np.asarray(meta[f'{prefix}factors'], dtype=np.float64))
+
+
+class AdjustmentCache:
+    """
+    复权因子和后复权序列的缓存。store=None 时因子只在内存中缓存，
+    复权结果每次由不复权表直接换算。因子从未取得过且请求失败时抛 SourceUnavailable
+    （不静默返回不复权价格），失败在 failure_ttl 内不再重试
+    """
+
+    def __init__(self, store, registry, ttl=DEFAULT_TTL, failure_ttl=DEFAULT_FAILURE_TTL):
+        self.store = store
+        self.registry = registry
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._tables = {}    # {(数据源, 代码): ((日期, 因子), 获取时间)}
+        self._failures = {}  # {(数据源, 代码): 失败时间}
+        self._lock = threading.Lock()
+
+    def factors(self, source, key):
+        """
+        (日期, 因子) 数组。超过 ttl 时重新请求；请求失败时沿用旧表，
+        从未取得过时抛 SourceUnavailable
+        """
+        with self._lock:
+            entry = self._tables.get((source.name, key))
+            failed_at = self._failures.get((source.name, key))
+        if entry is None and self.store is not None:
+            meta = self.store.read_meta(source.name, key, FACTOR_INTERVAL)
+            table = _from_meta(meta)
+            entry = (table, meta['fetched_at']) if table is not None else None
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            return entry[0]
+        if failed_at is not None and time.monotonic() - failed_at < self.failure_ttl:
+            if entry is not None:
+                return entry[0]
+            raise SourceUnavailable(f"{source.name}:{key} 复权因子暂不可用（{self.failure_ttl}s 内请求失败过）")
+
+        try:
+            df = self.registry.call_factors(source, key)
+        except SourceUnavailable as e:
+            with self._lock:
+                self._failures[(source.name, key)] = time.monotonic()
+            if entry is not None:
+                logger.warning(f"{e}，沿用已缓存的复权因子")
+                return entry[0]
+            raise SourceUnavailable(f"{source.name}:{key} 复权因子不可用，无法复权: {e}") from e
+        with self._lock:
+            self._failures.pop((source.name, key), None)
+        df = df.dropna().sort_values('date')
+        table = (df['date'].to_numpy(dtype='datetime64[ns]'), df['factor'].to_numpy(dtype=np.float64))
+        fetched_at = time.time()
+        if self.store is not None:
+            self.store.update_meta(source.name, key, FACTOR_INTERVAL, fetched_at=fetched_at, **_to_meta(table))
+        with self._lock:
+            self._tables[(source.name, key)] = (table, fetched_at)
+        return table
+
+    def adjusted(self, source, key, mode, start=None, end=None):
+        """
+        store 中缓存的 [start, end] 日K线按 mode 复权；无缓存时返回 None。
+        数据源不提供复权因子（如 yfinance 已是复权价）时返回原表；
+        需要复权但取不到因子时抛 SourceUnavailable
+        """
+        mode = normalize_mode(mode)
+        bars = self.store.read(source.name, key)
+        if bars is None or bars.empty:
+            return None
+        if mode != 'none' and source.adjusts:
+            table = self.factors(source, key)
+            if len(table[1]):
+                bars = self._backward(source.name, key, bars, table)
+                if mode == 'qfq':
+                    bars = bars.copy()
+                    for name in ADJUSTED_COLUMNS:
+                        bars[name] /= table[1][-1]
+        if start is not None:
+            bars = bars[bars['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            bars = bars[bars['date'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+        return bars.reset_index(drop=True)
+
+    def adjust_frame(self, source, key, df, mode):
+        """已取得的不复权表 df 换算为 mode 复权（日期范围与 df 相同）；取不到因子时抛 SourceUnavailable"""
+        mode = normalize_mode(mode)
+        if mode == 'none' or not source.adjusts or df is None or df.empty:
+            return df
+        if self.store is None:
+            return apply_factors(df, *self.factors(source, key), mode)
+        bars = self.adjusted(source, key, mode, df['date'].iloc[0], df['date'].iloc[-1])
+        return df if bars is None else bars
+
+    def _backward(self, name, key, raw, table):
+        """后复权序列：沿用缓存中未受影响的行，只换算最早变化之后的部分"""
+        dates = raw['date'].to_numpy(dtype='datetime64[ns]')
+        applied = _from_meta(self.store.read_meta(name, key, HFQ_INTERVAL), 'factor_')
+        cached = self.store.read(name, key, interval=HFQ_INTERVAL) if applied is not None else None
+        rebuild = None
+        if cached is not None and len(cached):
+            cached_dates = cached['date'].to_numpy(dtype='datetime64[ns]')
+            if len(cached_dates) <= len(dates) and np.array_equal(cached_dates, dates[:len(cached_dates)]):
+                # 最后一根缓存K线可能是当天未收盘时的数据，总是重新换算
+                rebuild = cached_dates[-1]
+                changed = first_change(applied, table)
+                if changed is not None:
+                    rebuild = min(rebuild, changed)
+        if rebuild is None:
+            # 无缓存，或不复权历史被补齐/修正：全部重算
+            cached = None
+            rebuild = dates[0]
+            self.store.clear(name, key, HFQ_INTERVAL)
+
+        keep = cached[cached['date'] < rebuild] if cached is not None else raw.iloc[:0]
+        tail = apply_factors(raw[raw['date'] >= rebuild], *table, 'hfq')
+        bars = pd.concat([keep, tail], ignore_index=True)
+        if cached is not None and len(cached) == len(bars) and all(
+                np.array_equal(cached[column].to_numpy()[len(keep):], tail[column].to_numpy())
+                for column in ADJUSTED_COLUMNS + ('volume',)):
+            return bars  # 没有新K线，最后一根也未变化
+        logger.info(f"{name}:{key} 后复权换算 {len(tail)}/{len(bars)} 行（自 {pd.Timestamp(rebuild).date()}）")
+        # 与缓存日期相同的行以新换算的为准
+        self.store.append(name, key, tail, HFQ_INTERVAL)
+        self.store.update_meta(name, key, HFQ_INTERVAL, **_to_meta(table, 'factor_'))
+        return bars
@@ -8,8 +8,15 @@ import logging
 from dataclasses import dataclass
 from typing import Dict, Any
 
+from instrumentation import count, stage
+from indicators import EXTENDED_COLUMNS, compute_frame, compute_universe, rsi as wilder_rsi
+from screener import ANALYSIS_RULES, Screener, ScreenPanel, recommendation_from, signals_from
+
 logger = logging.getLogger(__name__)
 
+# 简化分析使用的均线窗口
+SIMPLE_MA_WINDOWS = (20, 50)
+
 @dataclass
 class AnalysisResult:
     """分析结果"""
@@ -22,23 +29,23 @@ class AnalysisResult:
 class StockAnalyzer:
     """股票分析器 - 简化版本"""
     
-    def __init__(self):
+    def __init__(self, rules=ANALYSIS_RULES):
         self.indicators = {}
+        # 信号和建议由筛选引擎的规则给出
+        self.screener = Screener(rules)
         
     def technical_analysis(self, df, symbol):
         """技术分析 - 简化版本"""
         logger.info(f"分析 {symbol}")
         
-        try:
-            # 尝试使用 TA-Lib
-            import talib
-            indicators = self._calculate_with_talib(df)
-        except ImportError:
-            logger.warning("TA-Lib 不可用，使用简化分析")
-            indicators = self._calculate_simple_indicators(df)
-        
-        signals = self._generate_signals(indicators)
-        recommendation, confidence = self._generate_recommendation(signals)
+        with stage('analyze', symbol, rows=len(df)):
+            # 指标由 indicators 模块启动时选定的后端（TA-Lib 或 NumPy）计算
+            table = compute_frame(self._to_lower(df), ma_windows=SIMPLE_MA_WINDOWS)
+            indicators = self._simple_indicators_from_table(table)
+            
+            evaluation = self._evaluate([symbol], [df], [table])
+            signals = self._generate_signals(evaluation, 0)
+            recommendation, confidence = self._generate_recommendation(evaluation, 0)
         
         return AnalysisResult(
             symbol=symbol,
@@ -48,33 +55,84 @@ class StockAnalyzer:
             confidence=confidence
         )
     
+    def technical_analysis_many(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, AnalysisResult]:
+        """批量技术分析 - 所有股票拼成一个面板后一次计算指标"""
+        symbols = [symbol for symbol, df in frames.items() if df is not None]
+        # 整个面板一次计算，耗时只能按阶段统计，行数按股票记录
+        with stage('analyze'):
+            tables = compute_universe([self._to_lower(frames[symbol]) for symbol in symbols],
+                                      ma_windows=SIMPLE_MA_WINDOWS)
+            evaluation = self._evaluate(symbols, [frames[symbol] for symbol in symbols], tables)
+        results = {}
+        for i, (symbol, table) in enumerate(zip(symbols, tables)):
+            logger.info(f"分析 {symbol}")
+            count('analyze', symbol, rows=len(table))
+            indicators = self._simple_indicators_from_table(table)
+            signals = self._generate_signals(evaluation, i)
+            recommendation, confidence = self._generate_recommendation(evaluation, i)
+            results[symbol] = AnalysisResult(
+                symbol=symbol,
+                indicators=indicators,
+                signals=signals,
+                recommendation=recommendation,
+                confidence=confidence
+            )
+        return results
+    
     def _calculate_simple_indicators(self, df):
         """计算简化指标"""
-        close = df['Close']
-        
-        return {
-            'sma_20': close.rolling(20).mean(),
-            'sma_50': close.rolling(50).mean(),
-            'rsi': self._calculate_rsi(close),
-            'volume_sma': df['Volume'].rolling(20).mean()
+        return self._simple_indicators_from_table(
+            compute_frame(self._to_lower(df), ma_windows=SIMPLE_MA_WINDOWS))
+    
+    @staticmethod
+    def _to_lower(df):
+        return df.rename(columns={'Close': 'close', 'Volume': 'volume', 'High': 'high', 'Low': 'low'})
+    
+    @staticmethod
+    def _simple_indicators_from_table(table):
+        indicators = {
+            'sma_20': table['MA20'],
+            'sma_50': table['MA50'],
+            'rsi': table['RSI'],
+            'volume_sma': table['Volume_MA20']
         }
+        # 有最高/最低价时附带 ATR、KDJ、OBV、StochRSI
+        indicators.update({name.lower(): table[name] for name in EXTENDED_COLUMNS if name in table})
+        return indicators
     
     def _calculate_rsi(self, prices, window=14):
-        """计算RSI"""
-        delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
+        """计算RSI（Wilder 平滑，与 indicators 引擎一致）"""
+        values = wilder_rsi(prices.to_numpy(dtype=float)[None, :], window)[0]
+        return pd.Series(values, index=prices.index)
     
-    def _generate_signals(self, indicators):
-        """生成信号"""
-        return {
-            'trend': '上升' if len(indicators) > 0 else '未知',
-            'momentum': '中性'
-        }
+    def screen(self, frames: Dict[str, pd.DataFrame], rules=None, mode='any', min_score=None, top=None):
+        """
+        全市场筛选：所有股票拼成面板后对规则一次求值，返回按得分排序的结果表。
+        rules 默认使用分析规则，均线窗口与 technical_analysis 相同。
+        """
+        screener = Screener(rules, mode, min_score) if rules is not None else Screener(self.screener.rules, mode, min_score)
+        with stage('screen', rows=len(frames)):
+            panel = ScreenPanel.from_frames(frames, tail=screener.tail, ma_windows=self._ma_windows(screener.rules))
+            return screener.screen(panel, top=top)
+    
+    @staticmethod
+    def _ma_windows(rules):
+        """规则中引用的 MAn 列加上默认窗口"""
+        windows = set(SIMPLE_MA_WINDOWS)
+        for rule in rules:
+            for value in vars(rule).values():
+                if isinstance(value, str) and value.startswith('MA') and value[2:].isdigit():
+                    windows.add(int(value[2:]))
+        return tuple(sorted(windows))
+    
+    def _evaluate(self, symbols, frames, tables):
+        panel = ScreenPanel.from_tables(symbols, frames, tables, tail=self.screener.tail)
+        return self.screener.evaluate(panel)
+    
+    def _generate_signals(self, evaluation, i):
+        """生成信号（筛选引擎的规则匹配结果）"""
+        return signals_from(evaluation, i)
     
-    def _generate_recommendation(self, signals):
-        """生成建议"""
-        return '持有', 0.7
+    def _generate_recommendation(self, evaluation, i):
+        """生成建议（规则加权得分）"""
+        return recommendation_from(evaluation.score[i])
@@ -0,0 +1,223 @@
+"""
+向量化回测 - 对 (股票数 × K线数) 面板一次算出全部股票的持仓、收益、回撤和胜率
+
+策略把指标转换为目标持仓（1 持有 / 0 空仓 / -1 做空），信号在当根K线收盘产生、
+下一根K线开始持有，避免使用未来数据。全部计算是数组运算，没有逐K线的 Python 循环。
+参数网格可分发到进程池，每个工作进程只接收一次价格面板并缓存算过的指标。
+
+用法:
+    table = run_backtest(close, 'ma_cross', fast=5, slow=20, symbols=symbols)
+    grid = parameter_grid(fast=[5, 10], slow=[20, 50, 100])
+    ranking = sweep(close, 'ma_cross', grid, processes=8)
+"""
+
+import itertools
+import logging
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from indicators import ewm_mean, rolling_mean, rsi
+
+logger = logging.getLogger(__name__)
+
+PERIODS_PER_YEAR = 252
+DEFAULT_COST = 0.0005  # 单边交易成本（换手 1 倍时扣除的比例）
+_CACHE_LIMIT = 32
+
+METRIC_COLUMNS = ('total_return', 'annual_return', 'sharpe', 'max_drawdown',
+                  'hit_rate', 'trades', 'exposure')
+
+
+def _forward_fill(values):
+    """沿最后一轴向前填充 NaN（开头的 NaN 保持不变）"""
+    idx = np.where(np.isnan(values), 0, np.arange(values.shape[-1]))
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    return np.take_along_axis(values, idx, axis=-1)
+
+
+def _cached(cache, key, func):
+    """进程内指标缓存；超过上限时丢弃最早的项，避免大面板占满内存"""
+    if cache is None:
+        return func()
+    if key not in cache:
+        if len(cache) >= _CACHE_LIMIT:
+            cache.pop(next(iter(cache)))
+        cache[key] = func()
+    return cache[key]
+
+
+def ma_cross_positions(close, fast=5, slow=20, allow_short=False, cache=None):
+    """快线在慢线之上持有，之下空仓（allow_short 时做空）"""
+    if fast >= slow:
+        return np.zeros_like(close)
+    ma_fast = _cached(cache, ('ma', fast), lambda: rolling_mean(close, fast))
+    ma_slow = _cached(cache, ('ma', slow), lambda: rolling_mean(close, slow))
+    with np.errstate(invalid='ignore'):
+        position = (ma_fast > ma_slow).astype(np.float64)
+        if allow_short:
+            position -= ma_fast < ma_slow
+    return position
+
+
+def rsi_positions(close, period=14, lower=30, upper=70, allow_short=False, cache=None):
+    """RSI 低于 lower 买入，高于 upper 卖出（allow_short 时转为做空），之间保持原持仓"""
+    values = _cached(cache, ('rsi', period), lambda: rsi(close, period))
+    with np.errstate(invalid='ignore'):
+        events = np.where(values < lower, 1.0, np.where(values > upper, -1.0 if allow_short else 0.0, np.nan))
+    return np.nan_to_num(_forward_fill(events))
+
+
+def macd_positions(close, fast=12, slow=26, signal=9, allow_short=False, cache=None):
+    """MACD 柱状图为正时持有，为负时空仓（allow_short 时做空）"""
+    if fast >= slow:
+        return np.zeros_like(close)
+
+    def histogram():
+        macd = (_cached(cache, ('ema', fast), lambda: ewm_mean(close, fast))
+                - _cached(cache, ('ema', slow), lambda: ewm_mean(close, slow)))
+        return macd - ewm_mean(macd, signal)
+
+    hist = _cached(cache, ('macd', fast, slow, signal), histogram)
+    with np.errstate(invalid='ignore'):
+        position = (hist > 0).astype(np.float64)
+        if allow_short:
+            position -= hist < 0
+    return position
+
+
+STRATEGIES = {
+    'ma_cross': ma_cross_positions,
+    'rsi': rsi_positions,
+    'macd': macd_positions,
+}
+
+
+def evaluate_positions(close, position, cost=DEFAULT_COST, periods_per_year=PERIODS_PER_YEAR):
+    """
+    由目标持仓面板计算每只股票的绩效，返回 {指标名: (股票数,) 数组}。
+    hit_rate 为盈利交易占比；一笔交易是从建仓到平仓或反手之间的连续持仓。
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    n_symbols, n_bars = close.shape
+    valid = ~np.isnan(close)
+
+    returns = np.zeros_like(close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+    returns[~np.isfinite(returns)] = 0.0
+
+    # 收盘产生的信号从下一根K线开始持有
+    held = np.zeros_like(close)
+    held[:, 1:] = np.nan_to_num(np.asarray(position, dtype=np.float64))[:, :-1]
+    held[~valid] = 0.0
+    prev = np.zeros_like(held)
+    prev[:, 1:] = held[:, :-1]
+    strategy = held * returns - cost * np.abs(held - prev)
+
+    equity = np.cumprod(1 + strategy, axis=1)
+    total_return = equity[:, -1] - 1
+    bars = np.maximum(valid.sum(axis=1), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        annual_return = np.power(np.maximum(1 + total_return, 0), periods_per_year / bars) - 1
+        mean = strategy.sum(axis=1) / bars
+        var = ((strategy - mean[:, None]) ** 2 * valid).sum(axis=1) / np.maximum(bars - 1, 1)
+        sharpe = np.where(var > 0, mean / np.sqrt(var) * np.sqrt(periods_per_year), 0.0)
+    max_drawdown = (equity / np.maximum.accumulate(equity, axis=1) - 1).min(axis=1)
+
+    # 逐笔交易：建仓（或反手）处开始新的一笔，按笔汇总对数收益
+    in_position = held != 0
+    entries = in_position & (held != prev)
+    trade_ids = np.cumsum(entries.ravel()) - 1
+    n_trades_total = int(entries.sum())
+    trade_log_return = np.bincount(trade_ids[in_position.ravel()],
+                                   weights=np.log1p(strategy).ravel()[in_position.ravel()],
+                                   minlength=n_trades_total)
+    trade_symbol = np.nonzero(entries)[0]
+    trades = np.bincount(trade_symbol, minlength=n_symbols)
+    wins = np.bincount(trade_symbol, weights=trade_log_return > 0, minlength=n_symbols)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hit_rate = np.where(trades > 0, wins / trades, np.nan)
+
+    return {
+        'total_return': total_return,
+        'annual_return': annual_return,
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+        'hit_rate': hit_rate,
+        'trades': trades,
+        'exposure': in_position.sum(axis=1) / bars,
+    }
+
+
+def run_backtest(close, strategy='ma_cross', symbols=None, cost=DEFAULT_COST, cache=None, **params):
+    """对价格面板回测一个策略，返回每只股票一行的绩效表"""
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    position = STRATEGIES[strategy](close, cache=cache, **params)
+    table = pd.DataFrame(evaluate_positions(close, position, cost), columns=METRIC_COLUMNS)
+    table.insert(0, 'symbol', list(symbols) if symbols is not None else range(len(close)))
+    return table
+
+
+def summarize(metrics):
+    """把每只股票的绩效汇总为一行（胜率按全部交易合并计算）"""
+    trades = metrics['trades'].sum()
+    wins = np.nansum(metrics['hit_rate'] * metrics['trades'])
+    return {
+        'mean_return': float(np.mean(metrics['total_return'])),
+        'median_return': float(np.median(metrics['total_return'])),
+        'mean_sharpe': float(np.mean(metrics['sharpe'])),
+        'mean_max_drawdown': float(np.mean(metrics['max_drawdown'])),
+        'worst_drawdown': float(np.min(metrics['max_drawdown'])),
+        'hit_rate': float(wins / trades) if trades else float('nan'),
+        'trades': int(trades),
+        'exposure': float(np.mean(metrics['exposure'])),
+    }
+
+
+def parameter_grid(**values):
+    """parameter_grid(fast=[5, 10], slow=[20, 50]) -> [{'fast': 5, 'slow': 20}, ...]"""
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(values[name] for name in names))]
+
+
+# ---- 参数扫描（进程池） ----
+
+_worker = {}
+
+
+def _init_sweep(close, strategy, cost, extra):
+    _worker.update(close=close, strategy=strategy, cost=cost, extra=extra, cache={})
+
+
+def _run_combo(params):
+    close = _worker['close']
+    position = STRATEGIES[_worker['strategy']](close, cache=_worker['cache'], **_worker['extra'], **params)
+    return {**params, **summarize(evaluate_positions(close, position, _worker['cost']))}
+
+
+def sweep(close, strategy, grid, processes=None, cost=DEFAULT_COST, sort_by='mean_sharpe', **extra):
+    """
+    对参数网格逐组回测，返回每组参数一行、按 sort_by 降序排列的汇总表。
+    processes=None/1 时在当前进程内运行，否则使用进程池：价格面板在初始化时
+    传给每个工作进程一次，相同窗口的指标在进程内缓存复用。
+    extra 为所有组合共用的策略参数（如 allow_short=True）。
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    grid = list(grid)
+    if not processes or processes <= 1 or len(grid) <= 1:
+        _init_sweep(close, strategy, cost, extra)
+        try:
+            rows = [_run_combo(params) for params in grid]
+        finally:
+            _worker.clear()
+    else:
+        # 按网格顺序分块：相邻组合多共享窗口，进程内缓存命中率更高
+        chunksize = max(1, len(grid) // (processes * 4))
+        with get_context('spawn').Pool(processes, initializer=_init_sweep,
+                                       initargs=(close, strategy, cost, extra)) as pool:
+            rows = pool.map(_run_combo, grid, chunksize=chunksize)
+    logger.info(f"参数扫描完成: {strategy} {len(grid)} 组 × {close.shape[0]} 只")
+    table = pd.DataFrame(rows)
+    return table.sort_values(sort_by, ascending=False, kind='stable').reset_index(drop=True)
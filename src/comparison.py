@@ -0,0 +1,238 @@
+"""
+跨股票比较 - 滚动相关系数、协方差矩阵和相对基准的 beta
+
+收益率按日期对齐成 (股票数, K线数) 面板。RollingComparison 保存窗口内的累加矩阵
+（Σxyᵀ 等），先用分块矩阵乘法一次建立，之后每根新K线只做秩 k 更新（加上新K线、
+减去移出窗口的K线），不重算整个窗口；相关/协方差矩阵按行块输出，临时数组为
+block × 股票数。窗口内有缺失值（停牌、上市较晚）时按两两都有数据的K线计算，
+与 pandas DataFrame.corr(min_periods=...) 相同；没有缺失值时只保存一个 N×N 矩阵。
+
+用法:
+    symbols, dates, returns = returns_panel(frames)            # {symbol: DataFrame/OHLCVSeries}
+    comparison = RollingComparison(symbols, window=60).fit(returns)
+    comparison.update(new_returns)                             # 新K线的收益率（股票数,）或（股票数, k）
+    corr = comparison.correlation()                            # (股票数, 股票数) float32
+    table = comparison.versus('600519')                        # 各股票相对基准的相关系数/协方差/beta
+    corr_ts, cov_ts, beta_ts = rolling_versus(returns, returns[j], window=60)  # 时间序列
+    order = cluster_order(corr)                                # 热力图的聚类排序
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 60
+DEFAULT_BLOCK = 512
+
+
+def _dates_and_close(data):
+    if isinstance(data, pd.DataFrame):
+        data = data.rename(columns=str.lower)
+    return np.asarray(data['date'], dtype='datetime64[ns]'), np.asarray(data['close'], dtype=np.float64)
+
+
+def returns_panel(frames):
+    """
+    {symbol: DataFrame 或 OHLCVSeries} → (symbols, dates, returns)。
+    收盘价按日期并集对齐，returns[:, t] 为第 t 根K线相对上一根的收益率，缺失为 NaN
+    """
+    symbols = [symbol for symbol, data in frames.items() if data is not None]
+    columns = [_dates_and_close(frames[symbol]) for symbol in symbols]
+    dates = np.unique(np.concatenate([d for d, _ in columns])) if columns else np.array([], 'datetime64[ns]')
+    close = np.full((len(symbols), len(dates)), np.nan)
+    for i, (symbol_dates, values) in enumerate(columns):
+        close[i, np.searchsorted(dates, symbol_dates)] = values
+    returns = np.full_like(close, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(close[:, 1:], close[:, :-1], out=returns[:, 1:])
+    returns -= 1.0
+    return symbols, dates, returns
+
+
+def _finish(n, sx, sy, sxx, syy, sxy, min_periods):
+    """由累加量得到 (协方差, x 的方差, y 的方差)，样本数不足 min_periods 的位置为 NaN"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = (sxy - sx * sy / n) / (n - 1)
+        var_x = (sxx - sx * sx / n) / (n - 1)
+        var_y = (syy - sy * sy / n) / (n - 1)
+    short = np.broadcast_to(n < min_periods, cov.shape)
+    cov = np.where(short, np.nan, cov)
+    return cov, var_x, var_y
+
+
+def _correlation(cov, var_x, var_y):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.sqrt(var_x * var_y)
+    return np.clip(corr, -1.0, 1.0, out=corr)
+
+
+class RollingComparison:
+    """窗口内多只股票收益率的两两统计，支持逐根K线增量更新"""
+
+    def __init__(self, symbols, window=DEFAULT_WINDOW, min_periods=None, block=DEFAULT_BLOCK):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.window = window
+        self.min_periods = min_periods or max(2, window // 2)
+        self.block = block
+        n = len(self.symbols)
+        self.buffer = np.full((n, window), np.nan)  # 环形缓冲：窗口内的收益率
+        self.filled = np.zeros(window, dtype=bool)
+        self.head = 0          # 下一根K线写入的位置
+        self.updates = 0       # 上次重建以来的增量更新次数，满一个窗口后重建以消除累计误差
+        self.pairwise = False  # 窗口内有缺失值时按两两都有数据的K线统计
+        self._reset()
+
+    def _reset(self):
+        n = len(self.symbols)
+        self.sxy = np.zeros((n, n))
+        if self.pairwise:
+            self.n, self.sx, self.sxx = np.zeros((n, n)), np.zeros((n, n)), np.zeros((n, n))
+        else:
+            self.n, self.sx, self.sxx = 0, np.zeros(n), np.zeros(n)
+
+    def _blocks(self):
+        n = len(self.symbols)
+        return [(lo, min(lo + self.block, n)) for lo in range(0, n, self.block)]
+
+    def _accumulate(self, x, sign):
+        """把收益率列 x（股票数 × k）加入（sign=1）或移出（sign=-1）累加量"""
+        if not x.shape[1]:
+            return
+        valid = ~np.isnan(x)
+        values = np.where(valid, x, 0.0)
+        update = np.add if sign > 0 else np.subtract
+        products = [(self.sxy, values, values)]
+        if self.pairwise:
+            mask = valid.astype(np.float64)
+            products += [(self.n, mask, mask), (self.sx, values, mask), (self.sxx, values * values, mask)]
+        else:
+            self.n = update(self.n, x.shape[1])
+            update(self.sx, values.sum(axis=1), out=self.sx)
+            update(self.sxx, (values * values).sum(axis=1), out=self.sxx)
+        tmp = np.empty((min(self.block, len(self.symbols)), len(self.symbols)))
+        for target, left, right in products:
+            for lo, hi in self._blocks():
+                part = tmp[:hi - lo]
+                np.matmul(left[lo:hi], right.T, out=part)
+                update(target[lo:hi], part, out=target[lo:hi])
+
+    def _window(self):
+        """窗口内的收益率列（按写入顺序）"""
+        order = (self.head + np.arange(self.window)) % self.window
+        order = order[self.filled[order]]
+        return self.buffer[:, order]
+
+    def _rebuild(self):
+        window = self._window()
+        self.pairwise = bool(np.isnan(window).any())
+        self._reset()
+        self._accumulate(window, 1)
+        self.updates = 0
+
+    def fit(self, returns):
+        """用 returns（股票数 × K线数）的最后 window 根K线建立窗口，返回自身"""
+        returns = np.asarray(returns, dtype=np.float64)[:, -self.window:]
+        k = returns.shape[1]
+        self.buffer[:] = np.nan
+        self.buffer[:, :k] = returns
+        self.filled[:] = False
+        self.filled[:k] = True
+        self.head = k % self.window
+        self._rebuild()
+        return self
+
+    def update(self, returns):
+        """追加新K线的收益率（股票数,）或（股票数, k），移出窗口最早的K线"""
+        x = np.asarray(returns, dtype=np.float64).reshape(len(self.symbols), -1)
+        k = x.shape[1]
+        if k >= self.window:
+            return self.fit(x)
+        positions = (self.head + np.arange(k)) % self.window
+        old = self.buffer[:, positions[self.filled[positions]]]
+        self.buffer[:, positions] = x
+        self.filled[positions] = True
+        self.head = (self.head + k) % self.window
+        self.updates += k
+        if self.updates >= self.window or (not self.pairwise and np.isnan(x).any()):
+            self._rebuild()
+        else:
+            self._accumulate(x, 1)
+            self._accumulate(old, -1)
+        return self
+
+    def _moments(self, rows, cols):
+        """行 rows（x）× 列 cols（y）的 (n, Σx, Σy, Σx², Σy², Σxy)"""
+        if self.pairwise:
+            return (self.n[rows, cols], self.sx[rows, cols], self.sx[cols, rows].T,
+                    self.sxx[rows, cols], self.sxx[cols, rows].T, self.sxy[rows, cols])
+        return (self.n, self.sx[rows][:, None], self.sx[cols][None, :],
+                self.sxx[rows][:, None], self.sxx[cols][None, :], self.sxy[rows, cols])
+
+    def _matrix(self, kind, out, dtype):
+        n = len(self.symbols)
+        if out is None:
+            out = np.empty((n, n), dtype=dtype)
+        for lo, hi in self._blocks():
+            cov, var_x, var_y = _finish(*self._moments(slice(lo, hi), slice(None)), self.min_periods)
+            out[lo:hi] = cov if kind == 'cov' else _correlation(cov, var_x, var_y)
+        return out
+
+    def covariance(self, out=None, dtype=np.float32):
+        """窗口内收益率的协方差矩阵（按行块计算）"""
+        return self._matrix('cov', out, dtype)
+
+    def correlation(self, out=None, dtype=np.float32):
+        """窗口内收益率的相关系数矩阵（按行块计算）"""
+        return self._matrix('corr', out, dtype)
+
+    def versus(self, benchmark):
+        """各股票相对 benchmark 的相关系数、协方差和 beta（cov / 基准方差），返回 DataFrame"""
+        j = self.index[benchmark]
+        cov, var_x, var_y = _finish(*self._moments(slice(None), slice(j, j + 1)), self.min_periods)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            beta = cov / var_y
+        return pd.DataFrame({'correlation': _correlation(cov, var_x, var_y)[:, 0],
+                             'covariance': cov[:, 0], 'beta': beta[:, 0]}, index=self.symbols)
+
+
+def _rolling_sum(x, window):
+    csum = np.cumsum(x, axis=-1)
+    csum[..., window:] = csum[..., window:] - csum[..., :-window]
+    return csum
+
+
+def rolling_versus(returns, benchmark, window=DEFAULT_WINDOW, min_periods=None):
+    """
+    每只股票相对 benchmark 收益率序列的滚动 (相关系数, 协方差, beta)，
+    均为 (股票数, K线数) 数组；按两只都有数据的K线计算，复杂度 O(股票数 × K线数)
+    """
+    x = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    b = np.asarray(benchmark, dtype=np.float64)[None, :]
+    valid = ~np.isnan(x) & ~np.isnan(b)
+    xv, bv = np.where(valid, x, 0.0), np.where(valid, b, 0.0)
+    cov, var_x, var_b = _finish(_rolling_sum(valid.astype(np.float64), window),
+                                _rolling_sum(xv, window), _rolling_sum(bv, window),
+                                _rolling_sum(xv * xv, window), _rolling_sum(bv * bv, window),
+                                _rolling_sum(xv * bv, window), min_periods or max(2, window // 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beta = cov / var_b
+    return _correlation(cov, var_x, var_b), cov, beta
+
+
+def cluster_order(corr, iterations=30, seed=0):
+    """
+    热力图的股票顺序，使相关性高的股票相邻：用子空间迭代（只需矩阵乘法）求相关矩阵
+    前两个特征向量，按各股票载荷的夹角排序
+    """
+    corr = np.nan_to_num(np.asarray(corr, dtype=np.float64))
+    n = len(corr)
+    if n <= 2:
+        return np.arange(n)
+    vectors = np.random.default_rng(seed).standard_normal((n, 2))
+    for _ in range(iterations):
+        vectors, _ = np.linalg.qr(corr @ vectors)
+    return np.argsort(np.arctan2(vectors[:, 1], vectors[:, 0]), kind='stable')
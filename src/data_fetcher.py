@@ -1,40 +1,125 @@
-import yfinance as yf
-import akshare as ak
-
-def fetch_stock_data(symbol, period):
-    try:
-        # 尝试使用yfinance获取国际股票数据
-        ticker = yf.Ticker(symbol)
-        if ticker.history(period=period).empty:
-            raise ValueError("No data found")
-        return ticker.history(period=period).reset_index()
-    
-    except Exception as e:
-        print(f"Error fetching from yfinance: {str(e)}")
-        
+import datetime
+import logging
+
+import pandas as pd
+
+from adjustment import AdjustmentCache, normalize_mode
+from data_sources import SourceUnavailable, default_registry
+from data_store import OHLCVStore, period_to_range
+from fetch_pool import ConcurrentFetcher
+from instrumentation import count, frame_bytes, stage
+from resample import resample_frame, resample_stored
+
+logger = logging.getLogger(__name__)
+
+# 与 stock_analysis_github.StockAnalyzer 共用的本地行情缓存
+store = OHLCVStore()
+
+_OUTPUT_COLUMNS = {'date': 'Date', 'open': 'Open', 'high': 'High',
+                   'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# 数据源注册表：A股代码直接路由到 AkShare，失败的数据源按熔断规则跳过
+sources = default_registry(store)
+
+# A股只缓存不复权行情和复权因子，前/后复权按需换算
+adjustments = AdjustmentCache(store, sources)
+
+
+def _to_output(df):
+    """缓存使用小写列名，对外保持原有的 Date/Open/... 列名"""
+    return df.rename(columns=_OUTPUT_COLUMNS)
+
+
+def _fetch_range_data(symbol, start, end, test_mode=False, adjust='none'):
+    names = ['simulated'] if test_mode else None
+    with stage('fetch', symbol) as record:
         try:
-            # 尝试使用AkShare获取A股数据
-            if symbol.startswith('6'):
-                symbol_ak = f"sh{symbol}"
-            else:
-                symbol_ak = f"sz{symbol}"
-                
-            df = ak.stock_zh_a_hist(
-                symbol=symbol_ak,
-                period="daily",
-                start_date=datetime.datetime.now().strftime("%Y%m%d"),
-                end_date=datetime.datetime.now().strftime("%Y%m%d"),
-                adjust=""
-            )
-            return df.rename(columns={
-                '日期': 'Date',
-                '开盘': 'Open',
-                '最高': 'High',
-                '最低': 'Low',
-                '收盘': 'Close',
-                '成交量': 'Volume'
-            }).sort_values('Date')
-            
-        except Exception as e:
-            print(f"Error fetching from akshare: {str(e)}")
+            source, key, df = sources.fetch(symbol, start, end, names, store)
+            df = adjustments.adjust_frame(source, key, df, adjust)
+        except SourceUnavailable as e:
+            logger.error(str(e))
             return None
+        record.update(rows=len(df), bytes=frame_bytes(df))
+        return _to_output(df)
+
+
+def fetch_stock_data(symbol, period, adjust='none'):
+    start, end = period_to_range(period)
+    return _fetch_range_data(symbol, start, end, adjust=adjust)
+
+
+def _fetch_many_range(symbols, start, end, test_mode=False, fetcher=None, rule=None, adjust='none'):
+    adjust = normalize_mode(adjust)
+    names = ['simulated'] if test_mode else None
+    with stage('fetch'):
+        results = sources.fetch_many(symbols, start, end, names, store, fetcher)
+    # 批量请求无法按股票拆分耗时，只按股票记录行数和字节数
+    for symbol, item in results.items():
+        if item is not None:
+            count('fetch', symbol, rows=len(item[2]), bytes=frame_bytes(item[2]))
+    if adjust != 'none':
+        results = {symbol: _adjusted(item, adjust) for symbol, item in results.items()}
+    if rule is not None:
+        results = {symbol: _resampled(item, rule, start, end, adjust) for symbol, item in results.items()}
+    return {symbol: _to_output(item[2]) if item is not None else None
+            for symbol, item in results.items()}
+
+
+def _adjusted(item, adjust):
+    """不复权日K线按 adjust 换算（复权因子和后复权结果均有缓存）"""
+    if item is None:
+        return None
+    source, key, df = item
+    with stage('adjust', key, rows=len(df)):
+        try:
+            return source, key, adjustments.adjust_frame(source, key, df, adjust)
+        except SourceUnavailable as e:
+            # 不以不复权价格代替：除权缺口会影响指标和回测
+            logger.error(str(e))
+            return None
+
+
+def _resampled(item, rule, start, end, adjust='none'):
+    """
+    由缓存的日K线聚合为 rule 周期的K线（只重算未收盘的周期），不再请求上游；
+    复权后的日K线直接在内存中聚合
+    """
+    if item is None:
+        return None
+    source, key, df = item
+    with stage('resample', key) as record:
+        if adjust != 'none':
+            bars = resample_frame(df, rule)
+        else:
+            bars = resample_stored(store, source.name, key, rule, start, end)
+        record['rows'] = 0 if bars is None else len(bars)
+    return (source, key, bars) if bars is not None and not bars.empty else None
+
+
+def fetch_many_stock_data(symbols, period, fetcher=None, adjust='none'):
+    """批量获取多个代码的数据（按数据源合并请求），返回 {symbol: DataFrame 或 None}"""
+    start, end = period_to_range(period)
+    return _fetch_many_range(symbols, start, end, fetcher=fetcher, adjust=adjust)
+
+
+class DataFetcher:
+    """按天数获取数据，供 src/main.py 使用"""
+
+    def __init__(self, fetcher=None):
+        self.fetcher = fetcher or ConcurrentFetcher()
+
+    def _range(self, days):
+        end = pd.Timestamp.now().normalize()
+        return end - datetime.timedelta(days=days), end
+
+    def get_stock_data(self, symbol, days=30, test_mode=False, adjust='none'):
+        start, end = self._range(days)
+        return _fetch_range_data(symbol, start, end, test_mode, adjust)
+
+    def get_many(self, symbols, days=30, test_mode=False, rule=None, adjust='none'):
+        """
+        批量获取多个代码，返回 {symbol: DataFrame 或 None}；rule（如 'W'、'M'）为周期K线，
+        adjust 为 A股复权方式（'none'、'qfq' 前复权、'hfq' 后复权）
+        """
+        start, end = self._range(days)
+        return _fetch_many_range(symbols, start, end, test_mode, self.fetcher, rule, adjust)
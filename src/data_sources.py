@@ -0,0 +1,659 @@
+"""
+数据源 - 统一接口 + 注册表（超时、有限重试、熔断、按代码路由）
+
+每个数据源实现 fetch_range(symbol, start, end)，返回小写列名的 OHLCV DataFrame。
+SourceRegistry 按代码格式预先决定数据源顺序（A股代码直接走 AkShare），
+对每次调用施加超时和退避重试；连续失败的数据源被熔断一段时间后直接跳过，
+避免失败的上游拖长整次运行。LocalSource 是不联网的替身，便于测试故障切换。
+fetch_many 按数据源分组批量请求，多只股票尽量合并为一次上游调用。
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from datetime import timedelta
+
+import pandas as pd
+
+from data_store import INTRADAY_MINUTES
+from fetch_pool import ConcurrentFetcher
+from simulation import simulate_frame, simulate_intraday_frame
+
+logger = logging.getLogger(__name__)
+
+OHLCV = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+_A_SHARE = re.compile(r'^\d{6}$')
+_HK = re.compile(r'^\d{1,5}$')
+
+# 这些异常说明调用方式或环境有问题（如未安装依赖），重试也不会成功
+_PERMANENT_ERRORS = (ImportError, AttributeError, TypeError, NotImplementedError)
+# 这些异常通常只与该代码有关（无效/退市代码、空结果解析失败），不重试，也不计入数据源的熔断
+_SYMBOL_ERRORS = (KeyError, IndexError, ValueError)
+
+# 超时控制用的共享线程池：上游调用超时后放弃等待，不阻塞调用方
+_call_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='source')
+
+
+class SourceUnavailable(Exception):
+    """所有候选数据源都失败或被熔断"""
+
+
+def split_symbol(symbol):
+    """拆分代码和交易所后缀：'000001.SZ' -> ('000001', 'SZ')"""
+    code, _, suffix = str(symbol).partition('.')
+    return code, suffix.upper()
+
+
+def is_a_share(symbol):
+    code, suffix = split_symbol(symbol)
+    return bool(_A_SHARE.match(code)) and suffix in ('', 'SS', 'SH', 'SZ')
+
+
+@dataclass
+class RetryPolicy:
+    """有限重试：第 k 次重试前等待 min(backoff * 2^k, max_backoff)，加少量随机抖动"""
+    attempts: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 4.0
+    jitter: float = 0.1
+
+    def delay(self, attempt):
+        base = min(self.backoff * (2 ** attempt), self.max_backoff)
+        return base * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后打开，reset_timeout 秒内直接拒绝；
+    之后放行一次试探请求（半开），成功则关闭，失败则重新计时。
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def _empty():
+    return pd.DataFrame(columns=OHLCV)
+
+
+def _format_history(hist):
+    """yfinance 风格的 Date/Open/... 表转换为小写 OHLCV 表"""
+    hist = hist.dropna(how='all')
+    if hist.empty:
+        return _empty()
+    hist = hist.reset_index().rename(columns={'Date': 'date', 'Datetime': 'date', 'Open': 'open', 'High': 'high',
+                                              'Low': 'low', 'Close': 'close', 'Volume': 'volume'})
+    hist['date'] = pd.to_datetime(hist['date']).dt.tz_localize(None)
+    return hist[OHLCV]
+
+
+class DataSource:
+    """
+    数据源基类；子类实现 fetch_range，必要时覆盖 normalize/metadata。
+    batch_size > 0 的数据源还实现 fetch_batch，一次请求最多 batch_size 个代码。
+    """
+
+    name = 'base'
+    timeout = 15.0
+    retry = RetryPolicy()
+    batch_size = 0
+    intraday = ()  # 支持的分钟级周期，实现 fetch_intraday
+    adjusts = False  # 返回不复权行情并提供复权因子，实现 fetch_factors
+    snapshot = False  # fetch_batch 能用一次快照提供全部代码当天的K线（每日增量更新只请求当天）
+
+    def supports(self, symbol):
+        """该数据源能否提供此代码的数据，用于路由"""
+        return True
+
+    def normalize(self, symbol):
+        """转换为该数据源使用的代码，同时用作缓存键"""
+        return symbol
+
+    def fetch_range(self, symbol, start, end):
+        raise NotImplementedError
+
+    def fetch_intraday(self, symbol, start, end, interval):
+        """[start, end] 区间的分钟K线，date 为K线开始时间"""
+        raise NotImplementedError
+
+    def fetch_factors(self, symbol):
+        """
+        后复权因子表（date/factor 两列）：某日起的后复权价 = 不复权价 × factor，
+        只列出因子变化（除权除息）的日期
+        """
+        raise NotImplementedError
+
+    def fetch_batch(self, symbols, start, end):
+        """
+        一次请求多个代码，返回 {symbol: DataFrame}，无数据的代码为空表；
+        返回 None 表示该区间不支持批量，由注册表逐只并发请求
+        """
+        return None
+
+    def metadata(self, symbol, fields):
+        """返回 {字段: 值}，字段见 metadata.METADATA_FIELDS；由 MetadataCache 经注册表按需调用"""
+        return {}
+
+
+class YFinanceSource(DataSource):
+    """yfinance：同一代码复用 Ticker 对象（及其 HTTP 会话和 cookie）"""
+
+    name = 'yfinance'
+    batch_size = 200
+    # yfinance 只提供最近 7 天（1m）/ 60 天（其余）的分钟K线，更长的历史靠定期追加到本地存储
+    intraday = ('1m', '2m', '5m', '15m', '30m', '60m', '1h')
+
+    def __init__(self, session=None, timeout=15.0, retry=None):
+        self.session = session  # 可选：传给 yf.Ticker 的共享会话
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, symbol):
+        """A股补 .SS/.SZ 后缀，纯数字港股补齐为 4 位 + .HK"""
+        code, suffix = split_symbol(symbol)
+        if _A_SHARE.match(code) and suffix in ('', 'SH', 'SS', 'SZ'):
+            if suffix == 'SZ' or (not suffix and code[0] in '03'):
+                return f'{code}.SZ'
+            return f'{code}.SS'
+        if _HK.match(code) and suffix in ('', 'HK'):
+            return f'{int(code):04d}.HK'
+        return symbol
+
+    def ticker(self, symbol):
+        with self._lock:
+            if symbol not in self._tickers:
+                import yfinance as yf  # 只有实际使用该数据源时才导入
+                kwargs = {'session': self.session} if self.session is not None else {}
+                self._tickers[symbol] = yf.Ticker(symbol, **kwargs)
+            return self._tickers[symbol]
+
+    def fetch_range(self, symbol, start, end):
+        hist = self.ticker(symbol).history(start=start, end=end + timedelta(days=1),
+                                           timeout=self.timeout)
+        return _format_history(hist)
+
+    def fetch_intraday(self, symbol, start, end, interval):
+        hist = self.ticker(symbol).history(start=start, end=end, interval=interval, timeout=self.timeout)
+        return _format_history(hist)
+
+    def fetch_batch(self, symbols, start, end):
+        """yf.download 一次下载多个代码（共用会话和 cookie），按代码拆回单独的表"""
+        import yfinance as yf
+        kwargs = {'session': self.session} if self.session is not None else {}
+        data = yf.download(list(symbols), start=start, end=end + timedelta(days=1),
+                           group_by='ticker', auto_adjust=True, actions=False,
+                           progress=False, timeout=self.timeout, **kwargs)
+        if data is None or data.empty:
+            return {symbol: _empty() for symbol in symbols}
+        if not isinstance(data.columns, pd.MultiIndex):
+            # 旧版本只请求一个代码时返回单层列
+            return {symbol: _format_history(data) for symbol in symbols}
+        available = set(data.columns.get_level_values(0))
+        return {symbol: _format_history(data[symbol]) if symbol in available else _empty()
+                for symbol in symbols}
+
+    def metadata(self, symbol, fields):
+        """
+        币种/交易所取自 fast_info（复用 history 已拿到的元数据，通常无需额外请求），
+        只有需要名称/行业时才请求完整的 info
+        """
+        ticker = self.ticker(symbol)
+        values = {}
+        if {'currency', 'exchange'} & set(fields):
+            fast = ticker.fast_info
+            values.update(currency=fast['currency'], exchange=fast['exchange'])
+        if {'name', 'sector'} & set(fields):
+            info = ticker.info
+            values.update(name=info.get('longName') or info.get('shortName'),
+                          sector=info.get('sector'))
+        return values
+
+
+class AkShareSource(DataSource):
+    """AkShare 沪深A股日线（不复权）"""
+
+    name = 'akshare'
+    batch_size = 6000
+    adjusts = True
+    snapshot = True
+
+    def __init__(self, timeout=15.0, retry=None):
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy(backoff=1.0)
+        self._calendar = (None, None)  # (获取日期, 交易日集合)
+        self._lock = threading.Lock()
+
+    def supports(self, symbol):
+        return is_a_share(symbol)
+
+    def is_trading_day(self, date):
+        """按交易所日历（新浪交易日历，每天取一次）判断 date 是否为A股交易日"""
+        today = pd.Timestamp.now().normalize()
+        with self._lock:
+            fetched_on, days = self._calendar
+        if fetched_on != today:
+            import akshare as ak
+            calendar = ak.tool_trade_date_hist_sina()
+            days = set(pd.to_datetime(calendar['trade_date']).dt.normalize())
+            with self._lock:
+                self._calendar = (today, days)
+        return pd.Timestamp(date).normalize() in days
+
+    def normalize(self, symbol):
+        return split_symbol(symbol)[0]
+
+    def fetch_range(self, symbol, start, end):
+        import akshare as ak  # 只有实际使用该数据源时才导入
+        df = ak.stock_zh_a_hist(symbol=symbol, period="daily",
+                                start_date=start.strftime('%Y%m%d'),
+                                end_date=end.strftime('%Y%m%d'),
+                                adjust="", timeout=self.timeout)
+        if df.empty:
+            return _empty()
+        df = df.rename(columns={'日期': 'date', '开盘': 'open', '最高': 'high',
+                                '最低': 'low', '收盘': 'close', '成交量': 'volume'})
+        df['date'] = pd.to_datetime(df['date'])
+        return df[OHLCV]
+
+    def fetch_factors(self, symbol):
+        """新浪后复权因子（一次请求覆盖全部历史，前复权由同一张表换算）"""
+        import akshare as ak
+        exchange = 'sh' if symbol.startswith(('6', '9')) else 'bj' if symbol.startswith(('4', '8')) else 'sz'
+        df = ak.stock_zh_a_daily(symbol=f"{exchange}{symbol}", adjust="hfq-factor")
+        return pd.DataFrame({'date': pd.to_datetime(df['date']),
+                             'factor': pd.to_numeric(df['hfq_factor'])})
+
+    def fetch_batch(self, symbols, start, end):
+        """
+        历史区间没有多代码接口；只需要今天一根K线时用一次全市场快照代替逐只请求。
+        每日增量更新的区间由注册表收窄为当天（见 SourceRegistry._snapshot_range）。
+        休市日快照仍是上一交易日的行情，今天不是交易日（或取不到日历）时返回 None，
+        由逐只请求决定是否有今天的K线
+        """
+        today = pd.Timestamp.now().normalize()
+        if pd.Timestamp(start).normalize() != today or pd.Timestamp(end).normalize() != today:
+            return None
+        try:
+            if not self.is_trading_day(today):
+                return None
+        except Exception as e:
+            logger.warning(f"获取A股交易日历失败，不使用快照: {e}")
+            return None
+        import akshare as ak
+        spot = ak.stock_zh_a_spot_em()
+        spot = spot[spot['代码'].isin(symbols)].dropna(subset=['今开'])
+        frame = pd.DataFrame({'date': today, 'open': spot['今开'].to_numpy(), 'high': spot['最高'].to_numpy(),
+                              'low': spot['最低'].to_numpy(), 'close': spot['最新价'].to_numpy(),
+                              'volume': spot['成交量'].to_numpy()}, index=spot['代码'].to_numpy())
+        return {symbol: frame.loc[[symbol]].reset_index(drop=True) if symbol in frame.index else _empty()
+                for symbol in symbols}
+
+    def metadata(self, symbol, fields):
+        values = {'currency': 'CNY', 'exchange': 'SSE' if symbol.startswith('6') else 'SZSE'}
+        if {'name', 'sector'} & set(fields):
+            import akshare as ak
+            items = ak.stock_individual_info_em(symbol=symbol, timeout=self.timeout)
+            items = dict(zip(items['item'], items['value']))
+            values.update(name=items.get('股票简称'), sector=items.get('行业'))
+        return values
+
+
+class SimulatedSource(DataSource):
+    """模拟数据；给定 store 时续接缓存中最后的收盘价，保证追加的数据连续"""
+
+    name = 'simulated'
+    timeout = None
+    retry = RetryPolicy(attempts=1)
+    intraday = tuple(INTRADAY_MINUTES)
+
+    def __init__(self, store=None):
+        self.store = store
+
+    def fetch_range(self, symbol, start, end):
+        base_price = None
+        if self.store is not None:
+            cached = self.store.read(self.name, symbol)
+            if cached is not None and not cached.empty:
+                base_price = cached['close'].iloc[-1]
+        return simulate_frame(start, end, base_price)
+
+    def fetch_intraday(self, symbol, start, end, interval):
+        return simulate_intraday_frame(start, end, INTRADAY_MINUTES[interval])
+
+    def metadata(self, symbol, fields):
+        return {'currency': 'USD', 'exchange': 'SIMULATED', 'name': symbol}
+
+
+class LocalSource(DataSource):
+    """
+    不联网的替身数据源：从内存中的 {symbol: DataFrame} 按区间切片。
+    可注入延迟和故障（前 fail_first 次调用抛异常，或 failing=True 时一直失败），
+    用于测试重试、熔断和故障切换。calls 记录上游调用次数（批量请求算一次），
+    batch_calls 记录其中的批量请求次数。给定 factors（{symbol: date/factor 表}）时
+    该数据源视为提供复权因子。
+    """
+
+    def __init__(self, frames=None, name='local', latency=0.0, fail_first=0, failing=False,
+                 timeout=5.0, retry=None, batch_size=100, factors=None):
+        self.name = name
+        self.batch_size = batch_size
+        self.batch_calls = 0
+        self.frames = dict(frames or {})
+        self.factors = dict(factors or {})
+        self.adjusts = factors is not None
+        self.latency = latency
+        self.fail_first = fail_first
+        self.failing = failing
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy(attempts=2, backoff=0.0)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _request(self, batch=False):
+        with self._lock:
+            self.calls += 1
+            self.batch_calls += batch
+            calls = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failing or calls <= self.fail_first:
+            raise ConnectionError(f"{self.name} 模拟故障")
+
+    def _slice(self, symbol, start, end):
+        df = self.frames.get(symbol)
+        if df is None:
+            return _empty()
+        dates = pd.to_datetime(df['date'])
+        return df[(dates >= start) & (dates <= end)].reset_index(drop=True)
+
+    def fetch_range(self, symbol, start, end):
+        self._request()
+        return self._slice(symbol, start, end)
+
+    def fetch_batch(self, symbols, start, end):
+        self._request(batch=True)
+        return {symbol: self._slice(symbol, start, end) for symbol in symbols}
+
+    def fetch_factors(self, symbol):
+        self._request()
+        return self.factors.get(symbol, pd.DataFrame(columns=['date', 'factor']))
+
+
+class SourceRegistry:
+    """已注册的数据源、各自的熔断器和路由规则"""
+
+    def __init__(self, sources=(), breaker_threshold=3, breaker_reset=60.0):
+        self.sources = {}
+        self.breakers = {}
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        for source in sources:
+            self.register(source)
+
+    def register(self, source):
+        self.sources[source.name] = source
+        self.breakers[source.name] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return source
+
+    def get(self, name):
+        return self.sources[name]
+
+    def route(self, symbol):
+        """
+        按代码格式决定数据源顺序：A股优先 AkShare，其余优先 yfinance，
+        再接其他支持该代码的数据源；模拟数据不自动加入
+        """
+        order = ['akshare', 'yfinance'] if is_a_share(symbol) else ['yfinance']
+        order += [name for name in self.sources if name not in order and name != 'simulated']
+        return [name for name in order if name in self.sources and self.sources[name].supports(symbol)]
+
+    def call(self, source, symbol, start, end):
+        """带超时和退避重试地调用一次数据源；熔断打开时直接抛 SourceUnavailable"""
+        return self._guarded(source, symbol, source.fetch_range, symbol, start, end)
+
+    def call_intraday(self, source, symbol, start, end, interval):
+        """带超时、重试和熔断地请求一段分钟K线"""
+        return self._guarded(source, f"{symbol} {interval}", source.fetch_intraday, symbol, start, end, interval)
+
+    def route_intraday(self, symbol, interval):
+        """支持该分钟周期的数据源，顺序同 route()"""
+        return [name for name in self.route(symbol) if interval in self.sources[name].intraday]
+
+    def call_factors(self, source, symbol):
+        """带超时、重试和熔断地请求复权因子表"""
+        return self._guarded(source, f"{symbol} 复权因子", source.fetch_factors, symbol)
+
+    def call_metadata(self, source, symbol, fields):
+        """带超时、重试和熔断地请求元数据字段"""
+        return self._guarded(source, f"{symbol} 元数据", source.metadata, symbol, fields)
+
+    def call_batch(self, source, symbols, start, end):
+        """带超时、重试和熔断的一次批量请求"""
+        return self._guarded(source, f"{len(symbols)} 个代码", source.fetch_batch, symbols, start, end)
+
+    def _guarded(self, source, label, func, *args):
+        """
+        一次调用最多计一次熔断失败（重试用尽后），单只代码的错误不计入，
+        避免一个无效代码把整个数据源熔断
+        """
+        breaker = self.breakers[source.name]
+        retry = source.retry
+        if not breaker.allow():
+            raise SourceUnavailable(f"{source.name} 已熔断")
+        last_error = None
+        for attempt in range(max(1, retry.attempts)):
+            try:
+                if source.timeout:
+                    result = _call_pool.submit(func, *args).result(timeout=source.timeout)
+                else:
+                    result = func(*args)
+            except FutureTimeout:
+                last_error = TimeoutError(f"{source.name} 超过 {source.timeout}s 未响应")
+            except _PERMANENT_ERRORS as e:
+                breaker.record_failure()
+                raise SourceUnavailable(f"{source.name} 不可用: {e}") from e
+            except _SYMBOL_ERRORS as e:
+                # 上游有响应，只是该代码没有可用数据：视为数据源正常
+                breaker.record_success()
+                raise SourceUnavailable(f"{source.name} 获取 {label} 失败: {e!r}") from e
+            except Exception as e:
+                last_error = e
+            else:
+                breaker.record_success()
+                return result
+            logger.warning(f"{source.name} 获取 {label} 失败（第 {attempt + 1} 次）: {last_error}")
+            if attempt + 1 < retry.attempts:
+                time.sleep(retry.delay(attempt))
+        breaker.record_failure()
+        raise SourceUnavailable(f"{source.name} 获取 {label} 失败: {last_error}") from last_error
+
+    def fetch(self, symbol, start, end, sources=None, store=None):
+        """
+        依次尝试 sources（默认 route(symbol)），返回 (数据源, 该源代码, DataFrame)。
+        给定 store 时经本地缓存只请求缺失区间；空结果视为无数据，不计入熔断。
+        全部失败抛 SourceUnavailable。
+        """
+        names = list(sources) if sources is not None else self.route(symbol)
+        errors = []
+        for name in names:
+            source = self.sources.get(name)
+            if source is None:
+                continue
+            if self.breakers[name].state == 'open':
+                errors.append(f"{name}: 已熔断")
+                continue
+            key = source.normalize(symbol)
+
+            def fetch_range(s, e, source=source, key=key):
+                return self.call(source, key, s, e)
+
+            try:
+                if store is not None:
+                    df = store.get_or_fetch(name, key, start, end, fetch_range)
+                else:
+                    df = fetch_range(start, end)
+            except SourceUnavailable as e:
+                errors.append(str(e))
+                continue
+            if df is not None and not df.empty:
+                return source, key, df
+            errors.append(f"{name}: 无数据")
+        raise SourceUnavailable(f"{symbol} 无可用数据源（{'; '.join(errors) or '未配置'}）")
+
+    def fetch_many(self, symbols, start, end, sources=None, store=None, fetcher=None):
+        """
+        批量获取：按路由把代码分到首选数据源，每组尽量合并为一次上游请求
+        （超过 batch_size 时分块，不支持批量的数据源经 fetcher 逐只并发请求）；
+        失败或无数据的代码落到各自路由中的下一个数据源。
+        返回 {symbol: (数据源, 该源代码, DataFrame) 或 None}，顺序与输入一致。
+        """
+        symbols = list(dict.fromkeys(symbols))
+        routes = {symbol: list(sources) if sources is not None else self.route(symbol)
+                  for symbol in symbols}
+        results = dict.fromkeys(symbols)
+        pending = symbols
+        while pending:
+            groups = {}
+            for symbol in pending:
+                if routes[symbol]:
+                    groups.setdefault(routes[symbol].pop(0), []).append(symbol)
+            pending = []
+            for name, group in groups.items():
+                source = self.sources.get(name)
+                if source is None or self.breakers[name].state == 'open':
+                    pending.extend(group)
+                    continue
+                frames = self._fetch_group(source, group, start, end, store, fetcher)
+                for symbol in group:
+                    key, df = frames.get(symbol, (None, None))
+                    if df is not None and not df.empty:
+                        results[symbol] = (source, key, df)
+                    else:
+                        pending.append(symbol)
+        return results
+
+    def _fetch_group(self, source, symbols, start, end, store, fetcher):
+        """一个数据源的一组代码：按缺失区间合并请求，返回 {symbol: (代码, DataFrame)}"""
+        keys = {symbol: source.normalize(symbol) for symbol in symbols}
+        ranges = {}
+        for key in dict.fromkeys(keys.values()):
+            missing = (store.missing_ranges(source.name, key, start, end) if store is not None
+                       else [(start, end)])
+            for missing_range in missing:
+                if store is not None and source.snapshot:
+                    missing_range = self._snapshot_range(source, key, missing_range, store)
+                ranges.setdefault(missing_range, []).append(key)
+
+        fetched, failed = {}, set()
+        for (range_start, range_end), range_keys in ranges.items():
+            frames = self._fetch_keys(source, range_keys, range_start, range_end, fetcher)
+            for key in range_keys:
+                df = frames.get(key)
+                if df is None:
+                    # 请求失败：不标记为已覆盖，下次重新请求
+                    failed.add(key)
+                elif store is not None:
+                    # 空表同样不标记：yf.download 把单个代码的失败变成空表
+                    if not df.empty:
+                        store.append(source.name, key, df)
+                        store.mark_covered(source.name, key, range_start, range_end)
+                else:
+                    fetched[key] = df
+
+        out = {}
+        for symbol, key in keys.items():
+            if key in failed:
+                continue
+            df = store.read(source.name, key, start, end) if store is not None else fetched.get(key)
+            out[symbol] = (key, df)
+        return out
+
+    def _snapshot_range(self, source, key, missing_range, store):
+        """
+        缓存的末尾区间从最后一根K线开始（可能是上一交易日）。其后唯一缺少的交易日
+        是今天时只请求今天，由快照提供，与缓存中的K线合并（上一交易日的K线沿用缓存）
+        """
+        start, end = missing_range
+        today = pd.Timestamp.now().normalize()
+        if end.normalize() != today or start.normalize() >= today:
+            return missing_range
+        last_date = (store.read_meta(source.name, key) or {}).get('last_date')
+        if last_date is None or pd.Timestamp(last_date).normalize() != start.normalize():
+            return missing_range
+        if list(pd.bdate_range(start.normalize() + timedelta(days=1), today)) != [today]:
+            return missing_range
+        return today, end
+
+    def _fetch_keys(self, source, keys, start, end, fetcher):
+        """返回 {代码: DataFrame}；请求失败的代码不出现在结果中"""
+        frames, single = {}, []
+        for i in range(0, len(keys), source.batch_size or len(keys)):
+            chunk = keys[i:i + source.batch_size] if source.batch_size else keys
+            if not source.batch_size:
+                single.extend(chunk)
+                continue
+            try:
+                batch = self.call_batch(source, chunk, start, end)
+            except SourceUnavailable as e:
+                logger.warning(str(e))
+                continue
+            if batch is None:
+                single.extend(chunk)
+            else:
+                frames.update(batch)
+
+        if single:
+            fetcher = fetcher or ConcurrentFetcher()
+            results = fetcher.fetch_many(single, lambda key: self.call(source, key, start, end),
+                                         source_of=lambda key: source.name)
+            frames.update({key: df for key, df in results.items() if df is not None})
+        return frames
+
+
+def default_registry(store=None, **kwargs):
+    """yfinance + AkShare + 模拟数据"""
+    return SourceRegistry([YFinanceSource(), AkShareSource(), SimulatedSource(store)], **kwargs)
@@ -0,0 +1,182 @@
+"""
+本地行情存储 - 按列持久化的增量 OHLCV 缓存
+
+每个 (数据源, 股票代码, 周期) 对应一个目录，目录下每列一个 .npy 文件，
+另有 meta.json 记录已向上游请求过的日期范围。读取时只对缺失区间调用上游。
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+# 周期字符串对应的自然日跨度
+PERIOD_DAYS = {
+    "1d": 1, "5d": 5, "1mo": 30, "3mo": 90,
+    "6mo": 180, "1y": 365, "2y": 730, "5y": 1825, "10y": 3650
+}
+
+# 分钟级周期对应的K线分钟数（存储见 intraday.MmapBarStore）
+INTRADAY_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "1h": 60}
+
+
+def period_to_range(period, now=None):
+    """把 yfinance 风格的周期字符串换算为 (start, end) 日期"""
+    end = pd.Timestamp(now or datetime.now()).normalize()
+    start = end - timedelta(days=PERIOD_DAYS.get(period, 90))
+    return start, end
+
+
+def _safe_name(text):
+    """把代码转换为可用作目录名的字符串"""
+    return re.sub(r'[^0-9A-Za-z._-]', '_', str(text))
+
+
+class OHLCVStore:
+    """按 (source, symbol, interval) 分区的列式行情缓存"""
+
+    def __init__(self, root="data_cache"):
+        self.root = root
+
+    def _path(self, source, symbol, interval):
+        return os.path.join(self.root, _safe_name(source), _safe_name(interval), _safe_name(symbol))
+
+    def _read_meta(self, path):
+        meta_file = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, path, meta):
+        tmp = os.path.join(path, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, 'meta.json'))
+
+    def read_meta(self, source, symbol, interval="1d"):
+        """缓存的 meta.json 内容；无缓存时返回 None"""
+        return self._read_meta(self._path(source, symbol, interval))
+
+    def update_meta(self, source, symbol, interval="1d", **values):
+        """在 meta.json 中记录额外字段（如派生数据所依据的复权因子）"""
+        path = self._path(source, symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta(path) or {'rows': 0}
+        meta.update(values)
+        self._write_meta(path, meta)
+
+    def read(self, source, symbol, start=None, end=None, interval="1d"):
+        """读取缓存数据，返回按日期排序的 DataFrame；无缓存时返回 None"""
+        path = self._path(source, symbol, interval)
+        if self._read_meta(path) is None:
+            return None
+
+        columns = {}
+        for col in OHLCV_COLUMNS:
+            col_file = os.path.join(path, f'{col}.npy')
+            if not os.path.exists(col_file):
+                return None
+            columns[col] = np.load(col_file)
+        df = pd.DataFrame(columns)
+
+        if start is not None:
+            df = df[df['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df['date'] < pd.Timestamp(end) + timedelta(days=1)]
+        return df.reset_index(drop=True)
+
+    def append(self, source, symbol, df, interval="1d"):
+        """追加新行情；与已有日期重复的行以新数据为准"""
+        path = self._path(source, symbol, interval)
+        os.makedirs(path, exist_ok=True)
+
+        new = df[OHLCV_COLUMNS].copy()
+        new['date'] = pd.to_datetime(new['date']).astype('datetime64[ns]')
+        old = self.read(source, symbol, interval=interval)
+        if old is not None and not old.empty:
+            new = pd.concat([old, new], ignore_index=True)
+        new = new.drop_duplicates(subset='date', keep='last').sort_values('date')
+
+        for col in OHLCV_COLUMNS:
+            tmp = os.path.join(path, f'{col}.tmp.npy')
+            np.save(tmp, new[col].to_numpy())
+            os.replace(tmp, os.path.join(path, f'{col}.npy'))
+
+        meta = self._read_meta(path) or {}
+        meta['rows'] = int(len(new))
+        meta['last_date'] = pd.Timestamp(new['date'].iloc[-1]).isoformat()
+        self._write_meta(path, meta)
+        return len(new)
+
+    def mark_covered(self, source, symbol, start, end, interval="1d"):
+        """记录已向上游请求过的日期范围（调用方只在取得数据后记录）"""
+        path = self._path(source, symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta(path) or {'rows': 0}
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        if 'covered_start' in meta:
+            start = min(start, pd.Timestamp(meta['covered_start']))
+            end = max(end, pd.Timestamp(meta['covered_end']))
+        meta['covered_start'] = start.isoformat()
+        meta['covered_end'] = end.isoformat()
+        self._write_meta(path, meta)
+        if meta.get('rows', 0) == 0:
+            for col in OHLCV_COLUMNS:
+                col_file = os.path.join(path, f'{col}.npy')
+                if not os.path.exists(col_file):
+                    dtype = 'datetime64[ns]' if col == 'date' else 'float64'
+                    np.save(col_file, np.array([], dtype=dtype))
+
+    def missing_ranges(self, source, symbol, start, end, interval="1d"):
+        """计算 [start, end] 中尚未缓存、需要向上游请求的区间"""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        path = self._path(source, symbol, interval)
+        meta = self._read_meta(path)
+        if not meta or 'covered_start' not in meta:
+            return [(start, end)]
+
+        covered_start = pd.Timestamp(meta['covered_start'])
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start - timedelta(days=1)))
+
+        # 末尾区间从最后一根K线开始重新请求；只有当天的K线可能未收盘，需要重取
+        tail_start = pd.Timestamp(meta.get('last_date') or meta['covered_end']).normalize()
+        today = pd.Timestamp.now().normalize()
+        if tail_start < end.normalize() and len(pd.bdate_range(tail_start + timedelta(days=1), end)) > 0:
+            ranges.append((max(tail_start, start), end))
+        elif tail_start == today and start <= tail_start <= end:
+            ranges.append((tail_start, end))
+        return ranges
+
+    def get_or_fetch(self, source, symbol, start, end, fetch_range, interval="1d"):
+        """读取缓存，仅对缺失区间调用 fetch_range(start, end) 并写回缓存"""
+        for range_start, range_end in self.missing_ranges(source, symbol, start, end, interval):
+            logger.info(f"{source}:{symbol} 请求缺失区间 {range_start.date()} ~ {range_end.date()}")
+            new = fetch_range(range_start, range_end)
+            # 空结果不记为已覆盖：yfinance 在限流、临时故障时也返回空表，下次重新请求
+            if new is not None and not new.empty:
+                self.append(source, symbol, new, interval)
+                self.mark_covered(source, symbol, range_start, range_end, interval)
+        return self.read(source, symbol, start, end, interval)
+
+    def clear(self, source=None, symbol=None, interval="1d"):
+        """删除缓存（可按数据源或单个代码）"""
+        if source is None:
+            target = self.root
+        elif symbol is None:
+            target = os.path.join(self.root, _safe_name(source))
+        else:
+            target = self._path(source, symbol, interval)
+        if os.path.exists(target):
+            shutil.rmtree(target)
@@ -0,0 +1,115 @@
+"""
+并发行情获取 - 线程池 + 按数据源的并发/限速控制
+
+运行时间几乎全部花在网络等待上，因此用线程池让多个代码的请求重叠；
+每个数据源有独立的并发上限和令牌桶限速，避免触发上游的频率限制。
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SourceLimits:
+    """单个数据源的限制"""
+    max_concurrency: int = 4
+    rate_per_sec: Optional[float] = None  # None 表示不限速
+    burst: int = 1
+
+
+# 默认限制：yfinance 较宽松，AkShare（东方财富接口）较严格，模拟数据不限速
+DEFAULT_LIMITS = {
+    'yfinance': SourceLimits(max_concurrency=8, rate_per_sec=5.0, burst=5),
+    'akshare': SourceLimits(max_concurrency=4, rate_per_sec=2.0, burst=2),
+    'simulated': SourceLimits(max_concurrency=16),
+}
+
+
+class RateLimiter:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate_per_sec, burst=1):
+        self.rate = rate_per_sec
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时阻塞等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _SourceGate:
+    """组合并发信号量和限速器"""
+
+    def __init__(self, limits):
+        self.semaphore = threading.BoundedSemaphore(limits.max_concurrency)
+        self.limiter = RateLimiter(limits.rate_per_sec, limits.burst) if limits.rate_per_sec else None
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+        return False
+
+
+class ConcurrentFetcher:
+    """并发获取多个代码的数据，每个代码只请求一次"""
+
+    def __init__(self, limits: Optional[Dict[str, SourceLimits]] = None, max_workers=16):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.max_workers = max_workers
+        self._gates = {}
+        self._gates_lock = threading.Lock()
+
+    def _gate(self, source):
+        with self._gates_lock:
+            if source not in self._gates:
+                self._gates[source] = _SourceGate(self.limits.get(source, SourceLimits()))
+            return self._gates[source]
+
+    def fetch_many(self, symbols: Iterable[str], fetch_fn: Callable,
+                   source_of: Optional[Callable[[str], str]] = None) -> Dict[str, object]:
+        """
+        并发调用 fetch_fn(symbol)，返回 {symbol: 结果}，顺序与输入一致。
+        失败的代码结果为 None；source_of(symbol) 决定使用哪个数据源的限制。
+        """
+        unique = list(dict.fromkeys(symbols))
+        source_of = source_of or (lambda symbol: 'default')
+
+        def run(symbol):
+            with self._gate(source_of(symbol)):
+                try:
+                    return fetch_fn(symbol)
+                except Exception as e:
+                    logger.error(f"获取 {symbol} 失败: {e}")
+                    return None
+
+        if not unique:
+            return {}
+        workers = min(self.max_workers, len(unique))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch') as pool:
+            results = list(pool.map(run, unique))
+        return dict(zip(unique, results))
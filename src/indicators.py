@@ -0,0 +1,541 @@
+"""
+指标引擎 - 对 (股票数 × K线数) 的价格面板做向量化计算
+
+面板按右对齐排列：每行最后一列是最新K线，历史较短的股票在左侧用 NaN 补齐。
+所有指标对整个面板一次算出，没有逐K线的 Python 循环；结果与
+stock_analysis_github.StockAnalyzer 原有的 pandas 实现一致。
+
+均线、标准差、RSI、ATR、随机指标、OBV 和 StochRSI 由后端计算：NumpyBackend 对整个面板
+向量化计算，TalibBackend 逐只股票调用 TA-Lib 的 C 函数（scripts/install_ta_lib.sh 安装）。
+后端在首次计算时选择一次（select_backend），两者结果在浮点误差内一致；
+MACD 的 EMA 与 KDJ 的平滑 TA-Lib 没有相同定义的实现，两个后端共用 NumPy 代码。
+"""
+
+import functools
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INDICATOR_COLUMNS = (
+    'MA5', 'MA10', 'MA20', 'RSI',
+    'MACD', 'MACD_Signal', 'MACD_Histogram',
+    'BB_Middle', 'BB_Upper', 'BB_Lower',
+    'Volume_MA20',
+)
+# 提供最高/最低价时额外计算的指标
+EXTENDED_COLUMNS = (
+    'ATR', 'KDJ_K', 'KDJ_D', 'KDJ_J', 'OBV', 'StochRSI_K', 'StochRSI_D',
+)
+
+BACKEND_ENV = 'INDICATOR_BACKEND'
+
+
+def build_panel(frames, column='close', length=None, dtype=np.float64):
+    """把多个 DataFrame（或 OHLCVSeries）的同一列右对齐拼成二维面板"""
+    length = length or max((len(df) for df in frames), default=0)
+    panel = np.full((len(frames), length), np.nan, dtype=dtype)
+    for i, df in enumerate(frames):
+        values = np.asarray(df[column], dtype=dtype)[-length:]
+        if len(values):
+            panel[i, -len(values):] = values
+    return panel
+
+
+def allocate_outputs(shape, dtype=np.float64, columns=INDICATOR_COLUMNS):
+    """预分配输出数组，可在多次计算间复用"""
+    return {name: np.empty(shape, dtype=dtype) for name in columns}
+
+
+def rolling_mean(x, window, out=None):
+    """沿最后一轴的滑动平均，窗口内有 NaN 时结果为 NaN（同 pandas rolling）"""
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=-1)
+    ccount = np.cumsum(valid, axis=-1)
+    wsum = csum.copy()
+    wsum[..., window:] -= csum[..., :-window]
+    wcount = ccount.copy()
+    wcount[..., window:] -= ccount[..., :-window]
+    if out is None:
+        out = np.empty_like(x)
+    np.divide(wsum, window, out=out, casting='unsafe')
+    out[wcount < window] = np.nan
+    return out
+
+
+def rolling_std(x, window, out=None, ddof=1):
+    """沿最后一轴的滑动标准差（样本标准差）"""
+    x = np.asarray(x, dtype=np.float64)
+    # 先减去每行的首个有效值，降低累加和相减时的精度损失
+    ref = np.nan_to_num(_first_valid(x))[..., None]
+    centered = x - ref
+    mean = rolling_mean(centered, window)
+    mean_sq = rolling_mean(centered * centered, window)
+    var = (mean_sq - mean * mean) * (window / (window - ddof))
+    np.maximum(var, 0.0, out=var)
+    if out is None:
+        out = np.empty_like(x)
+    np.sqrt(var, out=out, casting='unsafe')
+    return out
+
+
+def decay_cumsum(x, decay, block=None):
+    """
+    计算 y[t] = decay * y[t-1] + x[t]（y[-1] = 0），沿最后一轴。
+
+    用分块的缩放前缀和代替逐元素递推：块内 y = decay^j * cumsum(x * decay^-j)，
+    块长度保证 decay^-j 不溢出，因此循环次数只有 K线数 / 块长度。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    out = np.empty_like(x)
+    if n == 0:
+        return out
+    if decay <= 0:
+        out[...] = x
+        return out
+    log_decay = -np.log(decay)
+    if block is None:
+        block = n if log_decay == 0 else max(1, min(n, int(200 / log_decay)))
+    powers = decay ** np.arange(block)
+    inv_powers = 1.0 / powers
+    carry = np.zeros(x.shape[:-1])
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        m = stop - start
+        seg = np.cumsum(x[..., start:stop] * inv_powers[:m], axis=-1)
+        seg = (seg + (carry * decay)[..., None]) * powers[:m]
+        out[..., start:stop] = seg
+        carry = seg[..., -1]
+    return out
+
+
+def ewm_mean(x, span, out=None):
+    """等价于 pandas ewm(span=span, adjust=True).mean()，NaN 不计入权重"""
+    x = np.asarray(x, dtype=np.float64)
+    decay = 1.0 - 2.0 / (span + 1.0)
+    valid = ~np.isnan(x)
+    num = decay_cumsum(np.where(valid, x, 0.0), decay)
+    den = decay_cumsum(valid.astype(np.float64), decay)
+    if out is None:
+        out = np.empty_like(x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(num, den, out=out, casting='unsafe')
+    # 首个有效值之前保持 NaN
+    out[np.cumsum(valid, axis=-1) == 0] = np.nan
+    return out
+
+
+def _first_valid(x):
+    """每行第一个非 NaN 值"""
+    idx = _first_valid_index(x)
+    rows = np.take_along_axis(x, np.minimum(idx, x.shape[-1] - 1)[..., None], axis=-1)[..., 0]
+    return np.where(idx < x.shape[-1], rows, np.nan)
+
+
+def _first_valid_index(x):
+    valid = ~np.isnan(x)
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), x.shape[-1])
+
+
+def rsi(close, period=14, out=None):
+    """
+    Wilder RSI，与 StockAnalyzer._calculate_rsi 相同的定义：
+    第 period 根K线用前 period 个涨跌幅的均值做种子，之后按 Wilder 平滑递推，
+    种子之前的位置填 50。
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    n_rows, n = close.shape
+    if out is None:
+        out = np.empty_like(close)
+    out[...] = np.nan
+    if n <= period:
+        out[~np.isnan(close)] = 50.0
+        return out
+
+    deltas = np.diff(close, axis=-1)
+    gains = np.maximum(np.nan_to_num(deltas), 0.0)
+    losses = np.maximum(-np.nan_to_num(deltas), 0.0)
+
+    first = _first_valid_index(close)
+    seed = first + period  # 每行种子所在的K线位置
+    has_seed = seed < n
+    col = np.arange(n)[None, :]
+    after_seed = col > seed[:, None]
+
+    decay = (period - 1) / period
+    avg = []
+    for series in (gains, losses):
+        # 种子 = 前 period 个涨跌幅的均值，即 deltas[first : seed] 的均值
+        csum = np.concatenate([np.zeros((n_rows, 1)), np.cumsum(series, axis=-1)], axis=-1)
+        seed_idx = np.minimum(seed, n - 1)
+        seed_value = (np.take_along_axis(csum, seed_idx[:, None], axis=-1)[:, 0]
+                      - np.take_along_axis(csum, np.minimum(first, n - 1)[:, None], axis=-1)[:, 0]) / period
+        # 种子之后的增量为 当期涨跌幅 / period
+        x = np.zeros((n_rows, n))
+        np.multiply(series, 1.0 / period, out=x[:, 1:])
+        x *= after_seed
+        x[has_seed, seed[has_seed]] = seed_value[has_seed]
+        avg.append(decay_cumsum(x, decay))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = avg[0] / avg[1]
+        values = 100 - (100 / (1 + rs))
+    warmup = (col >= first[:, None]) & ~(col >= seed[:, None])
+    out[...] = np.where(col >= seed[:, None], values, np.where(warmup, 50.0, np.nan))
+    return out
+
+
+def rolling_max(x, window):
+    """沿最后一轴的滑动最大值，窗口内有 NaN 时结果为 NaN"""
+    return _rolling_extreme(x, window, np.maximum)
+
+
+def rolling_min(x, window):
+    """沿最后一轴的滑动最小值，窗口内有 NaN 时结果为 NaN"""
+    return _rolling_extreme(x, window, np.minimum)
+
+
+def _rolling_extreme(x, window, func):
+    # 窗口内逐个滞后与结果两两比较：window 次整块的 ufunc 运算，NaN 自然传播
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    out = np.full_like(x, np.nan)
+    if n >= window:
+        view = out[..., window - 1:]
+        view[...] = x[..., window - 1:]
+        for lag in range(1, window):
+            func(view, x[..., window - 1 - lag:n - lag], out=view)
+    return out
+
+
+def wilder_mean(x, period):
+    """
+    Wilder 平滑（同 TA-Lib ATR）：第一个有效值起前 period 个值的均值作种子，
+    之后 y = y_prev + (x - y_prev) / period；种子之前为 NaN
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    n = x.shape[-1]
+    first = _first_valid_index(x)
+    seed = first + period - 1
+    col = np.arange(n)[None, :]
+    values = np.nan_to_num(x)
+    increments = np.where(col > seed[:, None], values / period, 0.0)
+    rows = np.flatnonzero(seed < n)
+    if len(rows):
+        csum = np.cumsum(values, axis=-1)
+        before = np.where(first[rows] > 0, csum[rows, np.maximum(first[rows] - 1, 0)], 0.0)
+        increments[rows, seed[rows]] = (csum[rows, seed[rows]] - before) / period
+    out = decay_cumsum(increments, (period - 1) / period)
+    out[col < seed[:, None]] = np.nan
+    return out
+
+
+def true_range(high, low, close):
+    """真实波幅；第一根K线没有前收盘价，为 NaN（同 TA-Lib）"""
+    high, low, close = (np.atleast_2d(np.asarray(a, dtype=np.float64)) for a in (high, low, close))
+    out = np.full_like(close, np.nan)
+    prev = close[:, :-1]
+    out[:, 1:] = np.maximum(high[:, 1:] - low[:, 1:],
+                            np.maximum(np.abs(high[:, 1:] - prev), np.abs(low[:, 1:] - prev)))
+    return out
+
+
+def atr(high, low, close, period=14):
+    """平均真实波幅（Wilder 平滑的真实波幅）"""
+    return wilder_mean(true_range(high, low, close), period)
+
+
+def stochastic(high, low, close, window):
+    """
+    快速随机值 (close - 最低价) / (最高价 - 最低价) * 100，窗口为 window 根K线；
+    区间为 0 时取 0（同 TA-Lib STOCHF）
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    lowest = rolling_min(low, window)
+    spread = rolling_max(high, window) - lowest
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = (close - lowest) / spread * 100
+    out[spread == 0] = 0.0
+    return out
+
+
+def smooth(x, m, init=50.0):
+    """通达信式 SMA(X, M, 1)：y = ((m - 1) * y_prev + x) / m，首个有效值之前 y_prev 取 init"""
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    n = x.shape[-1]
+    decay = (m - 1) / m
+    first = _first_valid_index(x)
+    col = np.arange(n)[None, :]
+    increments = np.nan_to_num(x) / m
+    rows = np.flatnonzero(first < n)
+    increments[rows, first[rows]] += init * decay
+    out = decay_cumsum(increments, decay)
+    out[col < first[:, None]] = np.nan
+    return out
+
+
+def kdj(rsv, m1=3, m2=3):
+    """由未成熟随机值 RSV 得到 (K, D, J)"""
+    k = smooth(rsv, m1)
+    d = smooth(k, m2)
+    return k, d, 3 * k - 2 * d
+
+
+def obv(close, volume):
+    """能量潮：第一根K线为当日成交量，之后上涨加、下跌减当日成交量（同 TA-Lib）"""
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    volume = np.atleast_2d(np.asarray(volume, dtype=np.float64))
+    n = close.shape[-1]
+    first = _first_valid_index(close)
+    col = np.arange(n)[None, :]
+    flow = np.zeros_like(close)
+    flow[:, 1:] = np.nan_to_num(np.sign(np.diff(close, axis=-1)) * volume[:, 1:])
+    flow = np.where(col == first[:, None], np.nan_to_num(volume), flow)
+    out = np.cumsum(flow, axis=-1)
+    out[col < first[:, None]] = np.nan
+    return out
+
+
+def stoch_rsi(close, period=14, fastk=14, fastd=3):
+    """随机 RSI：RSI（不含预热期的 50）上的快速随机值及其 fastd 日均线，返回 (K, D)"""
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    values = rsi(close, period)
+    seed = _first_valid_index(close) + period
+    values[np.arange(close.shape[-1])[None, :] < seed[:, None]] = np.nan
+    k = stochastic(values, values, values, fastk)
+    d = rolling_mean(k, fastd)
+    # 同 TA-Lib：K 与 D 从同一根K线开始输出
+    k[np.isnan(d)] = np.nan
+    return k, d
+
+
+# ---- 计算后端 ----
+
+class NumpyBackend:
+    """NumPy 实现：整个面板一次向量化计算"""
+
+    name = 'numpy'
+    sma = staticmethod(rolling_mean)
+    stddev = staticmethod(rolling_std)
+    rsi = staticmethod(rsi)
+    atr = staticmethod(atr)
+    stochastic = staticmethod(stochastic)
+    obv = staticmethod(obv)
+    stoch_rsi = staticmethod(stoch_rsi)
+
+
+class TalibBackend:
+    """
+    TA-Lib 实现：逐只股票对有效区间调用 C 函数，接口与 NumpyBackend 相同。
+    有效区间内仍有缺失值（停牌等）的股票 TA-Lib 会把 NaN 一直传播下去，这些行改用 NumPy 实现
+    """
+
+    name = 'talib'
+
+    def __init__(self, talib):
+        self.talib = talib
+
+    @staticmethod
+    def _rows(func, fallback, inputs, outputs=1):
+        """对每行从各输入都有效的第一根K线起调用 func；返回数组（outputs > 1 时为元组）"""
+        inputs = [np.atleast_2d(np.asarray(x, dtype=np.float64)) for x in inputs]
+        n_rows, n = inputs[0].shape
+        results = [np.full((n_rows, n), np.nan) for _ in range(outputs)]
+        valid = np.logical_and.reduce([~np.isnan(x) for x in inputs])
+        first = np.where(valid.any(axis=-1), valid.argmax(axis=-1), n)
+        gaps = []
+        for i in range(n_rows):
+            start = first[i]
+            if start == n:
+                continue
+            if not valid[i, start:].all():
+                gaps.append(i)
+                continue
+            values = func(*(np.ascontiguousarray(x[i, start:]) for x in inputs))
+            for result, row in zip(results, values if outputs > 1 else (values,)):
+                result[i, start:] = row
+        if gaps:
+            values = fallback(*(x[gaps] for x in inputs))
+            for result, rows in zip(results, values if outputs > 1 else (values,)):
+                result[gaps] = rows
+        return tuple(results) if outputs > 1 else results[0]
+
+    @staticmethod
+    def _store(values, out):
+        if out is None:
+            return values
+        out[...] = values
+        return out
+
+    def sma(self, x, window, out=None):
+        return self._store(self._rows(lambda v: self.talib.SMA(v, window),
+                                      lambda v: rolling_mean(v, window), [x]), out)
+
+    def stddev(self, x, window, out=None, ddof=1):
+        # TA-Lib STDDEV 为总体标准差，换算为样本标准差
+        scale = np.sqrt(window / (window - ddof))
+        return self._store(self._rows(lambda v: self.talib.STDDEV(v, window, 1.0) * scale,
+                                      lambda v: rolling_std(v, window, ddof=ddof), [x]), out)
+
+    def rsi(self, close, period=14, out=None):
+        def compute(v):
+            values = self.talib.RSI(v, period)
+            values[:period] = 50.0  # 与 NumPy 实现相同，种子之前填 50
+            return values
+        return self._store(self._rows(compute, lambda v: rsi(v, period), [close]), out)
+
+    def atr(self, high, low, close, period=14):
+        return self._rows(lambda h, l, c: self.talib.ATR(h, l, c, period),
+                          lambda h, l, c: atr(h, l, c, period), [high, low, close])
+
+    def stochastic(self, high, low, close, window):
+        return self._rows(lambda h, l, c: self.talib.STOCHF(h, l, c, fastk_period=window, fastd_period=1)[0],
+                          lambda h, l, c: stochastic(h, l, c, window), [high, low, close])
+
+    def obv(self, close, volume):
+        return self._rows(self.talib.OBV, obv, [close, volume])
+
+    def stoch_rsi(self, close, period=14, fastk=14, fastd=3):
+        return self._rows(lambda c: self.talib.STOCHRSI(c, period, fastk, fastd, 0),
+                          lambda c: stoch_rsi(c, period, fastk, fastd), [close], outputs=2)
+
+
+NUMPY_BACKEND = NumpyBackend()
+_backend = None
+
+
+@functools.lru_cache(maxsize=None)
+def _load_talib():
+    """只探测一次 TA-Lib，结果缓存；不可用时返回 None"""
+    try:
+        import talib
+        return talib
+    except ImportError:
+        return None
+
+
+def make_backend(name):
+    """按名称（'numpy' / 'talib'）创建后端；TA-Lib 未安装时抛 ValueError"""
+    if name == 'numpy':
+        return NUMPY_BACKEND
+    if name == 'talib':
+        talib = _load_talib()
+        if talib is None:
+            raise ValueError("TA-Lib 不可用，请先运行 scripts/install_ta_lib.sh 并 pip install TA-Lib")
+        return TalibBackend(talib)
+    raise ValueError(f"未知的指标后端: {name}")
+
+
+def select_backend(name=None):
+    """
+    选择全局指标后端并返回它。name 为 'auto'（默认，TA-Lib 可用时使用它）、'talib' 或 'numpy'，
+    未指定时读取环境变量 INDICATOR_BACKEND
+    """
+    global _backend
+    name = (name or os.environ.get(BACKEND_ENV) or 'auto').lower()
+    if name == 'auto':
+        name = 'talib' if _load_talib() is not None else 'numpy'
+        if name == 'numpy':
+            logger.info("TA-Lib 不可用，使用 NumPy 指标实现")
+    _backend = make_backend(name)
+    logger.debug(f"指标后端: {_backend.name}")
+    return _backend
+
+
+def get_backend(name=None):
+    """name 指定的后端；未指定时为全局后端（首次调用时按 select_backend() 的默认规则选择）"""
+    if name is not None:
+        return name if not isinstance(name, str) else make_backend(name)
+    return _backend if _backend is not None else select_backend()
+
+
+def compute_panel(close, volume=None, out=None, ma_windows=(5, 10, 20),
+                  rsi_period=14, macd_spans=(12, 26, 9), bb_window=20, bb_k=2.0,
+                  volume_window=20, high=None, low=None, atr_period=14, kdj_periods=(9, 3, 3),
+                  stoch_rsi_periods=(14, 3), backend=None):
+    """
+    一次计算整个面板的全部指标。
+
+    close/volume 为 (股票数, K线数) 数组；out 可传入 allocate_outputs 预分配的字典，
+    结果直接写入其中。返回 {列名: 数组}，列名与 calculate_technical_indicators 相同。
+    同时给出 high/low 时再计算 EXTENDED_COLUMNS 中的指标。
+    backend 为后端名称或实例，默认使用全局后端
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    kernels = get_backend(backend)
+    if out is None:
+        out = {}
+
+    def target(name):
+        if name not in out:
+            out[name] = np.empty_like(close)
+        return out[name]
+
+    for window in ma_windows:
+        kernels.sma(close, window, out=target(f'MA{window}'))
+
+    kernels.rsi(close, rsi_period, out=target('RSI'))
+
+    fast, slow, signal = macd_spans
+    macd = target('MACD')
+    np.subtract(ewm_mean(close, fast), ewm_mean(close, slow), out=macd, casting='unsafe')
+    macd_signal = ewm_mean(macd, signal, out=target('MACD_Signal'))
+    np.subtract(macd, macd_signal, out=target('MACD_Histogram'), casting='unsafe')
+
+    middle = kernels.sma(close, bb_window, out=target('BB_Middle'))
+    band = kernels.stddev(close, bb_window) * bb_k
+    np.add(middle, band, out=target('BB_Upper'), casting='unsafe')
+    np.subtract(middle, band, out=target('BB_Lower'), casting='unsafe')
+
+    if volume is not None:
+        volume = np.atleast_2d(np.asarray(volume, dtype=np.float64))
+        kernels.sma(volume, volume_window, out=target(f'Volume_MA{volume_window}'))
+
+    if high is not None and low is not None:
+        high = np.atleast_2d(np.asarray(high, dtype=np.float64))
+        low = np.atleast_2d(np.asarray(low, dtype=np.float64))
+        target('ATR')[...] = kernels.atr(high, low, close, atr_period)
+        n, m1, m2 = kdj_periods
+        for name, values in zip(('KDJ_K', 'KDJ_D', 'KDJ_J'), kdj(kernels.stochastic(high, low, close, n), m1, m2)):
+            target(name)[...] = values
+        if volume is not None:
+            target('OBV')[...] = kernels.obv(close, volume)
+        fastk, fastd = kernels.stoch_rsi(close, rsi_period, *stoch_rsi_periods)
+        target('StochRSI_K')[...] = fastk
+        target('StochRSI_D')[...] = fastd
+
+    return out
+
+
+def _row(df, column):
+    return df[column].to_numpy(dtype=np.float64)[None, :] if column in df else None
+
+
+def compute_frame(df, **params):
+    """单只股票：返回以 df.index 为索引的指标 DataFrame（有 high/low 列时含扩展指标）"""
+    result = compute_panel(_row(df, 'close'), _row(df, 'volume'),
+                           high=_row(df, 'high'), low=_row(df, 'low'), **params)
+    return pd.DataFrame({name: values[0] for name, values in result.items()}, index=df.index)
+
+
+def compute_universe(frames, **params):
+    """多只股票：右对齐成面板后一次计算，返回与 frames 顺序一致的指标 DataFrame 列表"""
+    if not frames:
+        return []
+    close = build_panel(frames, 'close')
+    volume = build_panel(frames, 'volume')
+    if all('high' in df and 'low' in df for df in frames):
+        params.update(high=build_panel(frames, 'high'), low=build_panel(frames, 'low'))
+    result = compute_panel(close, volume, **params)
+    tables = []
+    for i, df in enumerate(frames):
+        n = len(df)
+        tables.append(pd.DataFrame(
+            {name: values[i, values.shape[1] - n:] for name, values in result.items()},
+            index=df.index))
+    return tables
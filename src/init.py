@@ -4,19 +4,30 @@
 此包包含数据获取、分析和可视化核心模块
 """
 
-# 导入核心模块（按需启用）
-from .data_fetcher import fetch_stock_data
-from .analyzer import StockAnalyzer
-from .visualizer import generate_chart
-from .utils import save_report
+import importlib
 
 # 定义包级常量
 PACKAGE_NAME = "stock-analysis"
 VERSION = "1.0.0"
 
-# 包初始化逻辑（可选）
+# 核心模块按需导入：首次访问属性时才加载对应模块及其依赖（pandas/yfinance 等）
+_LAZY_EXPORTS = {
+    'fetch_stock_data': 'data_fetcher',
+    'StockAnalyzer': 'analyzer',
+    'generate_chart': 'visualizer',
+    'save_report': 'utils',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(f'.{_LAZY_EXPORTS[name]}', __package__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# 包初始化逻辑（可选，不再在导入时自动执行）
 def __init_package__():
     print(f"[{PACKAGE_NAME}] v{VERSION} 初始化完成")
-
-# 自动执行初始化
-__init_package__()
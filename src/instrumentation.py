@@ -0,0 +1,229 @@
+"""
+运行指标 - 按阶段和股票记录耗时、抓取字节数、处理行数和峰值内存，输出 JSON 汇总
+
+各模块直接调用模块级的 stage()/count()；没有启用记录器时它们几乎没有开销。
+track_memory=True 时 peak_mb 为阶段内相对阶段开始时的 tracemalloc 峰值增量（NumPy 数组的
+分配也会被计入），只在主线程的阶段上统计，线程池中的并发阶段只记录耗时和计数。
+tracemalloc 会使内存分配密集的阶段慢数倍，默认关闭，也不应与 cProfile 同时使用。
+
+用法:
+    recorder = enable()
+    with stage('fetch', symbol='AAPL') as rec:
+        df = ...
+        rec.update(rows=len(df), bytes=frame_bytes(df))
+    recorder.write('metrics.json')
+
+    profiled(main, 'run.prof')      # 用 cProfile 运行并保存统计文件
+"""
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_COUNTERS = ('rows', 'bytes')
+
+
+def frame_bytes(data):
+    """DataFrame / 数组 / OHLCVSeries 占用的字节数（不含对象列的深层大小）"""
+    if data is None:
+        return 0
+    if hasattr(data, 'memory_usage'):
+        return int(data.memory_usage(index=True).sum())
+    return int(getattr(data, 'nbytes', 0))
+
+
+def _empty():
+    return {'calls': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0, 'peak_mb': 0.0}
+
+
+class Recorder:
+    """线程安全的指标记录器"""
+
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = {}
+        self.symbols = {}
+        self._lock = threading.Lock()
+        self._stack = []  # 主线程上正在进行的阶段
+        self._owns_tracemalloc = False
+        self._offset = 0    # Python 3.8 重启跟踪前的占用（字节）
+        self._max_peak = 0  # 重启跟踪前的全程峰值（字节）
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    def _merge(self, name, symbol, seconds=0.0, calls=0, peak_mb=0.0, **counts):
+        with self._lock:
+            targets = [self.stages.setdefault(name, _empty())]
+            if symbol is not None:
+                targets.append(self.symbols.setdefault(symbol, {}).setdefault(name, _empty()))
+            for entry in targets:
+                entry['calls'] += calls
+                entry['seconds'] += seconds
+                entry['peak_mb'] = max(entry['peak_mb'], peak_mb)
+                for key in _COUNTERS:
+                    entry[key] += int(counts.get(key) or 0)
+
+    def count(self, name, symbol=None, **counts):
+        """只累加计数（rows/bytes），不计时"""
+        self._merge(name, symbol, **counts)
+
+    def _traced(self):
+        """(当前占用, 峰值)，字节；计入重启跟踪前的占用"""
+        current, peak = tracemalloc.get_traced_memory()
+        return current + self._offset, peak + self._offset
+
+    def _reset_peak(self):
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        elif self._owns_tracemalloc:
+            # Python 3.8 没有 reset_peak：重启跟踪，之前的占用记为偏移量
+            current, peak = self._traced()
+            self._max_peak = max(self._max_peak, peak)
+            tracemalloc.stop()
+            tracemalloc.start()
+            self._offset = current
+
+    def _memory_enter(self):
+        if not (self.track_memory and tracemalloc.is_tracing()
+                and threading.current_thread() is threading.main_thread()):
+            return None
+        # 外层阶段的峰值先结算，再为本阶段重新计峰值
+        current, peak = self._traced()
+        for frame in self._stack:
+            frame[1] = max(frame[1], peak)
+        self._reset_peak()
+        frame = [current, current]  # [阶段开始时的占用, 阶段内峰值]
+        self._stack.append(frame)
+        return frame
+
+    def _memory_exit(self, frame):
+        """返回阶段内相对开始时的峰值增量（MB）"""
+        if frame is None:
+            return 0.0
+        peak = self._traced()[1]
+        for outer in self._stack:
+            outer[1] = max(outer[1], peak)
+        self._stack.remove(frame)
+        return max(frame[1] - frame[0], 0) / 1e6
+
+    @contextmanager
+    def stage(self, name, symbol=None, **counts):
+        """计时一个阶段；yield 的字典可在阶段内更新 rows/bytes"""
+        record = dict(counts)
+        frame = self._memory_enter()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            self._merge(name, symbol, seconds, 1, self._memory_exit(frame), **record)
+
+    def summary(self, slowest=10):
+        """结构化汇总：总耗时、每阶段合计、每只股票明细和最慢的股票"""
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+            symbols = {symbol: {name: dict(entry) for name, entry in per.items()}
+                       for symbol, per in self.symbols.items()}
+        for entries in [stages, *symbols.values()]:
+            for entry in entries.values():
+                entry['seconds'] = round(entry['seconds'], 6)
+                entry['peak_mb'] = round(entry['peak_mb'], 3)
+        totals = sorted(((sum(entry['seconds'] for entry in per.values()), symbol)
+                         for symbol, per in symbols.items()), reverse=True)
+        result = {
+            'started_at': self.started_at,
+            'total_seconds': round(time.perf_counter() - self.started, 6),
+            'stages': stages,
+            'symbols': symbols,
+            'slowest_symbols': [{'symbol': symbol, 'seconds': round(seconds, 6)}
+                                for seconds, symbol in totals[:slowest]],
+        }
+        if tracemalloc.is_tracing():
+            result['traced_peak_mb'] = round(max(self._max_peak, self._traced()[1]) / 1e6, 3)
+        try:
+            import resource
+            # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+            scale = 1e6 if os.uname().sysname == 'Darwin' else 1e3
+            result['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 3)
+        except (ImportError, AttributeError):
+            pass
+        return result
+
+    def write(self, path):
+        summary = self.summary()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        logger.info(f"运行指标已写入 {path}")
+        return summary
+
+    def close(self):
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+
+# ---- 模块级入口：未启用时为空操作 ----
+
+_active = None
+
+
+def enable(track_memory=False):
+    """启用全局记录器并返回它；track_memory=True 时用 tracemalloc 统计峰值内存"""
+    global _active
+    _active = Recorder(track_memory)
+    return _active
+
+
+def disable():
+    """停用并返回全局记录器（可继续读取汇总）"""
+    global _active
+    recorder, _active = _active, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+
+def active():
+    return _active
+
+
+@contextmanager
+def stage(name, symbol=None, **counts):
+    if _active is None:
+        yield dict(counts)
+        return
+    with _active.stage(name, symbol, **counts) as record:
+        yield record
+
+
+def count(name, symbol=None, **counts):
+    if _active is not None:
+        _active.count(name, symbol, **counts)
+
+
+def profiled(func, path, *args, top=20, **kwargs):
+    """在 cProfile 下运行 func，统计写入 path（可用 snakeviz/pstats 查看），日志输出最耗时的函数"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler)
+        logger.info(f"性能分析结果已保存至 {path}，累计耗时前 {top} 项:")
+        stats.sort_stats('cumulative').print_stats(top)
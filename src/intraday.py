@@ -0,0 +1,273 @@
+"""
+分钟级行情 - 内存映射的列文件存储 + 分块流式计算指标，内存占用与历史长度无关
+
+每个 (数据源, 代码, 周期) 一个目录，每列一个只追加的原始二进制文件（date 为 int64 纳秒，
+价格 float32，成交量 int64），meta.json 记录行数；读取用 np.memmap，只有访问到的页才进内存。
+指标按块计算：每块向前多读 required_overlap() 根K线，滑动窗口类指标因此精确，
+EMA / Wilder RSI 这类递推指标的截断误差小于 tol（默认 1e-10，远低于 float32 的存储精度）。
+指标同样写入内存映射文件，新追加的K线只需增量计算。
+
+用法:
+    store = MmapBarStore('data_cache/intraday')
+    collect(sources, store, 'AAPL', '1m', start, end)          # 拉取并追加
+    store.compute_indicators('yfinance', 'AAPL', '1m')        # 只算新增部分
+    latest = store.latest('yfinance', 'AAPL', '1m')
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_sources import SourceUnavailable
+from data_store import INTRADAY_MINUTES, _safe_name
+from indicators import compute_panel
+from series import DEFAULT_INDICATOR_DTYPE, DEFAULT_PRICE_DTYPE, DEFAULT_VOLUME_DTYPE
+
+logger = logging.getLogger(__name__)
+
+COLUMN_DTYPES = {
+    'date': np.int64,
+    'open': DEFAULT_PRICE_DTYPE,
+    'high': DEFAULT_PRICE_DTYPE,
+    'low': DEFAULT_PRICE_DTYPE,
+    'close': DEFAULT_PRICE_DTYPE,
+    'volume': DEFAULT_VOLUME_DTYPE,
+}
+DEFAULT_CHUNK_ROWS = 500_000  # 每块约 100MB 的计算临时内存
+
+
+def required_overlap(ma_windows=(5, 10, 20), rsi_period=14, macd_spans=(12, 26, 9),
+                     bb_window=20, bb_k=2.0, volume_window=20, tol=1e-10):
+    """
+    每块需要向前多读的K线数：滑动窗口取窗口长度，递推指标取权重衰减到 tol 以下所需的长度
+    （MACD 信号线叠加在 MACD 上，两者相加）
+    """
+    def decay_bars(decay):
+        return 0 if decay <= 0 else int(np.ceil(np.log(tol) / np.log(decay)))
+
+    def ewm_bars(span):
+        return decay_bars(1.0 - 2.0 / (span + 1.0))
+
+    fast, slow, signal = macd_spans
+    return max(max(ma_windows, default=1), bb_window, volume_window,
+               max(ewm_bars(fast), ewm_bars(slow)) + ewm_bars(signal),
+               rsi_period + 1 + decay_bars((rsi_period - 1) / rsi_period))
+
+
+def chunk_ranges(start, stop, chunk_rows=DEFAULT_CHUNK_ROWS, overlap=0):
+    """[start, stop) 切成 (lo, hi, base)，[base, lo) 是为窗口预热多读的 overlap 根K线"""
+    for lo in range(start, stop, chunk_rows):
+        hi = min(lo + chunk_rows, stop)
+        yield lo, hi, max(lo - overlap, 0)
+
+
+def _map(path, dtype, rows, mode='r', start=0):
+    """映射列文件的 [start, start + rows) 部分"""
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=start * np.dtype(dtype).itemsize, shape=(rows,))
+
+
+class MmapBarStore:
+    """按 (source, symbol, interval) 分区、每列一个只追加文件的分钟K线存储"""
+
+    def __init__(self, root=os.path.join('data_cache', 'intraday')):
+        self.root = root
+
+    def _path(self, source, symbol, interval):
+        return os.path.join(self.root, _safe_name(source), _safe_name(interval), _safe_name(symbol))
+
+    def _read_meta(self, path):
+        meta_file = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_file):
+            return {'rows': 0, 'last': None}
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, path, meta):
+        tmp = os.path.join(path, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, 'meta.json'))
+
+    def rows(self, source, symbol, interval):
+        return self._read_meta(self._path(source, symbol, interval))['rows']
+
+    def append(self, source, symbol, df, interval):
+        """
+        追加K线（date/open/high/low/close/volume）。早于最后一根的丢弃；与最后一根时间相同的
+        覆盖它（盘中未收盘的K线）。只在文件末尾追加，已有数据不重写。返回总行数。
+        """
+        path = self._path(source, symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta(path)
+        rows, last = meta['rows'], meta['last']
+
+        dates = pd.to_datetime(df['date']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        order = np.argsort(dates, kind='stable')
+        dates = dates[order]
+        # 同一时间戳保留最后一条
+        keep = np.append(dates[1:] != dates[:-1], True) if len(dates) else np.zeros(0, bool)
+        index = order[keep]
+        dates = dates[keep]
+        values = {'date': dates}
+        values.update({name: df[name].to_numpy()[index] for name in COLUMN_DTYPES if name != 'date'})
+
+        # 上次写入中断时各列文件可能比 meta 记录的长，先截断
+        for name, dtype in COLUMN_DTYPES.items():
+            column_file = os.path.join(path, f'{name}.bin')
+            if os.path.exists(column_file):
+                os.truncate(column_file, rows * np.dtype(dtype).itemsize)
+
+        if last is not None and len(dates):
+            same = dates == last
+            if same.any():
+                i = int(np.flatnonzero(same)[-1])
+                for name, dtype in COLUMN_DTYPES.items():
+                    column = _map(os.path.join(path, f'{name}.bin'), dtype, rows, 'r+')
+                    column[-1] = values[name][i]
+                    column.flush()
+                    del column
+                # 最后一根K线变了，它的指标需要重算
+                if 'indicators' in meta:
+                    meta['indicators']['rows'] = min(meta['indicators']['rows'], rows - 1)
+            newer = dates > last
+            values = {name: column[newer] for name, column in values.items()}
+
+        added = len(values['date'])
+        if added:
+            for name, dtype in COLUMN_DTYPES.items():
+                with open(os.path.join(path, f'{name}.bin'), 'ab') as f:
+                    f.write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+            meta['rows'] = rows + added
+            meta['last'] = int(values['date'][-1])
+        self._write_meta(path, meta)
+        return meta['rows']
+
+    def columns(self, source, symbol, interval):
+        """只读的内存映射列 {列名: 数组}；date 为 int64 纳秒"""
+        path = self._path(source, symbol, interval)
+        rows = self._read_meta(path)['rows']
+        return {name: _map(os.path.join(path, f'{name}.bin'), dtype, rows)
+                for name, dtype in COLUMN_DTYPES.items()}
+
+    def read(self, source, symbol, interval, start=None, end=None):
+        """把 [start, end] 区间读成 DataFrame（二分查找定位，只读取该区间的页）"""
+        columns = self.columns(source, symbol, interval)
+        dates = columns['date']
+        lo = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).value, 'left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, pd.Timestamp(end).value, 'right'))
+        data = {name: np.array(values[lo:hi]) for name, values in columns.items()}
+        data['date'] = data['date'].view('datetime64[ns]')
+        return pd.DataFrame(data)
+
+    def iter_chunks(self, source, symbol, interval, columns=('close', 'volume'),
+                    chunk_rows=DEFAULT_CHUNK_ROWS, overlap=0, start=0, stop=None):
+        """
+        流式读取：产出 (lo, hi, base, {列名: [base, hi) 的 float64 数组})。
+        每块单独映射并复制后立即解除映射，常驻内存只有当前块。
+        """
+        path = self._path(source, symbol, interval)
+        stop = self._read_meta(path)['rows'] if stop is None else stop
+        for lo, hi, base in chunk_ranges(start, stop, chunk_rows, overlap):
+            chunk = {}
+            for name in columns:
+                mapped = _map(os.path.join(path, f'{name}.bin'), COLUMN_DTYPES[name], hi - base, start=base)
+                chunk[name] = np.array(mapped, dtype=np.float64)
+                del mapped
+            yield lo, hi, base, chunk
+
+    # ---- 分块指标 ----
+
+    def indicators(self, source, symbol, interval):
+        """已计算的指标 {列名: 只读内存映射数组}，长度为已计算的行数"""
+        path = self._path(source, symbol, interval)
+        meta = self._read_meta(path).get('indicators')
+        if not meta:
+            return {}
+        return {name: _map(os.path.join(path, 'indicators', f'{name}.bin'), meta['dtype'], meta['rows'])
+                for name in meta['columns']}
+
+    def compute_indicators(self, source, symbol, interval, chunk_rows=DEFAULT_CHUNK_ROWS,
+                           dtype=DEFAULT_INDICATOR_DTYPE, **params):
+        """
+        分块计算指标并写入内存映射文件；已算过的行跳过（参数变化时全部重算）。
+        峰值内存约为 (chunk_rows + overlap) 根K线的临时数组，与总行数无关。返回本次计算的行数。
+        """
+        path = self._path(source, symbol, interval)
+        meta = self._read_meta(path)
+        rows = meta['rows']
+        state = meta.get('indicators')
+        dtype = np.dtype(dtype).str
+        params = json.loads(json.dumps(params))  # 与 meta.json 中保存的形式一致，便于比较
+        if state is None or state['params'] != params or state['dtype'] != dtype:
+            state = {'params': params, 'dtype': dtype, 'rows': 0, 'columns': []}
+        done = state['rows']
+        if done >= rows:
+            return 0
+
+        overlap = required_overlap(**params)
+        out_dir = os.path.join(path, 'indicators')
+        os.makedirs(out_dir, exist_ok=True)
+        item = np.dtype(dtype).itemsize
+        for lo, hi, base, chunk in self.iter_chunks(source, symbol, interval, chunk_rows=chunk_rows,
+                                                    overlap=overlap, start=done, stop=rows):
+            result = compute_panel(chunk['close'][None, :], chunk['volume'][None, :], **params)
+            state['columns'] = list(result)
+            for name, values in result.items():
+                column_file = os.path.join(out_dir, f'{name}.bin')
+                with open(column_file, 'ab'):
+                    pass
+                if os.path.getsize(column_file) < hi * item:
+                    os.truncate(column_file, hi * item)
+                out = _map(column_file, dtype, hi - lo, 'r+', start=lo)
+                out[:] = values[0, lo - base:]
+                out.flush()
+                del out
+            logger.debug(f"{source}:{symbol} {interval} 指标 {hi}/{rows}")
+
+        state['rows'] = rows
+        meta = self._read_meta(path)
+        meta['indicators'] = state
+        self._write_meta(path, meta)
+        logger.info(f"{source}:{symbol} {interval} 指标计算完成: {rows - done} 根K线（分块 {chunk_rows}，"
+                    f"重叠 {overlap}）")
+        return rows - done
+
+    def latest(self, source, symbol, interval):
+        """最后一根K线的行情和指标"""
+        columns = self.columns(source, symbol, interval)
+        if not len(columns['date']):
+            return None
+        row = {name: values[-1].item() for name, values in columns.items()}
+        row['date'] = pd.Timestamp(row['date'])
+        indicators = self.indicators(source, symbol, interval)
+        if indicators and len(indicators[next(iter(indicators))]) == len(columns['date']):
+            row.update({name: values[-1].item() for name, values in indicators.items()})
+        return row
+
+
+def collect(sources, store, symbol, interval, start, end, names=None):
+    """
+    经数据源注册表拉取 [start, end] 的分钟K线并追加到 store；
+    依次尝试支持该周期的数据源，返回 (数据源名, 该源代码, 总行数)
+    """
+    if interval not in INTRADAY_MINUTES:
+        raise ValueError(f"不支持的分钟周期: {interval}（可选 {', '.join(INTRADAY_MINUTES)}）")
+    errors = []
+    for name in names if names is not None else sources.route_intraday(symbol, interval):
+        source = sources.get(name)
+        key = source.normalize(symbol)
+        try:
+            df = sources.call_intraday(source, key, start, end, interval)
+        except SourceUnavailable as e:
+            errors.append(str(e))
+            continue
+        if df is None or df.empty:
+            errors.append(f"{name}: 无数据")
+            continue
+        return name, key, store.append(name, key, df, interval)
+    raise SourceUnavailable(f"{symbol} {interval} 无可用数据源（{'; '.join(errors) or '未配置'}）")
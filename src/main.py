@@ -10,10 +10,6 @@ import logging
 # 添加src目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from data_fetcher import DataFetcher
-from analyzer import StockAnalyzer
-from visualizer import ChartVisualizer
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -23,6 +19,27 @@ def main():
     parser.add_argument('--symbol', nargs='+', help='股票代码')
     parser.add_argument('--days', type=int, default=30, help='分析天数')
     parser.add_argument('--test-mode', action='store_true', help='测试模式')
+    parser.add_argument('--screen', action='store_true', help='按分析规则筛选全部股票并按得分排序输出')
+    parser.add_argument('--interval', default='1d',
+                        help='K线周期：1d（默认）；分钟级 1m/5m/15m 等，追加到内存映射存储后分块计算指标；'
+                             '周期K线 1wk/1mo 或 W/M/Q/Y/2W 等，由缓存的日K线聚合')
+    parser.add_argument('--adjust', choices=('none', 'qfq', 'hfq'), default='none',
+                        help='A股复权方式：none 不复权（默认）、qfq 前复权、hfq 后复权；由缓存的不复权行情和复权因子换算')
+    parser.add_argument('--stream', action='store_true',
+                        help='从 data_cache/indicator_state 的检查点恢复增量指标，只推入新K线（当天K线以最新值替换）')
+    parser.add_argument('--compare', nargs='?', const='', metavar='BENCHMARK',
+                        help='画各股票收益率的相关系数热力图；给出基准代码（须在 --symbol 中）时加相对基准的 beta')
+    parser.add_argument('--compare-window', type=int, default=60, help='相关系数/beta 的滚动窗口（K线数）')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='把按阶段/股票的耗时、行数和字节数汇总写入 JSON（默认不记录；只给 --profile 时写入 metrics.json）')
+    parser.add_argument('--track-memory', action='store_true',
+                        help='同时用 tracemalloc 统计各阶段峰值内存（分配密集的阶段会慢数倍，与 --profile 同用时忽略）')
+    parser.add_argument('--profile', nargs='?', const='profile.prof', metavar='PATH',
+                        help='用 cProfile 运行并保存统计文件（默认 profile.prof）')
+    parser.add_argument('--force', action='store_true', help='忽略产物缓存，全部阶段重新执行')
+    parser.add_argument('--indicator-backend', choices=('auto', 'talib', 'numpy'), default=None,
+                        help='指标计算后端：auto（默认，已安装 TA-Lib 时使用）、talib 或 numpy；'
+                             '也可用环境变量 INDICATOR_BACKEND 指定')
     
     args = parser.parse_args()
     
@@ -30,22 +47,146 @@ def main():
         logger.error("请指定股票代码")
         return 1
     
+    metrics = args.metrics or ('metrics.json' if args.profile else None)
+    if not metrics:
+        return run(args)
+    
+    import instrumentation
+    
+    if args.track_memory and args.profile:
+        logger.warning("--track-memory 与 --profile 同用时不统计内存（tracemalloc 会扭曲性能分析结果）")
+    recorder = instrumentation.enable(track_memory=args.track_memory and not args.profile)
+    try:
+        if args.profile:
+            return instrumentation.profiled(run, args.profile, args)
+        return run(args)
+    finally:
+        recorder.write(metrics)
+        instrumentation.disable()
+
+def run(args):
+    """执行一次分析"""
+    from data_store import INTRADAY_MINUTES
+    from indicators import select_backend
+    
+    try:
+        select_backend(args.indicator_backend)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    
+    if args.interval in INTRADAY_MINUTES:
+        return run_intraday(args)
+    
+    # 重量级依赖（pandas 等）在参数校验通过后才导入，--help/参数错误可立即返回
+    from data_fetcher import DataFetcher
+    from analyzer import SIMPLE_MA_WINDOWS, StockAnalyzer
+    from visualizer import ChartVisualizer
+    from pipeline import Pipeline, Stage
+    from resample import parse_rule
+    
+    rule = None
+    if args.interval != '1d':
+        try:
+            parse_rule(args.interval)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+        rule = args.interval
+    
     # 初始化组件
     fetcher = DataFetcher()
     analyzer = StockAnalyzer()
     visualizer = ChartVisualizer()
     
-    # 获取数据
+    def fetch(symbols, inputs):
+        # 并发获取全部数据
+        frames = fetcher.get_many(symbols, args.days, args.test_mode, rule, args.adjust)
+        return [frames.get(symbol) for symbol in symbols]
+    
+    def analyze(symbols, inputs, **params):
+        # 行情有变化的股票的指标一次算出
+        results = analyzer.technical_analysis_many({symbol: item['fetch'] for symbol, item in zip(symbols, inputs)})
+        return [results.get(symbol) for symbol in symbols]
+    
+    def chart(symbol, inputs):
+        return visualizer.create_stock_chart(inputs['fetch'], inputs['analyze'], symbol)
+    
+    # 行情内容未变化的股票跳过分析和绘图，直接使用上次的结果
+    pipeline = Pipeline([
+        Stage('fetch', fetch, batch=True, volatile=True),
+        Stage('analyze', analyze, deps=('fetch',), batch=True, version='2',
+              params={'ma_windows': SIMPLE_MA_WINDOWS, 'rules': repr(analyzer.screener.rules)}),
+        Stage('chart', chart, deps=('fetch', 'analyze')),
+    ])
+    outputs = pipeline.run(args.symbol, force=args.force)
+    
     for symbol in args.symbol:
-        logger.info(f"分析 {symbol}")
-        
-        df = fetcher.get_stock_data(symbol, args.days, args.test_mode)
-        if df is not None:
-            result = analyzer.technical_analysis(df, symbol)
-            chart_path = visualizer.create_stock_chart(df, result, symbol)
-            
+        result = outputs.value('analyze', symbol)
+        if result is not None:
             logger.info(f"完成 {symbol} 分析: {result.recommendation}")
     
+    frames = {symbol: outputs.value('fetch', symbol) for symbol in args.symbol}
+    if args.screen:
+        table = analyzer.screen(frames)
+        logger.info("筛选结果:\n" + (table.to_string(index=False) if len(table) else "无匹配"))
+    
+    if args.stream:
+        from streaming import IndicatorState, checkpoint_path
+        for symbol, frame in frames.items():
+            if frame is None or frame.empty:
+                continue
+            state, rows = IndicatorState.resume(checkpoint_path(symbol, args.interval), frame)
+            if len(rows):
+                latest = rows.iloc[-1]
+                logger.info(f"{symbol} 增量指标: 推入 {len(rows)} 根K线，截至 {state.last_date} "
+                            f"MA20 {latest['MA20']:.2f} RSI {latest['RSI']:.1f} MACD {latest['MACD']:.3f}")
+    
+    if args.compare is not None:
+        from comparison import RollingComparison, returns_panel
+        symbols, _, returns = returns_panel(frames)
+        # 第一根K线没有收益率；窗口超过已有K线时缩到已有K线数，min_periods 随窗口减半
+        bars = max(returns.shape[1] - 1, 0)
+        window = min(args.compare_window, bars)
+        if window < 2:
+            logger.error(f"只有 {bars} 根收益率K线，不足以计算相关系数，请增大 --days")
+            return 1
+        if window < args.compare_window:
+            logger.warning(f"只有 {bars} 根收益率K线，比较窗口由 {args.compare_window} 缩小为 {window}")
+        comparison = RollingComparison(symbols, window=window).fit(returns)
+        results = {symbol: outputs.value('analyze', symbol) for symbol in symbols}
+        path = visualizer.create_comparison_chart(results, comparison, args.compare or None)
+        if args.compare in comparison.index:
+            logger.info(f"相对 {args.compare} 的 beta:\n" + comparison.versus(args.compare).to_string())
+        logger.info(f"比较图表: {path}")
+    
+    logger.info("分析完成")
+    return 0
+
+def run_intraday(args):
+    """分钟级：拉取最近 days 天的K线追加到本地存储，只对新增部分计算指标"""
+    import pandas as pd
+    from data_fetcher import sources
+    from data_sources import SourceUnavailable
+    from intraday import MmapBarStore, collect
+    from instrumentation import stage
+    
+    store = MmapBarStore()
+    end = pd.Timestamp.now()
+    start = end - pd.Timedelta(days=args.days)
+    names = ['simulated'] if args.test_mode else None
+    for symbol in args.symbol:
+        with stage('intraday', symbol) as record:
+            try:
+                source, key, rows = collect(sources, store, symbol, args.interval, start, end, names)
+            except (SourceUnavailable, ValueError) as e:
+                logger.error(str(e))
+                continue
+            record['rows'] = store.compute_indicators(source, key, args.interval)
+        latest = store.latest(source, key, args.interval)
+        logger.info(f"{symbol} {args.interval}: 共 {rows} 根K线，最新 {latest['date']} "
+                    f"收盘 {latest['close']:.2f} RSI {latest.get('RSI', float('nan')):.1f}")
+    
     logger.info("分析完成")
     return 0
 
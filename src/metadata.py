@@ -0,0 +1,191 @@
+"""
+证券元数据缓存 - 币种/交易所/名称/行业，按需加载 + 磁盘 TTL
+
+yfinance 的 ticker.info 是一次单独且很慢的请求，而报告只用到币种和交易所。
+InstrumentInfo 在第一次读取某个字段时才向数据源请求，结果按字段记录获取时间
+写入 JSON 文件，在 TTL 内的后续运行直接读缓存；refresh() 可一次并发刷新多只股票。
+给定 registry 时请求经 SourceRegistry（超时、重试、熔断）；请求在锁外进行，
+失败在 failure_ttl 内不再重试；逐字段的更新最多每 save_interval 秒写一次文件，
+退出时（或 flush()）写入其余更新。
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+
+from fetch_pool import ConcurrentFetcher
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ('currency', 'exchange', 'name', 'sector')
+DEFAULT_TTL = 7 * 24 * 3600  # 静态字段一周刷新一次
+DEFAULT_FAILURE_TTL = 300    # 请求失败后 5 分钟内不再重试该字段
+DEFAULT_SAVE_INTERVAL = 5.0
+
+
+class MetadataCache:
+    """
+    {数据源:代码: {字段: [值, 获取时间]}} 的线程安全缓存。
+    path=None 时只在内存中缓存；ttl 为秒数。
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, registry=None, failure_ttl=DEFAULT_FAILURE_TTL,
+                 save_interval=DEFAULT_SAVE_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.registry = registry
+        self.failure_ttl = failure_ttl
+        self.save_interval = save_interval
+        self._entries = None
+        self._failures = {}    # {(数据源:代码, 字段): 失败时间}，只在内存中
+        self._key_locks = {}   # 每只股票一把锁：同一股票的并发读取只请求一次
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.RLock()
+        if path:
+            atexit.register(self.flush)
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"元数据缓存 {self.path} 读取失败，将重新获取: {e}")
+        return self._entries
+
+    def _save(self):
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def flush(self):
+        """写入尚未保存的更新"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _request(self, source, symbol, fields):
+        if self.registry is not None:
+            return self.registry.call_metadata(source, symbol, fields)
+        return source.metadata(symbol, fields)
+
+    def _stale(self, source, symbol, fields, now=None):
+        """返回缺失或已过期的字段"""
+        now = now or time.time()
+        entry = self._load().get(f"{source.name}:{symbol}", {})
+        return [field for field in fields
+                if field not in entry or now - entry[field][1] > self.ttl]
+
+    def _store(self, source, symbol, values, fields):
+        now = time.time()
+        entry = self._load().setdefault(f"{source.name}:{symbol}", {})
+        # 同一次请求顺带返回的其他字段一并缓存；请求了但数据源没有的字段记为 None，避免反复请求
+        for field in set(fields) | (set(values) & set(METADATA_FIELDS)):
+            entry[field] = [values.get(field), now]
+
+    def get(self, source, symbol, field):
+        """读取一个字段；缓存缺失或过期时向数据源请求，失败时返回 None"""
+        key = f"{source.name}:{symbol}"
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if not self._stale(source, symbol, (field,)):
+                    return self._entries[key][field][0]
+                failed_at = self._failures.get((key, field))
+                if failed_at is not None and time.monotonic() - failed_at < self.failure_ttl:
+                    return None
+            try:
+                values = self._request(source, symbol, (field,))
+            except Exception as e:
+                logger.warning(f"{key} 元数据 {field} 获取失败，{self.failure_ttl}s 内不再请求: {e}")
+                with self._lock:
+                    self._failures[(key, field)] = time.monotonic()
+                return None
+            with self._lock:
+                self._failures.pop((key, field), None)
+                self._store(source, symbol, values, (field,))
+                self._dirty = True
+                if time.monotonic() - self._saved_at >= self.save_interval:
+                    self._save()
+                return self._entries[key][field][0]
+
+    def cached(self, source, symbol):
+        """已缓存的字段值（不论是否过期），不发起请求"""
+        with self._lock:
+            entry = self._load().get(f"{source.name}:{symbol}", {})
+            return {field: value for field, (value, _) in entry.items() if value is not None}
+
+    def info(self, source, symbol):
+        """返回按需加载的 InstrumentInfo"""
+        return InstrumentInfo(self, source, symbol)
+
+    def refresh(self, source, symbols, fields=METADATA_FIELDS, fetcher=None):
+        """并发刷新多只股票中缺失或过期的字段，结束后只写一次文件；返回刷新的代码数"""
+        with self._lock:
+            stale = {symbol: self._stale(source, symbol, fields) for symbol in dict.fromkeys(symbols)}
+        stale = {symbol: missing for symbol, missing in stale.items() if missing}
+        if not stale:
+            return 0
+        fetcher = fetcher or ConcurrentFetcher()
+        results = fetcher.fetch_many(list(stale), lambda symbol: self._request(source, symbol, stale[symbol]),
+                                     source_of=lambda symbol: source.name)
+        with self._lock:
+            refreshed = 0
+            for symbol, values in results.items():
+                if values is not None:
+                    self._store(source, symbol, values, stale[symbol])
+                    refreshed += 1
+            self._save()
+        return refreshed
+
+
+class InstrumentInfo(Mapping):
+    """
+    只读的元数据映射，兼容原来的 info 字典用法（info.get('currency', 'USD')）；
+    每个字段第一次读取时才加载。键固定为 METADATA_FIELDS，迭代、len 和 in 不触发请求；
+    请求失败的字段值为 None，get() 对其返回默认值。
+    """
+
+    def __init__(self, cache, source, symbol):
+        self._cache = cache
+        self._source = source
+        self._symbol = symbol
+
+    def __getitem__(self, field):
+        if field not in METADATA_FIELDS:
+            raise KeyError(field)
+        return self._cache.get(self._source, self._symbol, field)
+
+    def get(self, field, default=None):
+        value = self[field] if field in METADATA_FIELDS else None
+        return default if value is None else value
+
+    def __contains__(self, field):
+        return field in METADATA_FIELDS
+
+    def __iter__(self):
+        return iter(METADATA_FIELDS)
+
+    def __len__(self):
+        return len(METADATA_FIELDS)
+
+    def __repr__(self):
+        return f"InstrumentInfo({self._source.name}:{self._symbol})"
+
+    def __reduce__(self):
+        # 序列化（如写入流水线产物缓存）时保存为已缓存字段的普通字典，不触发请求
+        return dict, (self._cache.cached(self._source, self._symbol),)
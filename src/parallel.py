@@ -0,0 +1,206 @@
+"""
+共享内存并行分析 - 价格面板只载入一次，工作进程直接挂载，不复制也不 pickle DataFrame
+
+SharedArrays 把若干命名数组放在同一块 multiprocessing.shared_memory 中，
+传给工作进程的只有 (块名, 布局) 这个很小的描述。每个工作进程按行切片计算
+自己负责的股票，把指标直接写进共享的输出数组，主进程不需要收集结果。
+工作进程增加时内存不随之增长，吞吐随核数扩展。
+
+用法:
+    result = analyze_panel(close, volume, processes=8)      # {列名: (股票数, K线数) 数组}
+    compute_indicators_parallel(series_list, processes=8)   # 结果写回各 OHLCVSeries
+"""
+
+import logging
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from indicators import compute_panel, get_backend
+
+logger = logging.getLogger(__name__)
+
+_ALIGN = 64  # 每个数组按缓存行对齐
+
+
+def _attach(name):
+    """
+    挂载已有的共享内存块。Python 3.13+ 不登记到 resource_tracker；更早的版本中
+    spawn 工作进程与主进程共用同一个 resource_tracker，重复登记无害，由创建方 unlink 时注销。
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedArrays:
+    """
+    一块共享内存中的多个命名数组。创建方 close() 时释放（unlink）内存块，
+    挂载方只断开映射。close 之前取出的数组视图在 close 之后不可再用。
+    """
+
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                       for name, (offset, shape, dtype) in layout.items()}
+
+    @classmethod
+    def create(cls, shapes):
+        """shapes 为 {名称: (形状, dtype)}，新建共享内存块（内容未初始化）"""
+        layout, size = {}, 0
+        for name, (shape, dtype) in shapes.items():
+            dtype = np.dtype(dtype)
+            shape = tuple(int(n) for n in shape)
+            layout[name] = (size, shape, dtype.str)
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            size += -(-nbytes // _ALIGN) * _ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        return cls(shm, layout, owner=True)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """把已有数组复制进一块新的共享内存"""
+        shared = cls.create({name: (values.shape, values.dtype) for name, values in arrays.items()})
+        for name, values in arrays.items():
+            shared.arrays[name][...] = values
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        return cls(_attach(name), layout, owner=False)
+
+    @property
+    def spec(self):
+        """传给工作进程的描述（可 pickle，与数据量无关）"""
+        return self.shm.name, self.layout
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.arrays = {}  # 先释放视图，否则 shm.close() 会因仍有导出的缓冲区而失败
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_PANELS = ('close', 'volume', 'high', 'low')
+
+
+def output_columns(with_volume=True, with_range=False, **params):
+    """给定指标参数时 compute_panel 输出的列名（按输出顺序）"""
+    probe = np.full((1, 1), np.nan)
+    extra = {'high': probe, 'low': probe} if with_range else {}
+    return list(compute_panel(probe, probe if with_volume else None, **extra, **params))
+
+
+def row_blocks(n_rows, processes, block_rows=None):
+    """把行号切成 [lo, hi) 块；默认每个进程约 4 块，便于负载均衡"""
+    block_rows = block_rows or max(1, -(-n_rows // (processes * 4)))
+    return [(lo, min(lo + block_rows, n_rows)) for lo in range(0, n_rows, block_rows)]
+
+
+# ---- 工作进程 ----
+
+_worker = {}
+
+
+def _init_worker(input_spec, output_spec, params):
+    _worker.update(inputs=SharedArrays.attach(input_spec),
+                   outputs=SharedArrays.attach(output_spec), params=params)
+
+
+def _compute_rows(bounds):
+    """计算 [lo, hi) 行的指标，直接写入共享输出数组的对应切片"""
+    lo, hi = bounds
+    inputs, outputs = _worker['inputs'], _worker['outputs']
+    panels = {name: inputs[name][lo:hi] for name in _PANELS if name in inputs}
+    out = {name: values[lo:hi] for name, values in outputs.arrays.items()}
+    compute_panel(**panels, out=out, **_worker['params'])
+    return hi - lo
+
+
+def run_shared(inputs, processes, block_rows=None, **params):
+    """
+    对已在共享内存中的 close/volume（及可选的 high/low）面板并行计算指标，返回输出的
+    SharedArrays（调用方负责 close）。面板需为 float64。工作进程使用与主进程相同的指标后端
+    """
+    close = inputs['close']
+    params.setdefault('backend', get_backend().name)
+    columns = output_columns('volume' in inputs, 'high' in inputs and 'low' in inputs, **params)
+    outputs = SharedArrays.create({name: (close.shape, np.float64) for name in columns})
+    try:
+        blocks = row_blocks(len(close), processes, block_rows)
+        with get_context('spawn').Pool(processes, initializer=_init_worker,
+                                       initargs=(inputs.spec, outputs.spec, params)) as pool:
+            done = sum(pool.imap_unordered(_compute_rows, blocks))
+    except BaseException:
+        outputs.close()
+        raise
+    logger.info(f"并行指标计算完成: {done} 只 × {close.shape[1]} 根K线，{processes} 个进程")
+    return outputs
+
+
+def analyze_panel(close, volume=None, processes=None, block_rows=None, high=None, low=None, **params):
+    """
+    与 compute_panel 结果相同。processes=None/1 时在当前进程内计算；
+    否则面板复制进共享内存一次，由进程池分块计算，返回结果的普通数组副本。
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    if not processes or processes <= 1 or len(close) <= 1:
+        return compute_panel(close, volume, high=high, low=low, **params)
+    arrays = {'close': close}
+    for name, values in (('volume', volume), ('high', high), ('low', low)):
+        if values is not None:
+            arrays[name] = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    with SharedArrays.from_arrays(arrays) as inputs:
+        with run_shared(inputs, processes, block_rows, **params) as outputs:
+            return {name: values.copy() for name, values in outputs.arrays.items()}
+
+
+def compute_indicators_parallel(series_list, processes=None, block_rows=None, **params):
+    """
+    OHLCVSeries 列表：收盘价、成交量和最高/最低价直接右对齐写入共享面板（不经过中间数组），
+    并行计算后把各自的指标写回 indicators。结果与 compute_indicators_many 相同。
+    """
+    from series import compute_indicators_many
+
+    series_list = list(series_list)
+    if not processes or processes <= 1 or len(series_list) <= 1:
+        return compute_indicators_many(series_list, **params)
+    length = max(len(s) for s in series_list)
+    shape = (len(series_list), length)
+    with SharedArrays.create({name: (shape, np.float64) for name in _PANELS}) as inputs:
+        for name in _PANELS:
+            panel = inputs[name]
+            for i, s in enumerate(series_list):
+                pad = length - len(s)
+                panel[i, :pad] = np.nan
+                panel[i, pad:] = getattr(s, name)
+        del panel  # 视图须在共享内存关闭前释放
+        with run_shared(inputs, processes, block_rows, **params) as outputs:
+            for i, s in enumerate(series_list):
+                pad = length - len(s)
+                s.indicators = {name: values[i, pad:].astype(s.indicator_dtype)
+                                for name, values in outputs.arrays.items()}
+    return series_list
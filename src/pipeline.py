@@ -0,0 +1,252 @@
+"""
+阶段流水线 - 按依赖图运行 fetch → indicators → report → chart，输入未变化的阶段直接复用上次的产物
+
+每个阶段的输出按键保存在本地产物缓存（ArtifactCache）中。键由阶段名、版本、参数、
+股票以及各上游输出的键哈希得到；volatile 阶段（如 fetch）每次都执行，键取输出内容的哈希。
+因此行情没有变化时（周末、节假日）下游全部命中缓存；只改某个阶段的参数（如图表 dpi）
+只有该阶段及其下游重新执行。命中缓存的阶段不读取产物，只有要执行的阶段才加载上游输出。
+
+阶段函数:
+    func(item, inputs, **params)                 inputs 为 {上游阶段名: 输出}
+    func(items, inputs_list, **params)           batch=True 时一次处理全部需要执行的股票，返回同序列表
+输出为 None 表示该股票本阶段无结果：不缓存（下次重试），其下游阶段跳过。
+
+用法:
+    pipeline = Pipeline([
+        Stage('fetch', fetch_all, batch=True, volatile=True),
+        Stage('indicators', compute_all, deps=('fetch',), batch=True, params={'rsi_period': 14}),
+        Stage('chart', draw, deps=('indicators',), params={'dpi': 100}, valid=os.path.exists),
+    ])
+    result = pipeline.run(symbols)
+    result.value('chart', 'AAPL')
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = os.path.join('data_cache', 'artifacts')
+
+
+def _update(h, value):
+    """把值的内容（而非对象身份）写入哈希"""
+    if value is None:
+        h.update(b'N')
+    elif isinstance(value, np.ndarray):
+        h.update(f"A{value.dtype.str}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, pd.DataFrame):
+        h.update(b'F')
+        _update(h, [str(name) for name in value.columns])
+        for name in value.columns:
+            _update(h, value[name].to_numpy())
+    elif isinstance(value, pd.Series):
+        _update(h, value.to_numpy())
+    elif isinstance(value, dict):
+        h.update(b'D')
+        for key in sorted(value, key=str):
+            _update(h, str(key))
+            _update(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"L{len(value)}".encode())
+        for item in value:
+            _update(h, item)
+    elif hasattr(type(value), '__slots__'):
+        # OHLCVSeries 等 __slots__ 类按各字段计算
+        h.update(type(value).__name__.encode())
+        for name in type(value).__slots__:
+            _update(h, getattr(value, name, None))
+    else:
+        h.update(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    h.update(b'\0')
+
+
+def content_digest(value):
+    """DataFrame / 数组 / OHLCVSeries / 字典等的内容哈希"""
+    h = hashlib.sha256()
+    _update(h, value)
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """以键为文件名的 pickle 产物缓存"""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.pkl")
+
+    def has(self, key):
+        return os.path.exists(self._path(key))
+
+    def load(self, key):
+        with open(self._path(key), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def prune(self, keep):
+        """删除 keep 之外的产物，返回删除的个数"""
+        keep = set(keep)
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.pkl') and name[:-4] not in keep:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        return removed
+
+
+@dataclass
+class Stage:
+    """流水线中的一个阶段"""
+    name: str
+    func: Callable
+    deps: Tuple[str, ...] = ()
+    params: Dict = field(default_factory=dict)
+    version: str = '1'         # 阶段实现变化时修改，使旧产物失效
+    volatile: bool = False     # 每次都执行，键取输出内容的哈希（如 fetch）
+    batch: bool = False        # 一次调用处理全部需要执行的股票
+    valid: Optional[Callable] = None  # 缓存的产物是否仍可用（如图表文件仍存在）
+
+    def key(self, item, dep_keys):
+        payload = json.dumps([self.name, self.version, self.params, item, dep_keys],
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class PipelineRun:
+    """一次运行的结果：各 (阶段, 股票) 的键，输出按需从缓存加载"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.keys = {}
+        self.values = {}
+        self.stats = {}
+
+    def key(self, stage, item):
+        return self.keys.get((stage, item))
+
+    def value(self, stage, item, default=None):
+        """阶段输出；本次未执行的从缓存读取，无结果时返回 default"""
+        if (stage, item) in self.values:
+            return self.values[(stage, item)]
+        key = self.keys.get((stage, item))
+        if key is None:
+            return default
+        value = self.values[(stage, item)] = self.cache.load(key)
+        return value
+
+    def executed(self, stage):
+        return self.stats.get(stage, {}).get('run', 0)
+
+    def artifacts(self):
+        """本次用到的缓存产物的键（可传给 ArtifactCache.prune 清理其余的）"""
+        return {key for key in self.keys.values() if key is not None and self.cache.has(key)}
+
+
+class Pipeline:
+    """按依赖顺序执行各阶段，输入哈希未变化的 (阶段, 股票) 直接复用缓存"""
+
+    def __init__(self, stages, cache=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache = cache if cache is not None else ArtifactCache()
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 依赖未定义的阶段: {missing}")
+
+    def order(self, targets=None):
+        """targets 及其上游阶段的拓扑顺序（默认全部阶段）"""
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError(f"阶段依赖存在环: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in targets or self.stages:
+            visit(name)
+        return [self.stages[name] for name in ordered]
+
+    def run(self, items, targets=None, force=False):
+        """
+        对 items（股票代码或请求元组）运行 targets 及其上游阶段，返回 PipelineRun。
+        force=True 或阶段名集合时忽略这些阶段的缓存
+        """
+        items = list(items)
+        result = PipelineRun(self.cache)
+        for stage in self.order(targets):
+            forced = force is True or (force and stage.name in force)
+            pending, skipped, cached = {}, 0, 0
+            for item in items:
+                dep_keys = [result.key(dep, item) for dep in stage.deps]
+                if any(key is None for key in dep_keys):
+                    skipped += 1
+                    continue
+                key = None if stage.volatile else stage.key(item, dep_keys)
+                if key is not None and not forced and self._is_cached(result, stage, item, key):
+                    result.keys[(stage.name, item)] = key
+                    cached += 1
+                    continue
+                pending[item] = key
+            self._execute(result, stage, pending)
+            result.stats[stage.name] = {'run': len(pending), 'cached': cached, 'skipped': skipped}
+            logger.info(f"阶段 {stage.name}: 执行 {len(pending)}，缓存命中 {cached}，无输入跳过 {skipped}")
+        return result
+
+    def _is_cached(self, result, stage, item, key):
+        if not self.cache.has(key):
+            return False
+        if stage.valid is None:
+            return True
+        result.keys[(stage.name, item)] = key
+        if stage.valid(result.value(stage.name, item)):
+            return True
+        del result.keys[(stage.name, item)]
+        result.values.pop((stage.name, item), None)
+        return False
+
+    def _execute(self, result, stage, pending):
+        if not pending:
+            return
+        items = list(pending)
+        inputs = [{dep: result.value(dep, item) for dep in stage.deps} for item in items]
+        if stage.batch:
+            outputs = list(stage.func(items, inputs, **stage.params))
+        else:
+            outputs = [stage.func(item, item_inputs, **stage.params) for item, item_inputs in zip(items, inputs)]
+        for item, value in zip(items, outputs):
+            if value is None:
+                continue
+            key = pending[item]
+            if key is None:
+                key = hashlib.sha256(f"{stage.name}:{stage.version}:{content_digest(value)}".encode()).hexdigest()
+            else:
+                self.cache.save(key, value)
+            result.keys[(stage.name, item)] = key
+            result.values[(stage.name, item)] = value
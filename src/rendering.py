@@ -0,0 +1,206 @@
+"""
+K线图渲染 - 批量绘制 + 复用画布 + 多进程
+
+全部影线、实体和成交量柱各用一次 vlines 画成一个 LineCollection，
+同一个渲染器在多只股票之间复用 Figure/Axes，多图渲染可分发到进程池。
+"""
+
+import logging
+import os
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DPI = 100
+
+_worker_renderer = None
+
+
+def _use_backend(backend):
+    import matplotlib
+    matplotlib.use(backend, force=True)
+
+
+class CandleRenderer:
+    """可复用的K线图渲染器（主图K线 + 均线，副图成交量）"""
+
+    def __init__(self, figsize=(12, 10), dpi=DEFAULT_DPI, style='seaborn-v0_8'):
+        self.figsize = figsize
+        self.dpi = dpi
+        self.style = style
+        self.fig = None
+        self.ax_price = None
+        self.ax_volume = None
+
+    def _ensure_figure(self):
+        import matplotlib.pyplot as plt
+        if self.fig is None:
+            if self.style:
+                plt.style.use(self.style)
+            self.fig, (self.ax_price, self.ax_volume) = plt.subplots(
+                2, 1, figsize=self.figsize, gridspec_kw={'height_ratios': [3, 1]})
+            # 固定边距代替 tight_layout/bbox_inches='tight'，每次保存少两遍完整绘制
+            self.fig.subplots_adjust(left=0.09, right=0.97, top=0.95, bottom=0.06, hspace=0.15)
+        else:
+            self.ax_price.cla()
+            self.ax_volume.cla()
+        return self.fig
+
+    def _bar_width(self, ax, n, max_width):
+        """按坐标轴宽度估算每根K线可用的线宽（单位：点）"""
+        width_pts = ax.get_window_extent().width * 72.0 / self.fig.dpi
+        return float(np.clip(0.7 * width_pts / max(n, 1), 0.5, max_width))
+
+    def render(self, df, indicators=None, title='', save_path=None, dpi=None):
+        """
+        绘制一只股票。df 为含 date/open/high/low/close/volume 列的 DataFrame 或 OHLCVSeries，
+        indicators 可选（DataFrame 或带指标的 OHLCVSeries），含 MA5/MA20 列时画均线。返回 Figure。
+        """
+        import matplotlib.dates as mdates
+
+        fig = self._ensure_figure()
+        ax1, ax2 = self.ax_price, self.ax_volume
+
+        x = mdates.date2num(np.asarray(df['date'], dtype='datetime64[ns]'))
+        open_ = np.asarray(df['open'], dtype=float)
+        high = np.asarray(df['high'], dtype=float)
+        low = np.asarray(df['low'], dtype=float)
+        close = np.asarray(df['close'], dtype=float)
+        volume = np.asarray(df['volume'], dtype=float)
+
+        # K线：影线、实体各一次批量绘制
+        candle_colors = np.where(close > open_, 'red', 'green')
+        body_width = self._bar_width(ax1, len(x), 6)
+        ax1.vlines(x, low, high, colors=candle_colors, linewidth=1)
+        ax1.vlines(x, np.minimum(open_, close), np.maximum(open_, close),
+                   colors=candle_colors, linewidth=body_width)
+
+        # 移动平均线
+        if indicators is not None:
+            for name in ('MA5', 'MA20'):
+                if name in indicators:
+                    ax1.plot(x, np.asarray(indicators[name], dtype=float), label=name, linewidth=1, alpha=0.8)
+
+        ax1.set_title(title, fontsize=14, fontweight='bold')
+        ax1.set_ylabel('价格', fontsize=12)
+        if ax1.get_legend_handles_labels()[0]:
+            ax1.legend()
+        ax1.grid(True, alpha=0.3)
+
+        # 成交量
+        volume_colors = np.where(close >= open_, 'green', 'red')
+        ax2.vlines(x, 0, volume, colors=volume_colors, linewidth=body_width, alpha=0.7)
+        ax2.set_ylabel('成交量', fontsize=12)
+        ax2.grid(True, alpha=0.3)
+
+        # 日期格式：短周期沿用按周刻度，长周期交给自动刻度
+        span_days = (x[-1] - x[0]) if len(x) else 0
+        for ax in (ax1, ax2):
+            ax.xaxis_date()
+            if span_days <= 180:
+                ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
+                ax.xaxis.set_major_locator(mdates.WeekdayLocator(interval=2))
+            else:
+                locator = mdates.AutoDateLocator()
+                ax.xaxis.set_major_locator(locator)
+                ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+        if save_path:
+            directory = os.path.dirname(save_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fig.savefig(save_path, dpi=dpi or self.dpi)
+        return fig
+
+    def close(self):
+        if self.fig is not None:
+            import matplotlib.pyplot as plt
+            plt.close(self.fig)
+            self.fig = None
+
+
+def _init_worker(backend, dpi):
+    global _worker_renderer
+    _use_backend(backend)
+    _worker_renderer = CandleRenderer(dpi=dpi)
+
+
+def _render_job(job):
+    df, indicators, title, save_path = job
+    try:
+        _worker_renderer.render(df, indicators, title, save_path)
+        return save_path
+    except Exception as e:
+        logger.error(f"渲染 {save_path} 失败: {e}")
+        return None
+
+
+def render_many(jobs, processes=None, dpi=DEFAULT_DPI, backend='Agg'):
+    """
+    渲染多张图表。jobs 为 (df, indicators, title, save_path) 列表；
+    processes=None/1 时在当前进程内复用同一个渲染器，否则使用进程池，
+    每个工作进程使用非交互后端并各自复用一个渲染器。返回成功保存的路径列表。
+    """
+    jobs = list(jobs)
+    if not processes or processes <= 1 or len(jobs) <= 1:
+        _init_worker(backend, dpi)
+        try:
+            results = [_render_job(job) for job in jobs]
+        finally:
+            _worker_renderer.close()
+    else:
+        with get_context('spawn').Pool(processes, initializer=_init_worker,
+                                       initargs=(backend, dpi)) as pool:
+            results = pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (processes * 4)))
+    return [path for path in results if path]
+
+
+def render_comparison(symbols, corr, versus=None, title='', save_path=None, dpi=DEFAULT_DPI, max_labels=60):
+    """
+    相关系数热力图（按 comparison.cluster_order 排序，相关性高的股票相邻），
+    versus 为 RollingComparison.versus 的结果时右侧加各股票相对基准的 beta。
+    股票多于 max_labels 时不标注代码，beta 只画最高和最低的各 max_labels // 2 只。返回保存路径
+    """
+    import matplotlib.pyplot as plt
+    from comparison import cluster_order
+
+    order = cluster_order(corr)
+    corr = np.asarray(corr)[np.ix_(order, order)]
+    labels = [symbols[i] for i in order]
+    if versus is not None:
+        fig, (ax, ax_beta) = plt.subplots(1, 2, figsize=(16, 9), gridspec_kw={'width_ratios': [3, 1]})
+    else:
+        fig, ax = plt.subplots(figsize=(10, 9))
+    try:
+        image = ax.imshow(corr, cmap='RdBu_r', vmin=-1, vmax=1, interpolation='nearest')
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
+        if len(labels) <= max_labels:
+            ax.set_xticks(range(len(labels)), labels, rotation=90, fontsize=7)
+            ax.set_yticks(range(len(labels)), labels, fontsize=7)
+        else:
+            ax.set_xticks([])
+            ax.set_yticks([])
+        ax.set_title(title or f'相关系数（{len(labels)} 只）')
+
+        if versus is not None:
+            beta = versus['beta'].dropna().sort_values()
+            if len(beta) > max_labels:
+                beta = pd.concat([beta.iloc[:max_labels // 2], beta.iloc[-(max_labels // 2):]])
+            ax_beta.barh(range(len(beta)), beta.to_numpy(),
+                         color=np.where(beta.to_numpy() >= 1, 'red', 'green'))
+            ax_beta.axvline(1.0, color='gray', linewidth=0.8, linestyle='--')
+            ax_beta.set_yticks(range(len(beta)), [str(s) for s in beta.index], fontsize=7)
+            ax_beta.set_title('Beta')
+
+        fig.tight_layout()
+        if save_path:
+            directory = os.path.dirname(save_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fig.savefig(save_path, dpi=dpi)
+    finally:
+        plt.close(fig)
+    return save_path
@@ -0,0 +1,218 @@
+"""
+批量报告渲染 - 模板只编译一次，一次生成全部股票的报告和一个索引页
+
+模板使用 {{ name }} 占位符（reports/template.md、docs/report-template.md），
+编译为 str.format_map 格式串，渲染时不再解析。每个输出文件记录其输入的哈希
+（模板内容 + 模板实际用到的字段，不含 timestamp 这类每次都变的字段），
+哈希未变化的文件直接跳过，不重写也不计入 changed 列表。
+
+用法:
+    renderer = ReportRenderer(ReportTemplate.from_file('reports/template.md'), 'reports/generated')
+    stats = renderer.render_all([report_context(report, period='1mo') for report in reports])
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_FIELD = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+# 不参与哈希的字段：只有它们变化时不重写报告
+VOLATILE_FIELDS = ('timestamp',)
+MANIFEST_NAME = '.manifest.json'
+CHANGED_NAME = 'changed.txt'
+
+INDEX_TEMPLATE = """# 股票分析报告索引
+
+更新时间: {{ timestamp }}
+
+| 代码 | 当前价格 | 涨跌幅 | RSI | 报告 |
+|------|----------|--------|-----|------|
+{{ rows }}
+"""
+INDEX_ROW_TEMPLATE = ("| {{ symbol }} | {{ current_price }} {{ currency }} | {{ change_pct }}% "
+                      "| {{ rsi }} | [查看]({{ report_link }}) |")
+
+
+class _Blank(dict):
+    """缺失的字段渲染为空字符串"""
+
+    def __missing__(self, key):
+        return ''
+
+
+class ReportTemplate:
+    """编译后的 {{ name }} 模板"""
+
+    def __init__(self, source, name='<string>'):
+        self.source = source
+        self.name = name
+        parts = _FIELD.split(source)
+        literals = [part.replace('{', '{{').replace('}', '}}') for part in parts[0::2]]
+        names = parts[1::2]
+        self._format = ''.join(literal + ('{' + names[i] + '}' if i < len(names) else '')
+                               for i, literal in enumerate(literals))
+        self.fields = tuple(dict.fromkeys(names))
+        self.digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f.read(), name=path)
+
+    def render(self, context):
+        return self._format.format_map(_Blank(context))
+
+    def inputs_digest(self, context, volatile=VOLATILE_FIELDS):
+        """模板内容和模板用到的（非易变）字段的哈希"""
+        used = {name: context.get(name) for name in self.fields if name not in volatile}
+        payload = json.dumps(used, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256((self.digest + payload).encode('utf-8')).hexdigest()
+
+
+def _fmt(value, digits=2):
+    if value is None:
+        return 'N/A'
+    if isinstance(value, float):
+        return 'N/A' if value != value else f"{value:,.{digits}f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return str(value)
+
+
+def report_context(report, **extra):
+    """
+    把 generate_report 的结果转换为模板字段（数字格式化为字符串），
+    并补齐模板用到的派生字段：macd_diff、rsi_status；extra 原样加入（如 period、chart_path）
+    """
+    context = {key: _fmt(value) for key, value in report.items()}
+    context['macd_diff'] = _fmt(report.get('macd_diff', report.get('macd')), 4)
+    rsi = report.get('rsi')
+    if rsi is None or rsi != rsi:
+        context['rsi_status'] = ''
+    else:
+        context['rsi_status'] = '超买' if rsi > 70 else '超卖' if rsi < 30 else '正常'
+    context.update({key: _fmt(value) for key, value in extra.items()})
+    return context
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class Manifest:
+    """输出目录中 {相对路径: 输入哈希} 的记录"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"报告清单 {self.path} 读取失败，将全部重新生成: {e}")
+
+    def is_current(self, path, digest):
+        rel = os.path.relpath(path, self.directory)
+        return self.entries.get(rel) == digest and os.path.exists(path)
+
+    def record(self, path, digest):
+        self.entries[os.path.relpath(path, self.directory)] = digest
+
+    def save(self):
+        _write_atomic(self.path, json.dumps(self.entries, ensure_ascii=False, sort_keys=True, indent=0))
+
+
+def write_if_changed(manifest, path, digest, render):
+    """哈希与清单记录不同（或文件不存在）时才渲染并写入；返回是否写入"""
+    if manifest.is_current(path, digest):
+        return False
+    _write_atomic(path, render())
+    manifest.record(path, digest)
+    return True
+
+
+@dataclass
+class RenderStats:
+    written: List[str] = field(default_factory=list)
+    skipped: int = 0
+
+
+class ReportRenderer:
+    """
+    一次渲染全部股票的报告和索引页。contexts 为 report_context 的结果列表，
+    每项须有 symbol；结束后更新清单，并把本次写入的文件（相对路径）写入 changed.txt，
+    供 CI 只上传有变化的报告。
+    """
+
+    def __init__(self, template, out_dir, index_template=INDEX_TEMPLATE, index_row=INDEX_ROW_TEMPLATE,
+                 filename='{symbol}.md', index_name='index.md', volatile=VOLATILE_FIELDS):
+        self.template = template if isinstance(template, ReportTemplate) else ReportTemplate.from_file(template)
+        self.index_template = (index_template if isinstance(index_template, ReportTemplate)
+                               else ReportTemplate(index_template, '<index>'))
+        self.index_row = index_row if isinstance(index_row, ReportTemplate) else ReportTemplate(index_row, '<row>')
+        self.out_dir = out_dir
+        self.filename = filename
+        self.index_name = index_name
+        self.volatile = volatile
+
+    def report_path(self, symbol):
+        return os.path.join(self.out_dir, self.filename.format(symbol=str(symbol).replace(os.sep, '_')))
+
+    def pending(self, contexts):
+        """报告需要重新生成的代码（可据此只为这些股票绘图）"""
+        manifest = Manifest(self.out_dir)
+        return [context['symbol'] for context in contexts
+                if not manifest.is_current(self.report_path(context['symbol']),
+                                           self.template.inputs_digest(context, self.volatile))]
+
+    def render_all(self, contexts, index_context=None):
+        contexts = list(contexts)
+        manifest = Manifest(self.out_dir)
+        stats = RenderStats()
+
+        for context in contexts:
+            path = self.report_path(context['symbol'])
+            digest = self.template.inputs_digest(context, self.volatile)
+            if write_if_changed(manifest, path, digest, lambda: self.template.render(context)):
+                stats.written.append(path)
+            else:
+                stats.skipped += 1
+
+        # 索引页：每行的输入哈希合并为索引的哈希，任何一行变化才重写
+        rows = []
+        for context in contexts:
+            link = os.path.relpath(self.report_path(context['symbol']), self.out_dir).replace(os.sep, '/')
+            rows.append({**context, 'report_link': link})
+        index_context = {'timestamp': contexts[0].get('timestamp', '') if contexts else '', **(index_context or {})}
+        row_digests = ''.join(self.index_row.inputs_digest(row, self.volatile) for row in rows)
+        digest = hashlib.sha256((self.index_template.inputs_digest(index_context, self.volatile)
+                                 + row_digests).encode('utf-8')).hexdigest()
+        index_path = os.path.join(self.out_dir, self.index_name)
+
+        def render_index():
+            body = '\n'.join(self.index_row.render(row) for row in rows)
+            return self.index_template.render({**index_context, 'rows': body})
+
+        if write_if_changed(manifest, index_path, digest, render_index):
+            stats.written.append(index_path)
+        else:
+            stats.skipped += 1
+
+        manifest.save()
+        changed = [os.path.relpath(path, self.out_dir).replace(os.sep, '/') for path in stats.written]
+        _write_atomic(os.path.join(self.out_dir, CHANGED_NAME), ''.join(f"{rel}\n" for rel in changed))
+        logger.info(f"报告渲染完成: 写入 {len(stats.written)} 个，跳过 {stats.skipped} 个未变化的")
+        return stats
@@ -0,0 +1,216 @@
+"""
+K线周期转换 - 由日K线聚合出周K、月K或自定义周期K线
+
+每根K线取周期内第一根的开盘、最高价的最大值、最低价的最小值、最后一根的收盘
+和成交量之和，日期为周期内最后一个交易日。周期编号由日期直接算出（按天或按月整除），
+段边界用一次比较得到，再用 ufunc.reduceat 一次聚合全部段；多只股票拼接后
+按 (股票, 周期) 分段，同样一次算完，没有逐组的 Python 循环。
+
+新的日K线到达时只有最后一个周期可能还没走完：update_bars 只从该周期的
+第一天开始重新聚合，之前已收盘的周期原样保留。resample_stored 把结果缓存在
+OHLCVStore 中（interval 为 resample_<周期>），多周期视图不再需要请求上游。
+
+周期写法: 'W' 周、'M' 月、'Q' 季、'Y' 年，可带倍数如 '2W'、'6M'；'5D' 为按自然日等分。
+也接受 yfinance 的 '1wk'、'1mo'、'3mo'。
+
+用法:
+    weekly = resample_many(series_list, 'W')         # OHLCVSeries 列表，一次聚合
+    bars = update_bars(bars, daily, 'M')              # 只重算未收盘的月份
+    df = resample_stored(store, 'yfinance', 'AAPL', 'W')
+"""
+
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+from data_store import OHLCV_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# yfinance 周期名对应的规则
+INTERVAL_RULES = {'1wk': 'W', '1mo': 'M', '3mo': 'Q'}
+
+_RULE = re.compile(r'(\d*)([DWMQY])')
+_MONTHS = {'M': 1, 'Q': 3, 'Y': 12}
+# 1970-01-01 是星期四，按天计数加 3 后整除 7 使每周从星期一开始
+_WEEK_OFFSET = 3
+
+
+def parse_rule(rule):
+    """
+    解析周期，返回 (单位, 跨度, 偏移)：单位为 'D'（跨度按天）或 'M'（跨度按月）。
+    不支持的写法抛 ValueError
+    """
+    rule = INTERVAL_RULES.get(rule, rule)
+    match = _RULE.fullmatch(str(rule).strip().upper())
+    if not match or match.group(1) == '0':
+        raise ValueError(f"不支持的K线周期: {rule}")
+    n, unit = int(match.group(1) or 1), match.group(2)
+    if unit == 'D':
+        return 'D', n, 0
+    if unit == 'W':
+        return 'D', 7 * n, _WEEK_OFFSET
+    return 'M', _MONTHS[unit] * n, 0
+
+
+def canonical_rule(rule):
+    """规范写法（如 'w' → '1W'、'1mo' → '1M'），用作缓存目录名"""
+    rule = INTERVAL_RULES.get(rule, rule)
+    parse_rule(rule)
+    match = _RULE.fullmatch(str(rule).strip().upper())
+    return f"{match.group(1) or 1}{match.group(2)}"
+
+
+def period_keys(dates, rule):
+    """每个日期所属周期的编号（int64，随日期单调不减）"""
+    unit, span, offset = parse_rule(rule)
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    if unit == 'D':
+        units = dates.astype('datetime64[D]').astype(np.int64) + offset
+    else:
+        units = dates.astype('datetime64[M]').astype(np.int64)
+    return units // span
+
+
+def period_start(key, rule):
+    """周期编号对应的第一天（datetime64[ns]）"""
+    unit, span, offset = parse_rule(rule)
+    if unit == 'D':
+        return np.datetime64(int(key) * span - offset, 'D').astype('datetime64[ns]')
+    return np.datetime64(int(key) * span, 'M').astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def _columns(data):
+    """DataFrame / OHLCVSeries / 列字典 → {列名: 数组}（不复制）"""
+    if isinstance(data, pd.DataFrame):
+        data = data.rename(columns=str.lower)
+    columns = {name: np.asarray(data[name]) for name in OHLCV_COLUMNS}
+    columns['date'] = columns['date'].astype('datetime64[ns]', copy=False)
+    return columns
+
+
+def aggregate(columns, starts):
+    """按段起点 starts 把列聚合为K线；最高/最低忽略 NaN（停牌日）"""
+    n = len(columns['date'])
+    ends = np.append(starts[1:], n) - 1
+    return {
+        'date': columns['date'][ends],
+        'open': columns['open'][starts],
+        'high': np.fmax.reduceat(columns['high'], starts),
+        'low': np.fmin.reduceat(columns['low'], starts),
+        'close': columns['close'][ends],
+        'volume': np.add.reduceat(columns['volume'], starts),
+    }
+
+
+def resample_columns(columns, rule, groups=None):
+    """
+    columns 按 (groups, 日期) 升序；groups 为每行所属股票的编号（单只股票时为 None）。
+    返回 (K线列字典, 每根K线的股票编号或 None)
+    """
+    keys = period_keys(columns['date'], rule)
+    if not len(keys):
+        return {name: values[:0] for name, values in columns.items()}, None if groups is None else groups[:0]
+    change = keys[1:] != keys[:-1]
+    if groups is not None:
+        change |= groups[1:] != groups[:-1]
+    starts = np.flatnonzero(np.concatenate(([True], change)))
+    bars = aggregate(columns, starts)
+    return bars, None if groups is None else groups[starts]
+
+
+def resample_frame(df, rule):
+    """DataFrame（date/open/... 或 Date/Open/... 列）→ 小写列名的K线 DataFrame"""
+    bars, _ = resample_columns(_columns(df), rule)
+    return pd.DataFrame(bars)
+
+
+def _to_series(template, bars):
+    from series import OHLCVSeries
+
+    return OHLCVSeries(template.symbol, bars['date'], bars['open'], bars['high'], bars['low'],
+                       bars['close'], bars['volume'], source=template.source, info=template.info,
+                       price_dtype=template.close.dtype, volume_dtype=template.volume.dtype,
+                       indicator_dtype=template.indicator_dtype)
+
+
+def resample_series(series, rule):
+    """一只 OHLCVSeries → 同一股票的周期K线 OHLCVSeries（不含指标）"""
+    bars, _ = resample_columns(_columns(series), rule)
+    return _to_series(series, bars)
+
+
+def resample_many(series_list, rule):
+    """
+    多只 OHLCVSeries 拼接后一次聚合，返回顺序一致的周期K线列表。
+    各列只拼接一次，段边界同时按股票和周期切分
+    """
+    series_list = list(series_list)
+    if not series_list:
+        return []
+    lengths = np.array([len(s) for s in series_list])
+    columns = {name: np.concatenate([s.column(name) for s in series_list]) for name in OHLCV_COLUMNS}
+    groups = np.repeat(np.arange(len(series_list)), lengths)
+    bars, bar_groups = resample_columns(columns, rule, groups)
+    bounds = np.cumsum(np.bincount(bar_groups, minlength=len(series_list)))[:-1]
+    parts = {name: np.split(values, bounds) for name, values in bars.items()}
+    return [_to_series(s, {name: parts[name][i] for name in OHLCV_COLUMNS})
+            for i, s in enumerate(series_list)]
+
+
+def update_bars(bars, daily, rule):
+    """
+    已聚合的K线 bars 加上最新日K线 daily（可为完整历史），返回更新后的K线 DataFrame。
+    只从最后一个周期的第一天起重新聚合 daily，之前已收盘的周期直接保留
+    """
+    bars = _columns(bars)
+    daily = _columns(daily)
+    if not len(bars['date']):
+        return pd.DataFrame(resample_columns(daily, rule)[0])
+    start = period_start(period_keys(bars['date'][-1:], rule)[0], rule)
+    first = np.searchsorted(daily['date'], start)
+    tail, _ = resample_columns({name: values[first:] for name, values in daily.items()}, rule)
+    return pd.DataFrame({name: np.concatenate((bars[name][:-1], tail[name].astype(bars[name].dtype)))
+                         for name in OHLCV_COLUMNS})
+
+
+def _is_current(bars, daily, rule):
+    """缓存的已收盘周期是否仍与日K线一致（日K线被补齐或复权修正后需全部重算）"""
+    if not len(bars['date']) or not len(daily['date']):
+        return False
+    if period_keys(daily['date'][:1], rule)[0] != period_keys(bars['date'][:1], rule)[0]:
+        return False
+    if len(bars['date']) < 2:
+        return True
+    # 抽查最后一个已收盘周期：日期须仍是交易日，收盘价须相同
+    label = bars['date'][-2]
+    i = np.searchsorted(daily['date'], label)
+    return i < len(daily['date']) and daily['date'][i] == label and daily['close'][i] == bars['close'][-2]
+
+
+def resample_stored(store, source, symbol, rule, start=None, end=None):
+    """
+    由 store 中缓存的日K线得到周期K线，结果写回 store（interval 为 resample_<周期>）。
+    已有缓存时只重算最后一个周期；日K线历史有改动时整体重算。无日K线缓存时返回 None
+    """
+    daily = store.read(source, symbol)
+    if daily is None or daily.empty:
+        return None
+    interval = f"resample_{canonical_rule(rule)}"
+    cached = store.read(source, symbol, interval=interval)
+    daily_columns = _columns(daily)
+    if cached is not None and _is_current(_columns(cached), daily_columns, rule):
+        bars = update_bars(cached, daily_columns, rule)
+    else:
+        logger.info(f"{source}:{symbol} 全量聚合 {rule} K线")
+        bars = pd.DataFrame(resample_columns(daily_columns, rule)[0])
+    store.clear(source, symbol, interval)
+    store.append(source, symbol, bars, interval)
+
+    if start is not None:
+        bars = bars[bars['date'] >= pd.Timestamp(start)]
+    if end is not None:
+        bars = bars[bars['date'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return bars.reset_index(drop=True)
@@ -0,0 +1,328 @@
+"""
+信号筛选引擎 - 声明式规则，对整个股票面板一次向量化求值
+
+规则只看面板最后几根K线（交叉类规则需要 lookback 根），每条规则对全部股票
+返回一个布尔数组；Screener 汇总为按得分排序的结果表。
+StockAnalyzer.technical_analysis 的信号和建议也来自同一套规则。
+
+用法:
+    panel = ScreenPanel.from_frames(frames)                # {symbol: DataFrame}
+    table = Screener([RSIThreshold(below=30), VolumeSpike(2.0)], mode='all').screen(panel)
+"""
+
+import operator
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from indicators import build_panel, compute_panel
+
+_OPS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+
+class ScreenPanel:
+    """
+    筛选用面板：{列名: (股票数, tail) 数组}，只保留最后 tail 根K线。
+    列名与指标引擎相同（close/volume/MA20/RSI/BB_Upper/Volume_MA20 ...）。
+    """
+
+    def __init__(self, symbols, columns):
+        self.symbols = list(symbols)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        if name not in self.columns:
+            raise KeyError(f"面板中没有列 {name}（检查指标参数，如 ma_windows）")
+        return self.columns[name]
+
+    @classmethod
+    def from_arrays(cls, symbols, close, volume=None, indicators=None, tail=10, **params):
+        """由右对齐的 (股票数, K线数) 面板构造；indicators 为空时用指标引擎计算"""
+        close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+        if volume is not None:
+            volume = np.atleast_2d(np.asarray(volume, dtype=np.float64))
+        if indicators is None:
+            indicators = compute_panel(close, volume, **params)
+        columns = {'close': close[:, -tail:]}
+        if volume is not None:
+            columns['volume'] = volume[:, -tail:]
+        columns.update({name: values[:, -tail:] for name, values in indicators.items()})
+        return cls(symbols, columns)
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], tail=10, **params):
+        """{symbol: DataFrame}（close/volume 或 Close/Volume 列），None 的代码被跳过"""
+        symbols = [symbol for symbol, df in frames.items() if df is not None and len(df)]
+        tables = [frames[symbol].rename(columns={'Close': 'close', 'Volume': 'volume'}) for symbol in symbols]
+        close = build_panel(tables, 'close')
+        volume = build_panel(tables, 'volume') if all('volume' in df for df in tables) else None
+        return cls.from_arrays(symbols, close, volume, tail=tail, **params)
+
+    @classmethod
+    def from_tables(cls, symbols, frames, tables, tail=10):
+        """已算好的指标表（compute_frame/compute_universe 的结果）与对应行情"""
+        frames = [df.rename(columns={'Close': 'close', 'Volume': 'volume'}) for df in frames]
+        columns = {'close': build_panel(frames, 'close', tail)}
+        if all('volume' in df for df in frames):
+            columns['volume'] = build_panel(frames, 'volume', tail)
+        for name in tables[0].columns if tables else ():
+            columns[name] = build_panel(tables, name, tail)
+        return cls(symbols, columns)
+
+    @classmethod
+    def from_series(cls, series_list, tail=10, **params):
+        """OHLCVSeries 列表；尚未计算指标的序列先在面板上统一计算"""
+        from series import compute_indicators_many
+        series_list = list(series_list)
+        if any(not s.indicators for s in series_list):
+            compute_indicators_many(series_list, **params)
+        names = ['close', 'volume'] + list(series_list[0].indicators) if series_list else []
+        columns = {name: np.full((len(series_list), tail), np.nan) for name in names}
+        for i, s in enumerate(series_list):
+            n = min(tail, len(s))
+            if n:
+                for name in names:
+                    columns[name][i, tail - n:] = s.column(name)[-n:]
+        return cls([s.symbol for s in series_list], columns)
+
+
+def _operand(panel, value, bars=1):
+    """列名取最后 bars 根K线，数字原样返回"""
+    if isinstance(value, str):
+        return panel.column(value)[:, -bars:]
+    return value
+
+
+class Rule:
+    """
+    规则基类：evaluate 返回 (股票数,) 布尔数组。子类是 dataclass，最后两个字段为
+    name（默认由参数生成）和 weight（匹配时计入得分的权重，看空为负），通常按关键字传入
+    """
+    name = ''
+    weight = 1.0
+
+    @property
+    def lookback(self):
+        return 1
+
+    def evaluate(self, panel):
+        raise NotImplementedError
+
+
+@dataclass
+class Compare(Rule):
+    """最新K线上 left op right，left/right 为列名或数字，如 Compare('close', '>', 'MA20')"""
+    left: Union[str, float] = 'close'
+    op: str = '>'
+    right: Union[str, float] = 'MA20'
+    name: str = ''
+    weight: float = 1.0
+
+    def __post_init__(self):
+        self.name = self.name or f"{self.left}{self.op}{self.right}"
+
+    def evaluate(self, panel):
+        with np.errstate(invalid='ignore'):
+            return _OPS[self.op](_operand(panel, self.left), _operand(panel, self.right))[:, -1]
+
+
+@dataclass
+class RSIThreshold(Rule):
+    """RSI 低于 below 或高于 above（只给一个即可）"""
+    below: Optional[float] = None
+    above: Optional[float] = None
+    column: str = 'RSI'
+    name: str = ''
+    weight: float = 1.0
+
+    def __post_init__(self):
+        if self.below is None and self.above is None:
+            raise ValueError("RSIThreshold 需要 below 或 above")
+        self.name = self.name or (f"{self.column}<{self.below}" if self.below is not None
+                                  else f"{self.column}>{self.above}")
+
+    def evaluate(self, panel):
+        rsi = panel.column(self.column)[:, -1]
+        matched = np.zeros(len(rsi), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if self.below is not None:
+                matched |= rsi < self.below
+            if self.above is not None:
+                matched |= rsi > self.above
+        return matched
+
+
+@dataclass
+class Crossover(Rule):
+    """最近 within 根K线内 fast 上穿（direction='up'）或下穿（'down'）slow"""
+    fast: str = 'MA5'
+    slow: str = 'MA20'
+    direction: str = 'up'
+    within: int = 1
+    name: str = ''
+    weight: float = 1.0
+
+    def __post_init__(self):
+        self.name = self.name or f"{self.fast}{'上穿' if self.direction == 'up' else '下穿'}{self.slow}"
+
+    @property
+    def lookback(self):
+        return self.within + 1
+
+    def evaluate(self, panel):
+        bars = self.within + 1
+        diff = _operand(panel, self.fast, bars) - _operand(panel, self.slow, bars)
+        with np.errstate(invalid='ignore'):
+            if self.direction == 'up':
+                crossed = (diff[:, :-1] <= 0) & (diff[:, 1:] > 0)
+            else:
+                crossed = (diff[:, :-1] >= 0) & (diff[:, 1:] < 0)
+        return crossed.any(axis=1)
+
+
+@dataclass
+class BollingerBreakout(Rule):
+    """收盘价突破布林带上轨（direction='up'）或跌破下轨（'down'）"""
+    direction: str = 'up'
+    name: str = ''
+    weight: float = 1.0
+
+    def __post_init__(self):
+        self.name = self.name or ('突破布林上轨' if self.direction == 'up' else '跌破布林下轨')
+
+    def evaluate(self, panel):
+        close = panel.column('close')[:, -1]
+        with np.errstate(invalid='ignore'):
+            if self.direction == 'up':
+                return close > panel.column('BB_Upper')[:, -1]
+            return close < panel.column('BB_Lower')[:, -1]
+
+
+@dataclass
+class VolumeSpike(Rule):
+    """最新成交量不低于 ratio 倍的成交量均线"""
+    ratio: float = 2.0
+    average: str = 'Volume_MA20'
+    name: str = ''
+    weight: float = 1.0
+
+    def __post_init__(self):
+        self.name = self.name or f"放量{self.ratio:g}倍"
+
+    def evaluate(self, panel):
+        with np.errstate(invalid='ignore'):
+            return panel.column('volume')[:, -1] >= self.ratio * panel.column(self.average)[:, -1]
+
+
+@dataclass
+class Evaluation:
+    """一次求值的结果：每条规则的匹配数组和加权得分"""
+    symbols: List[str]
+    matches: Dict[str, np.ndarray]
+    score: np.ndarray
+    panel: ScreenPanel
+
+    def matched(self, i):
+        """第 i 只股票匹配的规则名"""
+        return [name for name, values in self.matches.items() if values[i]]
+
+
+class Screener:
+    """
+    一组规则。mode='any' 保留至少匹配一条规则的股票，'all' 要求全部匹配；
+    min_score 额外按得分过滤。
+    """
+
+    def __init__(self, rules: Sequence[Rule], mode='any', min_score=None):
+        self.rules = list(rules)
+        self.mode = mode
+        self.min_score = min_score
+
+    @property
+    def tail(self):
+        return max((rule.lookback for rule in self.rules), default=1)
+
+    def evaluate(self, panel):
+        matches = {rule.name: rule.evaluate(panel) for rule in self.rules}
+        score = np.zeros(len(panel))
+        for rule in self.rules:
+            score += rule.weight * matches[rule.name]
+        return Evaluation(panel.symbols, matches, score, panel)
+
+    def screen(self, panel, top=None):
+        """返回按得分降序排列的结果表：symbol/score/matched/close/RSI 及每条规则的匹配列"""
+        evaluation = self.evaluate(panel)
+        hits = np.column_stack(list(evaluation.matches.values())) if self.rules else np.zeros((len(panel), 0), bool)
+        keep = hits.all(axis=1) if self.mode == 'all' else hits.any(axis=1)
+        if self.min_score is not None:
+            keep &= evaluation.score >= self.min_score
+
+        index = np.flatnonzero(keep)
+        index = index[np.argsort(-evaluation.score[index], kind='stable')]
+        if top is not None:
+            index = index[:top]
+        table = pd.DataFrame({
+            'symbol': [panel.symbols[i] for i in index],
+            'score': evaluation.score[index],
+            'matched': [', '.join(evaluation.matched(i)) for i in index],
+            'close': panel.column('close')[index, -1],
+        })
+        if 'RSI' in panel:
+            table['RSI'] = panel.column('RSI')[index, -1]
+        for name, values in evaluation.matches.items():
+            table[name] = values[index]
+        return table
+
+
+# StockAnalyzer（src/analyzer）使用的规则：均线取 20/50
+ANALYSIS_RULES = (
+    Compare('close', '>', 'MA20', name='above_ma20', weight=1.0),
+    Compare('close', '<', 'MA20', name='below_ma20', weight=-1.0),
+    Compare('MA20', '>', 'MA50', name='ma_uptrend', weight=1.0),
+    Compare('MA20', '<', 'MA50', name='ma_downtrend', weight=-1.0),
+    Crossover('MA20', 'MA50', 'up', within=5, name='golden_cross', weight=1.5),
+    Crossover('MA20', 'MA50', 'down', within=5, name='death_cross', weight=-1.5),
+    RSIThreshold(below=30, name='oversold', weight=1.0),
+    RSIThreshold(above=70, name='overbought', weight=-1.0),
+    BollingerBreakout('up', name='bb_breakout_up', weight=0.5),
+    BollingerBreakout('down', name='bb_breakout_down', weight=-0.5),
+    VolumeSpike(2.0, name='volume_spike', weight=0.0),
+)
+
+
+def signals_from(evaluation, i):
+    """把第 i 只股票的规则匹配结果翻译成 trend/momentum/volume 信号"""
+    m = {name: bool(values[i]) for name, values in evaluation.matches.items()}
+    if m.get('above_ma20') and m.get('ma_uptrend'):
+        trend = '上升'
+    elif m.get('below_ma20') and m.get('ma_downtrend'):
+        trend = '下降'
+    elif np.isnan(evaluation.panel.column('MA20')[i, -1]):
+        trend = '未知'
+    else:
+        trend = '震荡'
+    momentum = '超买' if m.get('overbought') else '超卖' if m.get('oversold') else '中性'
+    signals = {'trend': trend, 'momentum': momentum, 'volume': '放量' if m.get('volume_spike') else '正常'}
+    if m.get('golden_cross'):
+        signals['cross'] = '金叉'
+    elif m.get('death_cross'):
+        signals['cross'] = '死叉'
+    return signals
+
+
+def recommendation_from(score):
+    """得分 >= 2 买入，<= -2 卖出，其余持有；置信度随得分绝对值增加"""
+    confidence = round(min(0.5 + 0.1 * abs(float(score)), 0.95), 2)
+    if score >= 2:
+        return '买入', confidence
+    if score <= -2:
+        return '卖出', confidence
+    return '持有', confidence
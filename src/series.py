@@ -0,0 +1,156 @@
+"""
+紧凑行情序列 - 用连续 NumPy 列代替每只股票一个 DataFrame 的字典
+
+OHLCVSeries 用 __slots__ 保存日期、价格、成交量和指标数组，默认价格/指标为 float32，
+只在需要时才转换为 DataFrame。它同时兼容原来的两种用法：
+    stock_data['symbol'] / ['data'] / ['info'] / ['source']   原 stock_data 字典
+    series['close'] / series['MA5'] / 'RSI' in series          原 DataFrame 列访问
+因此取数、指标、报告和绘图代码可以直接接收它。
+"""
+
+import numpy as np
+import pandas as pd
+
+from indicators import compute_panel
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+DEFAULT_PRICE_DTYPE = np.float32
+DEFAULT_VOLUME_DTYPE = np.int64
+DEFAULT_INDICATOR_DTYPE = np.float32
+
+_CAPITALIZED = {'Date': 'date', 'Open': 'open', 'High': 'high',
+                'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+_RECORD_KEYS = ('symbol', 'info', 'source')
+
+
+class OHLCVSeries:
+    """一只股票的行情和指标，每列一个连续数组"""
+
+    __slots__ = ('symbol', 'source', 'info', 'date', 'open', 'high', 'low', 'close', 'volume',
+                 'indicators', 'indicator_dtype')
+
+    def __init__(self, symbol, date, open, high, low, close, volume, source=None, info=None,
+                 price_dtype=DEFAULT_PRICE_DTYPE, volume_dtype=DEFAULT_VOLUME_DTYPE,
+                 indicator_dtype=DEFAULT_INDICATOR_DTYPE):
+        self.symbol = symbol
+        self.source = source
+        self.info = info if info is not None else {}
+        self.date = np.ascontiguousarray(date, dtype='datetime64[ns]')
+        self.open = np.ascontiguousarray(open, dtype=price_dtype)
+        self.high = np.ascontiguousarray(high, dtype=price_dtype)
+        self.low = np.ascontiguousarray(low, dtype=price_dtype)
+        self.close = np.ascontiguousarray(close, dtype=price_dtype)
+        self.volume = np.ascontiguousarray(volume, dtype=volume_dtype)
+        self.indicators = {}
+        self.indicator_dtype = indicator_dtype
+
+    @classmethod
+    def from_frame(cls, df, symbol=None, source=None, info=None, **dtypes):
+        """从 date/open/... 或 Date/Open/... 列的 DataFrame 构造"""
+        df = df.rename(columns=_CAPITALIZED)
+        return cls(symbol, df['date'].to_numpy(dtype='datetime64[ns]'),
+                   df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                   df['close'].to_numpy(), df['volume'].to_numpy(), source=source, info=info, **dtypes)
+
+    @classmethod
+    def from_stock_data(cls, stock_data, **dtypes):
+        """从原 {'symbol','data','info','source'} 字典构造"""
+        if isinstance(stock_data, cls):
+            return stock_data
+        return cls.from_frame(stock_data['data'], stock_data.get('symbol'), stock_data.get('source'),
+                              stock_data.get('info'), **dtypes)
+
+    def __len__(self):
+        return len(self.close)
+
+    @property
+    def nbytes(self):
+        columns = [self.date, self.open, self.high, self.low, self.close, self.volume]
+        return sum(a.nbytes for a in columns) + sum(a.nbytes for a in self.indicators.values())
+
+    # ---- 兼容原字典 / DataFrame 的访问方式 ----
+
+    def __getitem__(self, key):
+        if key == 'data':
+            return self.to_frame()
+        if key in _RECORD_KEYS:
+            return getattr(self, key)
+        return self.column(key)
+
+    def __contains__(self, key):
+        return key in ('date', 'volume') or key in PRICE_COLUMNS or key in self.indicators
+
+    def get(self, key, default=None):
+        if key in _RECORD_KEYS or key == 'data' or key in self:
+            return self[key]
+        return default
+
+    def column(self, name):
+        """行情列或指标列的数组（不复制）"""
+        if name in self.indicators:
+            return self.indicators[name]
+        if name in ('date', 'volume') or name in PRICE_COLUMNS:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def last(self, name, offset=1, default=None):
+        """倒数第 offset 个值（Python 标量）；长度不足、缺少该列或为 NaN 时返回 default"""
+        if name not in self or len(self) < offset:
+            return default
+        value = self.column(name)[-offset]
+        if isinstance(value, np.datetime64):
+            return pd.Timestamp(value)
+        value = value.item()
+        return default if isinstance(value, float) and np.isnan(value) else value
+
+    # ---- 指标 ----
+
+    def compute_indicators(self, **params):
+        """计算全部技术指标（含扩展指标）并以 indicator_dtype 保存，返回自身"""
+        result = compute_panel(self.close[None, :], self.volume[None, :],
+                               high=self.high[None, :], low=self.low[None, :], **params)
+        self.indicators = {name: values[0].astype(self.indicator_dtype) for name, values in result.items()}
+        return self
+
+    def resample(self, rule):
+        """聚合为周/月等周期K线（见 resample.py），返回新的 OHLCVSeries"""
+        from resample import resample_series
+        return resample_series(self, rule)
+
+    # ---- 按需转换为 DataFrame ----
+
+    def to_frame(self, with_indicators=False):
+        data = {'date': self.date, 'open': self.open, 'high': self.high, 'low': self.low,
+                'close': self.close, 'volume': self.volume}
+        if with_indicators:
+            data.update(self.indicators)
+        return pd.DataFrame(data)
+
+    def indicator_frame(self):
+        return pd.DataFrame(self.indicators)
+
+    def __repr__(self):
+        return f"OHLCVSeries({self.symbol!r}, {len(self)} bars, source={self.source!r})"
+
+
+def compute_indicators_many(series_list, **params):
+    """多只股票右对齐成面板后一次计算指标，写回各自的 indicators"""
+    series_list = list(series_list)
+    if not series_list:
+        return series_list
+    length = max(len(s) for s in series_list)
+    panels = {name: np.full((len(series_list), length), np.nan) for name in ('close', 'volume', 'high', 'low')}
+    for i, s in enumerate(series_list):
+        if len(s):
+            for name, panel in panels.items():
+                panel[i, length - len(s):] = getattr(s, name)
+    result = compute_panel(**panels, **params)
+    for i, s in enumerate(series_list):
+        s.indicators = {name: values[i, length - len(s):].astype(s.indicator_dtype)
+                        for name, values in result.items()}
+    return series_list
+
+
+def as_columns(stock_data):
+    """取出可按列名访问的行情：OHLCVSeries 本身，或原字典中的 DataFrame"""
+    return stock_data if isinstance(stock_data, OHLCVSeries) else stock_data['data']
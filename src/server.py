@@ -0,0 +1,451 @@
+"""
+分析服务 - 常驻的 asyncio HTTP 服务，按股票提供行情、指标、报告和K线网页数据包
+
+结果按 (类型, 代码, 参数) 缓存在 LRUCache 中（条目数、字节数上限 + TTL）；
+同一个键的并发请求合并为一次计算，其余请求等待同一个结果，热门股票被很多看板同时
+请求时只计算一次。数据源请求和 NumPy 计算都放到线程池执行，不阻塞事件循环。
+
+接口（GET）:
+    /api/stats                              缓存和合并统计
+    /api/<代码>/ohlcv?period=3mo             行情列
+    /api/<代码>/indicators?period=3mo        行情 + 技术指标列
+    /api/<代码>/report?period=3mo            最新行情、指标、信号和建议
+    /                                       K线网页（DATA_ROOT 指向下面的数据包接口）
+    /data/index.json                        --symbols 列出的股票
+    /data/<代码>[/<周期>]/meta.json|L<k>.bin  与 web_export 相同格式的数据包，周期为 W/M
+
+用法:
+    python src/server.py --symbols AAPL MSFT 0700.HK --port 8000
+    python src/server.py --symbols TEST --test-mode          # 只用模拟数据
+测试时可传入只含 LocalSource 的 SourceRegistry，不联网。
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from data_sources import SourceUnavailable
+from data_store import period_to_range
+from indicators import EXTENDED_COLUMNS, INDICATOR_COLUMNS
+from instrumentation import frame_bytes
+from metadata import MetadataCache
+from series import OHLCVSeries
+from web_export import build_bundle, index_entry, _safe_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERIOD = '3mo'
+DEFAULT_PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '股票K线图可视化网页.html')
+TIMEFRAMES = ('W', 'M')
+
+_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error', 502: 'Bad Gateway'}
+
+
+class LRUCache:
+    """
+    按最近使用淘汰的缓存，同时限制条目数和总字节数；超过 ttl 秒的条目视为不存在。
+    只在事件循环线程中访问，不加锁。
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=256 * 2 ** 20, ttl=300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes, 过期时间)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[2] > self.clock()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[2] <= self.clock():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, nbytes=0):
+        """写入；单个条目超过字节上限时不缓存"""
+        if key in self._entries:
+            self._remove(key)
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = (value, nbytes, self.clock() + self.ttl)
+        self.nbytes += nbytes
+        while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.nbytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+_MISSING = object()
+
+
+class AnalysisService:
+    """
+    按股票计算并缓存 fetch → indicators → report / bundle。
+    registry 为 SourceRegistry；sources 限定使用的数据源（默认按代码路由）。
+    """
+
+    def __init__(self, registry, store=None, sources=None, cache=None, metadata=None,
+                 fetch_workers=8, compute_workers=None):
+        self.registry = registry
+        self.store = store
+        self.sources = sources
+        self.cache = cache if cache is not None else LRUCache()
+        self.metadata = metadata if metadata is not None else MetadataCache(registry=registry)
+        self.fetch_executor = ThreadPoolExecutor(fetch_workers, thread_name_prefix='fetch')
+        self.compute_executor = ThreadPoolExecutor(compute_workers or os.cpu_count() or 1,
+                                                   thread_name_prefix='compute')
+        self.computations = {}  # 各类型实际计算的次数
+        self.coalesced = 0      # 合并到进行中计算的请求数
+        self._inflight = {}
+        self._analyzer = None
+
+    async def _get(self, key, compute):
+        """命中缓存直接返回；同一个键正在计算时等待同一个结果，否则开始计算"""
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # 某个客户端断开时不取消其他请求共享的计算
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        self.computations[key[0]] = self.computations.get(key[0], 0) + 1
+        value, nbytes = await compute()
+        self.cache.put(key, value, nbytes)
+        return value
+
+    async def _run(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    # ---- 各类结果 ----
+
+    async def ohlcv(self, symbol, period=DEFAULT_PERIOD):
+        async def compute():
+            series = await self._run(self.fetch_executor, self._fetch, symbol, period)
+            return series, frame_bytes(series)
+        return await self._get(('ohlcv', symbol, period), compute)
+
+    async def indicators(self, symbol, period=DEFAULT_PERIOD):
+        async def compute():
+            series = await self.ohlcv(symbol, period)
+            result = await self._run(self.compute_executor, self._with_indicators, series)
+            return result, frame_bytes(result)
+        return await self._get(('indicators', symbol, period), compute)
+
+    async def report(self, symbol, period=DEFAULT_PERIOD):
+        async def compute():
+            series = await self.indicators(symbol, period)
+            result = await self._run(self.compute_executor, self._report, series)
+            return result, len(json.dumps(result, default=str))
+        return await self._get(('report', symbol, period), compute)
+
+    async def bundle(self, symbol, period=DEFAULT_PERIOD, timeframe=None):
+        """(meta, {文件名: 字节})；timeframe 为 'W'/'M' 时先由日K线聚合"""
+        async def compute():
+            series = await self.indicators(symbol, period)
+            meta, files = await self._run(self.compute_executor, self._bundle, symbol, series, timeframe)
+            return (meta, files), sum(len(data) for data in files.values())
+        return await self._get(('bundle', symbol, period, timeframe), compute)
+
+    async def response(self, kind, symbol, period=DEFAULT_PERIOD):
+        """
+        ohlcv / indicators / report 的 JSON 响应体（UTF-8 字节）。整列 tolist 和 json.dumps
+        在计算线程池中执行，结果按键缓存，命中缓存的请求不再重新编码
+        """
+        if kind not in _PAYLOADS:
+            raise KeyError(kind)
+
+        async def compute():
+            value = await getattr(self, kind)(symbol, period)
+            body = await self._run(self.compute_executor, _encode, _PAYLOADS[kind], value)
+            return body, len(body)
+        return await self._get(('json', kind, symbol, period), compute)
+
+    def stats(self):
+        return {'cache': self.cache.stats(), 'computations': dict(self.computations),
+                'coalesced': self.coalesced, 'inflight': len(self._inflight)}
+
+    def close(self):
+        for executor in (self.fetch_executor, self.compute_executor):
+            if sys.version_info >= (3, 9):
+                executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                executor.shutdown(wait=False)
+
+    # ---- 在线程池中执行的阻塞部分 ----
+
+    def _fetch(self, symbol, period):
+        start, end = period_to_range(period)
+        source, key, df = self.registry.fetch(symbol, start, end, self.sources, self.store)
+        return OHLCVSeries.from_frame(df, symbol=symbol, source=source.name,
+                                      info=self.metadata.info(source, key))
+
+    @staticmethod
+    def _with_indicators(series):
+        # 浅拷贝共享行情数组，缓存中的行情对象保持不变
+        result = copy.copy(series)
+        return result.compute_indicators()
+
+    def _report(self, series):
+        from analyzer import StockAnalyzer
+
+        if self._analyzer is None:
+            self._analyzer = StockAnalyzer()
+        analysis = self._analyzer.technical_analysis_many({series.symbol: series.to_frame()})[series.symbol]
+        close, prev = series.last('close'), series.last('close', 2)
+        return {
+            'symbol': series.symbol,
+            'source': series.source,
+            'currency': series.info.get('currency', 'USD'),
+            'exchange': series.info.get('exchange', 'Unknown'),
+            'last_date': str(series.last('date').date()) if len(series) else None,
+            'current_price': close,
+            'change_pct': (close - prev) / prev * 100 if close is not None and prev else None,
+            'data_points': len(series),
+            'indicators': {name: series.last(name) for name in INDICATOR_COLUMNS + EXTENDED_COLUMNS
+                           if name in series},
+            'signals': analysis.signals,
+            'recommendation': analysis.recommendation,
+            'confidence': analysis.confidence,
+        }
+
+    @staticmethod
+    def _bundle(symbol, series, timeframe):
+        if timeframe:
+            series = series.resample(timeframe).compute_indicators()
+        return build_bundle(symbol, series, series, series.info.get('name'))
+
+
+def _json_value(values):
+    """数组 → JSON 列表（NaN 为 null，日期为 ISO 字符串）"""
+    if np.issubdtype(values.dtype, np.datetime64):
+        return [str(day) for day in values.astype('datetime64[D]')]
+    values = values.astype(np.float64)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _series_json(series, with_indicators=False):
+    columns = ['date', 'open', 'high', 'low', 'close', 'volume']
+    if with_indicators:
+        columns += list(series.indicators)
+    return {'symbol': series.symbol, 'source': series.source,
+            'columns': {name: _json_value(series.column(name)) for name in columns}}
+
+
+def _encode(build, value):
+    return json.dumps(build(value), ensure_ascii=False).encode('utf-8')
+
+
+# 各 JSON 接口由缓存的结果生成响应内容的函数
+_PAYLOADS = {
+    'ohlcv': _series_json,
+    'indicators': lambda series: _series_json(series, True),
+    'report': lambda report: report,
+}
+
+
+class AnalysisServer:
+    """asyncio.start_server 上的最小 HTTP/1.1 实现（只支持 GET，支持 keep-alive）"""
+
+    def __init__(self, service, symbols=(), period=DEFAULT_PERIOD, page=DEFAULT_PAGE, idle_timeout=15.0):
+        self.service = service
+        self.idle_timeout = idle_timeout  # keep-alive 连接的空闲超时（秒）
+        self.symbols = list(symbols)
+        self.period = period
+        self.page = page
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host='127.0.0.1', port=8000):
+        server = await self.start(host, port)
+        logger.info(f"分析服务已启动: http://{host}:{self.port}/")
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.service.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                if not line:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if 'content-length' in headers:
+                    await reader.readexactly(int(headers['content-length']))
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    status, content_type, body = self._error(400, '请求行格式错误')
+                    version = 'HTTP/1.0'
+                else:
+                    status, content_type, body = await self.dispatch(method, target)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                head = (f"HTTP/1.1 {status} {_STATUS.get(status, '')}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(body)}\r\n"
+                        f"Access-Control-Allow-Origin: *\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(head.encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except asyncio.CancelledError:
+            pass  # 服务关闭时取消仍在等待请求的连接
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _json(payload, status=200):
+        return status, 'application/json; charset=utf-8', json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    def _error(self, status, message):
+        return self._json({'error': message}, status)
+
+    async def dispatch(self, method, target):
+        """返回 (状态码, Content-Type, 响应体)"""
+        if method != 'GET':
+            return self._error(405, f"不支持的方法: {method}")
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        period = parse_qs(url.query).get('period', [self.period])[0]
+        try:
+            if not parts:
+                with open(self.page, 'rb') as f:
+                    return 200, 'text/html; charset=utf-8', f.read()
+            if parts[0] == 'api':
+                return await self._api(parts[1:], period)
+            if parts[0] == 'data':
+                return await self._data(parts[1:], period)
+        except SourceUnavailable as e:
+            return self._error(502, str(e))
+        except (KeyError, FileNotFoundError) as e:
+            return self._error(404, f"未找到: {e}")
+        except ValueError as e:
+            return self._error(400, str(e))
+        except Exception as e:
+            logger.exception(f"处理 {target} 失败")
+            return self._error(500, str(e))
+        return self._error(404, f"未找到: {url.path}")
+
+    async def _api(self, parts, period):
+        if parts == ['stats']:
+            return self._json(self.service.stats())
+        if len(parts) != 2:
+            raise KeyError('/'.join(parts))
+        symbol, kind = parts
+        return 200, 'application/json; charset=utf-8', await self.service.response(kind, symbol, period)
+
+    async def _data(self, parts, period):
+        """与 web_export 导出的目录结构相同的数据包"""
+        if parts == ['index.json']:
+            metas = await asyncio.gather(*(self.service.bundle(symbol, period) for symbol in self.symbols),
+                                         return_exceptions=True)
+            index = []
+            for symbol, result in zip(self.symbols, metas):
+                if isinstance(result, BaseException):
+                    logger.warning(f"{symbol} 数据包生成失败: {result}")
+                    continue
+                entry = index_entry(symbol, result[0])
+                entry['timeframes'] = {tf: f"{_safe_name(symbol)}/{tf}/meta.json" for tf in TIMEFRAMES}
+                index.append(entry)
+            return self._json({'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'symbols': index})
+        if len(parts) not in (2, 3):
+            raise KeyError('/'.join(parts))
+        names = {_safe_name(symbol): symbol for symbol in self.symbols}
+        symbol = names.get(parts[0], parts[0])
+        timeframe = parts[1] if len(parts) == 3 else None
+        if timeframe is not None and timeframe not in TIMEFRAMES:
+            raise KeyError(timeframe)
+        meta, files = await self.service.bundle(symbol, period, timeframe)
+        filename = parts[-1]
+        if filename == 'meta.json':
+            return self._json(meta)
+        return 200, 'application/octet-stream', files[filename]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='股票分析服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--symbols', nargs='*', default=[], help='K线网页列出的股票代码')
+    parser.add_argument('--period', default=DEFAULT_PERIOD, help='默认数据周期')
+    parser.add_argument('--test-mode', action='store_true', help='只使用模拟数据源')
+    parser.add_argument('--cache-entries', type=int, default=1024, help='结果缓存条目上限')
+    parser.add_argument('--cache-mb', type=float, default=256, help='结果缓存字节上限（MB）')
+    parser.add_argument('--ttl', type=float, default=300, help='结果缓存有效期（秒）')
+    args = parser.parse_args(argv)
+
+    from data_fetcher import sources, store
+
+    service = AnalysisService(sources, store, ['simulated'] if args.test_mode else None,
+                              LRUCache(args.cache_entries, int(args.cache_mb * 2 ** 20), args.ttl))
+    server = AnalysisServer(service, args.symbols, args.period)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
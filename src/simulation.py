@@ -0,0 +1,165 @@
+"""
+模拟行情 - 一次向量化生成 N 只股票 × M 根K线
+
+用于离线、可复现地对整条流水线做生产规模的压测（例如 5000 只 × 10 年）。
+价格为 float32、成交量为 int64，按工作日日历生成，可选多状态（牛/熊/震荡）切换。
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from series import OHLCVSeries
+
+# 每块股票共用一个随机子流；块大小固定，保证同一 seed 的结果与调用方式无关
+_CHUNK_SYMBOLS = 512
+
+
+@dataclass
+class Regime:
+    """一个市场状态：日收益率的均值和波动率"""
+    drift: float = 0.0
+    volatility: float = 0.02
+
+
+@dataclass
+class SimulatedMarket:
+    """模拟行情面板，价格数组形状均为 (股票数, K线数)"""
+    symbols: List[str]
+    dates: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    info: dict = field(default_factory=lambda: {'currency': 'USD', 'exchange': 'SIMULATED'})
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.dates, self.open, self.high, self.low, self.close, self.volume))
+
+    def frame(self, i):
+        """第 i 只股票的 DataFrame（date/open/high/low/close/volume）"""
+        return pd.DataFrame({
+            'date': self.dates,
+            'open': self.open[i],
+            'high': self.high[i],
+            'low': self.low[i],
+            'close': self.close[i],
+            'volume': self.volume[i],
+        })
+
+    def to_stock_data(self):
+        """转换为 StockAnalyzer 使用的 {'symbol','data','info','source'} 列表"""
+        return [{'symbol': symbol, 'data': self.frame(i), 'info': dict(self.info), 'source': 'simulated'}
+                for i, symbol in enumerate(self.symbols)]
+
+    def to_series(self):
+        """转换为 OHLCVSeries 列表；价格沿用面板的 dtype，每行是面板的视图，不复制"""
+        return [OHLCVSeries(symbol, self.dates, self.open[i], self.high[i], self.low[i], self.close[i],
+                            self.volume[i], source='simulated', info=dict(self.info),
+                            price_dtype=self.open.dtype, volume_dtype=self.volume.dtype)
+                for i, symbol in enumerate(self.symbols)]
+
+
+def business_days(n_bars=None, start=None, end=None):
+    """工作日日历：给定 start/end 区间，或以 end（默认今天）结尾的 n_bars 个工作日"""
+    if start is not None and end is not None:
+        dates = pd.bdate_range(start, end)
+    else:
+        dates = pd.bdate_range(end=pd.Timestamp(end or pd.Timestamp.now()).normalize(), periods=n_bars)
+    return dates.values.astype('datetime64[ns]')
+
+
+def session_bars(start, end, minutes, open_time='09:30', close_time='16:00'):
+    """工作日交易时段内每 minutes 分钟一根K线的时间戳（K线开始时间）"""
+    days = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+    first, last = (pd.Timedelta(f'{t}:00') // pd.Timedelta(minutes=1) for t in (open_time, close_time))
+    offsets = (np.arange(first, last, minutes) * 60_000_000_000).astype('timedelta64[ns]')
+    stamps = (days.values.astype('datetime64[ns]')[:, None] + offsets[None, :]).ravel()
+    stamps = stamps[(stamps >= pd.Timestamp(start).to_datetime64()) & (stamps <= pd.Timestamp(end).to_datetime64())]
+    return stamps.astype('datetime64[ns]')
+
+
+def simulate_market(n_symbols, n_bars=None, seed=None, start=None, end=None,
+                    symbols: Optional[Sequence[str]] = None,
+                    base_price=(100.0, 150.0), base_prices=None,
+                    regimes: Optional[Sequence[Regime]] = None, switch_prob=0.02,
+                    volume_range=(1_000_000, 10_000_000), dates=None):
+    """
+    生成模拟行情。
+
+    - 日历：start/end 区间内的工作日，或以 end 结尾的 n_bars 个工作日；dates 可直接指定（如分钟K线）
+    - seed：相同 seed 得到完全相同的结果；None 时每次随机
+    - base_price：初始价格的均匀分布区间；base_prices 可逐只指定（用于续接已有数据）
+    - regimes：状态列表，每根K线以 switch_prob 的概率切换到下一个状态；
+      默认单一状态 Regime(0, 0.02)，与原 _generate_simulated_data 一致
+    """
+    dates = business_days(n_bars, start, end) if dates is None else np.asarray(dates, dtype='datetime64[ns]')
+    n_bars = len(dates)
+    symbols = list(symbols) if symbols is not None else [f'SIM{i:05d}' for i in range(n_symbols)]
+    regimes = list(regimes) if regimes else [Regime()]
+    drifts = np.array([r.drift for r in regimes])
+    vols = np.array([r.volatility for r in regimes])
+
+    shape = (n_symbols, n_bars)
+    open_ = np.empty(shape, dtype=np.float32)
+    high = np.empty(shape, dtype=np.float32)
+    low = np.empty(shape, dtype=np.float32)
+    close = np.empty(shape, dtype=np.float32)
+    volume = np.empty(shape, dtype=np.int64)
+
+    chunk_rngs = [np.random.default_rng(s) for s in
+                  np.random.SeedSequence(seed).spawn(max(1, -(-n_symbols // _CHUNK_SYMBOLS)))]
+    for chunk, rng in enumerate(chunk_rngs):
+        lo, hi = chunk * _CHUNK_SYMBOLS, min((chunk + 1) * _CHUNK_SYMBOLS, n_symbols)
+        if lo >= hi:
+            break
+        rows = hi - lo
+
+        if base_prices is not None:
+            base = np.asarray(base_prices, dtype=np.float64)[lo:hi]
+        else:
+            base = rng.uniform(base_price[0], base_price[1], rows)
+
+        # 状态路径：每根K线以 switch_prob 概率切换到下一个状态
+        if len(regimes) > 1:
+            switches = rng.random((rows, n_bars)) < switch_prob
+            state = np.cumsum(switches, axis=1) % len(regimes)
+            returns = drifts[state] + vols[state] * rng.standard_normal((rows, n_bars))
+        else:
+            returns = rng.normal(drifts[0], vols[0], (rows, n_bars))
+
+        c = base[:, None] * np.exp(np.cumsum(returns, axis=1))
+        o = c * (1 + rng.normal(0, 0.01, (rows, n_bars)))
+        h = np.maximum(o, c) * (1 + np.abs(rng.normal(0, 0.015, (rows, n_bars))))
+        l = np.minimum(o, c) * (1 - np.abs(rng.normal(0, 0.015, (rows, n_bars))))
+
+        np.maximum(o, 0.01, out=open_[lo:hi], casting='unsafe')
+        np.maximum(h, 0.01, out=high[lo:hi], casting='unsafe')
+        np.maximum(l, 0.01, out=low[lo:hi], casting='unsafe')
+        np.maximum(c, 0.01, out=close[lo:hi], casting='unsafe')
+        volume[lo:hi] = rng.integers(volume_range[0], volume_range[1], (rows, n_bars), dtype=np.int64)
+
+    return SimulatedMarket(symbols=symbols, dates=dates, open=open_, high=high,
+                           low=low, close=close, volume=volume)
+
+
+def simulate_frame(start, end, base_price=None, seed=None):
+    """生成单只股票 [start, end] 区间的模拟K线 DataFrame"""
+    market = simulate_market(1, start=start, end=end, seed=seed,
+                             base_prices=None if base_price is None else [base_price])
+    return market.frame(0)
+
+
+def simulate_intraday_frame(start, end, interval_minutes, base_price=None, seed=None):
+    """单只股票 [start, end] 区间交易时段内的模拟分钟K线，波动率按日内K线数缩放"""
+    dates = session_bars(start, end, interval_minutes)
+    bars_per_day = max(1, 390 // interval_minutes)
+    market = simulate_market(1, seed=seed, dates=dates,
+                             base_prices=None if base_price is None else [base_price],
+                             regimes=[Regime(0.0, 0.02 / np.sqrt(bars_per_day))],
+                             volume_range=(1_000, 100_000))
+    return market.frame(0)
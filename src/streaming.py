@@ -0,0 +1,299 @@
+"""
+增量指标 - 每根新K线 O(1) 更新的指标状态
+
+与 indicators 引擎 / StockAnalyzer.calculate_technical_indicators 的定义完全相同，
+但只保存递推所需的最小状态。状态可序列化为 JSON，定时任务从上次的检查点恢复，
+只处理新增的K线。最后一根K线可以用重新获取的最终值替换（盘中取得的当天K线收盘后
+再取一次，与 data_store 的做法一致）：状态保留推入最后一根K线之前的快照。
+收盘价为 NaN 的K线不进入状态（返回全 NaN 的一行），成交量为 NaN 时只跳过成交量均线。
+
+用法（src/main.py --stream）:
+    state, rows = IndicatorState.resume(checkpoint_path(symbol, '1d'), df)
+"""
+
+import json
+import math
+import os
+from collections import deque
+
+import pandas as pd
+
+NAN = float('nan')
+DEFAULT_ROOT = os.path.join('data_cache', 'indicator_state')
+
+
+def checkpoint_path(symbol, interval='1d', root=DEFAULT_ROOT):
+    """(股票, 周期) 的检查点文件路径"""
+    name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in f"{symbol}_{interval}")
+    return os.path.join(root, f"{name}.json")
+
+
+class RollingMean:
+    """滑动平均：维护窗口内的累加和"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def update(self, x):
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        return self.total / self.window if len(self.values) == self.window else NAN
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values), 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['window'])
+        obj.values = deque(data['values'])
+        obj.total = data['total']
+        return obj
+
+
+class RollingStd:
+    """滑动样本标准差：Welford 递推，窗口满后用新值替换最旧值"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        self.values.append(x)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        else:
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+        if len(self.values) < self.window:
+            return NAN
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values), 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['window'])
+        obj.values = deque(data['values'])
+        obj.mean = data['mean']
+        obj.m2 = data['m2']
+        return obj
+
+
+class EWM:
+    """指数加权平均，等价于 pandas ewm(span, adjust=True)：分子分母分别递推"""
+
+    def __init__(self, span):
+        self.span = span
+        self.decay = 1.0 - 2.0 / (span + 1.0)
+        self.num = 0.0
+        self.den = 0.0
+
+    def update(self, x):
+        self.num = self.num * self.decay + x
+        self.den = self.den * self.decay + 1.0
+        return self.num / self.den
+
+    def to_dict(self):
+        return {'span': self.span, 'num': self.num, 'den': self.den}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['span'])
+        obj.num = data['num']
+        obj.den = data['den']
+        return obj
+
+
+class WilderRSI:
+    """Wilder RSI：前 period 个涨跌幅取均值做种子，之后按 (period-1)/period 平滑"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.count = 0
+        self.prev_close = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            self.count = 1
+            return 50.0
+        delta = close - self.prev_close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        self.prev_close = close
+
+        if self.count < self.period:
+            # 预热阶段先累加涨跌幅
+            self.avg_gain += gain
+            self.avg_loss += loss
+            self.count += 1
+            return 50.0
+        if self.count == self.period:
+            # 种子：前 period 个涨跌幅的均值
+            self.avg_gain = (self.avg_gain + gain) / self.period
+            self.avg_loss = (self.avg_loss + loss) / self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        self.count += 1
+        return self._value()
+
+    def _value(self):
+        if self.avg_loss == 0:
+            return NAN if self.avg_gain == 0 else 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100 - (100 / (1 + rs))
+
+    def to_dict(self):
+        return {'period': self.period, 'count': self.count, 'prev_close': self.prev_close,
+                'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['period'])
+        obj.count = data['count']
+        obj.prev_close = data['prev_close']
+        obj.avg_gain = data['avg_gain']
+        obj.avg_loss = data['avg_loss']
+        return obj
+
+
+class IndicatorState:
+    """
+    一只股票的全部增量指标状态，输出列与 calculate_technical_indicators 相同。
+
+    用法：state = IndicatorState(); state.seed(df) 之后每根新K线调用 update()，
+    或用 save()/load() 在定时任务之间保存检查点。
+    """
+
+    def __init__(self, ma_windows=(5, 10, 20), rsi_period=14, macd_spans=(12, 26, 9),
+                 bb_window=20, bb_k=2.0, volume_window=20):
+        self.params = {'ma_windows': list(ma_windows), 'rsi_period': rsi_period,
+                       'macd_spans': list(macd_spans), 'bb_window': bb_window,
+                       'bb_k': bb_k, 'volume_window': volume_window}
+        self.ma = {window: RollingMean(window) for window in ma_windows}
+        self.rsi = WilderRSI(rsi_period)
+        fast, slow, signal = macd_spans
+        self.ema_fast, self.ema_slow, self.ema_signal = EWM(fast), EWM(slow), EWM(signal)
+        self.bb_mean = RollingMean(bb_window)
+        self.bb_std = RollingStd(bb_window)
+        self.volume_ma = RollingMean(volume_window)
+        self.last_date = None
+        self.previous = None  # 推入最后一根K线之前的状态，用于替换该K线
+
+    def update(self, close, volume, date=None):
+        """推入一根K线，返回该K线的全部指标"""
+        if not math.isnan(float(close)):
+            self.previous = self.to_dict(previous=False)
+        return self._push(close, volume, date)
+
+    def _push(self, close, volume, date):
+        close, volume = float(close), float(volume)
+        if math.isnan(close):
+            # 缺失的K线不进入状态，last_date 也不前进，之后取到的有效值仍会被处理
+            return dict.fromkeys(self.columns(), NAN)
+        row = {f'MA{window}': ma.update(close) for window, ma in self.ma.items()}
+        row['RSI'] = self.rsi.update(close)
+        macd = self.ema_fast.update(close) - self.ema_slow.update(close)
+        signal = self.ema_signal.update(macd)
+        row.update({'MACD': macd, 'MACD_Signal': signal, 'MACD_Histogram': macd - signal})
+        middle = self.bb_mean.update(close)
+        band = self.bb_std.update(close) * self.params['bb_k']
+        row.update({'BB_Middle': middle, 'BB_Upper': middle + band, 'BB_Lower': middle - band})
+        row[f"Volume_MA{self.params['volume_window']}"] = NAN if math.isnan(volume) else self.volume_ma.update(volume)
+        if date is not None:
+            self.last_date = pd.Timestamp(date).isoformat()
+        return row
+
+    def columns(self):
+        return ([f'MA{window}' for window in self.ma] + ['RSI', 'MACD', 'MACD_Signal', 'MACD_Histogram',
+                'BB_Middle', 'BB_Upper', 'BB_Lower', f"Volume_MA{self.params['volume_window']}"])
+
+    def _restore_previous(self):
+        restored = type(self).from_dict(self.previous)
+        self.__dict__.update(restored.__dict__)
+
+    def update_frame(self, df):
+        """
+        推入 DataFrame 中晚于 last_date 的K线，返回这些K线的指标表；
+        与 last_date 同一天的K线替换上次推入的最后一根
+        """
+        df = df.rename(columns=str.lower)
+        if self.last_date is not None:
+            dates = pd.to_datetime(df['date'])
+            last = pd.Timestamp(self.last_date)
+            if self.previous is not None and (dates == last).any():
+                self._restore_previous()
+                df = df[dates >= last]
+            else:
+                df = df[dates > last]
+        # 快照取在最后一根有效K线之前：收盘价为 NaN 的K线不进入状态，也不能作为被替换的K线
+        valid = [i for i, close in enumerate(df['close']) if not math.isnan(float(close))]
+        last_valid = valid[-1] if valid else -1
+        rows = []
+        for i, (date, close, volume) in enumerate(zip(df['date'], df['close'], df['volume'])):
+            if i == last_valid:
+                self.previous = self.to_dict(previous=False)
+            rows.append(self._push(close, volume, date))
+        return pd.DataFrame(rows, index=df.index, columns=self.columns())
+
+    seed = update_frame
+
+    def to_dict(self, previous=True):
+        return {
+            'params': self.params,
+            'previous': self.previous if previous else None,
+            'last_date': self.last_date,
+            'ma': [ma.to_dict() for ma in self.ma.values()],
+            'rsi': self.rsi.to_dict(),
+            'ema': [ema.to_dict() for ema in (self.ema_fast, self.ema_slow, self.ema_signal)],
+            'bb_mean': self.bb_mean.to_dict(),
+            'bb_std': self.bb_std.to_dict(),
+            'volume_ma': self.volume_ma.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(**data['params'])
+        obj.last_date = data['last_date']
+        obj.previous = data.get('previous')
+        obj.ma = {item['window']: RollingMean.from_dict(item) for item in data['ma']}
+        obj.rsi = WilderRSI.from_dict(data['rsi'])
+        obj.ema_fast, obj.ema_slow, obj.ema_signal = (EWM.from_dict(item) for item in data['ema'])
+        obj.bb_mean = RollingMean.from_dict(data['bb_mean'])
+        obj.bb_std = RollingStd.from_dict(data['bb_std'])
+        obj.volume_ma = RollingMean.from_dict(data['volume_ma'])
+        return obj
+
+    def save(self, path):
+        """写入 JSON 检查点"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def resume(cls, path, df, **params):
+        """从检查点恢复（不存在则新建），处理新增K线后写回检查点"""
+        state = cls.load(path) if os.path.exists(path) else cls(**params)
+        new_rows = state.update_frame(df)
+        state.save(path)
+        return state, new_rows
@@ -0,0 +1,23 @@
+"""
+工具函数
+"""
+
+import os
+
+from reporting import Manifest, ReportTemplate, report_context, write_if_changed
+
+
+def save_report(template, report_data, report_path, **extra):
+    """
+    用模板（路径或已编译的 ReportTemplate）渲染单份报告并保存；
+    输入哈希与上次相同时跳过写入。返回是否写入。批量生成请用 reporting.ReportRenderer
+    """
+    if not isinstance(template, ReportTemplate):
+        template = ReportTemplate.from_file(template)
+    context = report_context(report_data, **extra)
+    manifest = Manifest(os.path.dirname(report_path) or '.')
+    written = write_if_changed(manifest, report_path, template.inputs_digest(context),
+                               lambda: template.render(context))
+    if written:
+        manifest.save()
+    return written
@@ -4,7 +4,9 @@
 
 import logging
 from typing import Dict, Any
-import pandas as pd
+
+from instrumentation import stage
+from rendering import render_comparison
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +20,30 @@ class ChartVisualizer:
         """创建股票图表 - 简化版本"""
         logger.info(f"为 {symbol} 创建图表")
         
-        # 这里只是返回成功消息，实际实现会生成图表文件
-        chart_path = f"charts/{symbol}_chart.png"
+        with stage('chart', symbol, rows=len(df)):
+            # 这里只是返回成功消息，实际实现会生成图表文件
+            chart_path = f"charts/{symbol}_chart.png"
         
         logger.info(f"图表创建成功: {chart_path}")
         return chart_path
     
-    def create_comparison_chart(self, results, comparison):
-        """创建比较图表"""
+    def create_comparison_chart(self, results, comparison, benchmark=None,
+                                save_path="charts/comparison_chart.png"):
+        """
+        创建比较图表：comparison 为 RollingComparison，画窗口内的相关系数热力图，
+        给出 benchmark 时加各股票相对基准的 beta；results 中有分析结果的股票标注建议
+        """
         logger.info("创建比较图表")
-        return "comparison_chart.png"
+
+        with stage('comparison_chart', rows=len(comparison.symbols)):
+            corr = comparison.correlation()
+            versus = comparison.versus(benchmark) if benchmark in comparison.index else None
+            labels = []
+            for symbol in comparison.symbols:
+                result = (results or {}).get(symbol)
+                recommendation = getattr(result, 'recommendation', None)
+                labels.append(f"{symbol} {recommendation}" if recommendation else str(symbol))
+            render_comparison(labels, corr, versus, save_path=save_path)
+
+        logger.info(f"比较图表创建成功: {save_path}")
+        return save_path
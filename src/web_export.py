@@ -0,0 +1,227 @@
+"""
+网页数据导出 - 每只股票的紧凑二进制数据包 + 多级降采样
+
+K线图网页直接加载预先算好的 OHLCV 和指标，不再在浏览器里计算。
+每只股票输出：
+    <out>/<SYMBOL>/meta.json   列名、各级别点数、最新行情与统计
+    <out>/<SYMBOL>/L<k>.bin    小端 float32，按列连续存放（列优先）
+L0 为完整数据，L1、L2... 用 LTTB 选点后把相邻区间聚合成K线（保留区间内的最高/最低），
+网页按当前缩放范围只加载够用的级别。<out>/index.json 列出全部股票。
+给定 timeframes（如 ('W', 'M')）时，另由日K线聚合出周期K线并计算指标，
+写入 <out>/<SYMBOL>/<周期>/，网页可切换日K/周K/月K。
+"""
+
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from resample import resample_many
+from series import OHLCVSeries, compute_indicators_many
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume', 'MA5', 'MA10', 'MA20', 'RSI')
+# 网页可视范围内希望显示的K线数（写入 meta.target_points，网页据此选择级别）
+TARGET_VISIBLE_POINTS = 600
+# 各降采样级别的目标点数（只生成比原始数据少的级别）。网页选 points × 可视比例 ≥ target_points
+# 的最粗级别：全局视图用 ×2 级，放大到一半以内用 ×8 级，更细时用完整数据
+LEVEL_POINTS = (TARGET_VISIBLE_POINTS * 8, TARGET_VISIBLE_POINTS * 2)
+DEFAULT_OUT_DIR = 'data'
+
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def lttb_indices(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets：从 y 中选出 n_out 个最能保持形状的点，返回下标。
+    首尾点固定保留，中间每个桶选出与前一选中点、下一桶均值构成三角形面积最大的点。
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 下一桶的均值点（最后一个桶用末点）
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[prev] - avg_x) * (y[start:stop] - y[prev])
+                      - (x[prev] - x[start:stop]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    # n_out 接近 n 时桶边界可能重合，去重保证下标严格递增
+    return np.unique(selected)
+
+
+def aggregate_bars(columns, indices):
+    """把 [indices[k], indices[k+1]) 区间聚合为一根K线；指标取区间最后一根的值"""
+    starts = np.asarray(indices, dtype=np.int64)
+    n = len(columns['close'])
+    ends = np.append(starts[1:], n) - 1
+    out = {
+        'date': columns['date'][starts],
+        'open': columns['open'][starts],
+        'high': np.fmax.reduceat(columns['high'], starts),
+        'low': np.fmin.reduceat(columns['low'], starts),
+        'close': columns['close'][ends],
+        'volume': np.add.reduceat(columns['volume'], starts),
+    }
+    for name in columns:
+        if name not in out:
+            out[name] = columns[name][ends]
+    return out
+
+
+def _columns_from_frames(df, indicators):
+    """df/indicators 可以是 DataFrame 或 OHLCVSeries"""
+    dates = np.asarray(df['date'], dtype='datetime64[ns]').astype('datetime64[D]')
+    columns = {'date': (dates - _EPOCH).astype(np.float64)}
+    for name in ('open', 'high', 'low', 'close', 'volume'):
+        columns[name] = np.asarray(df[name], dtype=np.float64)
+    for name in BUNDLE_COLUMNS[6:]:
+        source = indicators if indicators is not None and name in indicators else None
+        columns[name] = (np.asarray(source[name], dtype=np.float64) if source is not None
+                         else np.full(len(df), np.nan))
+    return columns
+
+
+def _safe_name(symbol):
+    return re.sub(r'[^0-9A-Za-z._-]', '_', str(symbol))
+
+
+def _level_bytes(columns):
+    return np.vstack([np.asarray(columns[name], dtype='<f4') for name in BUNDLE_COLUMNS]).tobytes()
+
+
+def _finite(value, digits=None):
+    """非有限值写为 null（JSON 不允许 NaN/Infinity）"""
+    value = float(value)
+    if not np.isfinite(value):
+        return None
+    return round(value, digits) if digits is not None else value
+
+
+def _stats(columns):
+    close = columns['close']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.diff(close) / close[:-1] if len(close) > 1 else np.array([0.0])
+    returns = returns[np.isfinite(returns)]
+    volume = columns['volume'][np.isfinite(columns['volume'])]
+    last = len(close) - 1
+    prev = max(last - 1, 0)
+
+    def value(name, i):
+        return _finite(columns[name][i], 4)
+
+    return {
+        'data_points': int(len(close)),
+        'first_date': str(_EPOCH + int(columns['date'][0])),
+        'last_date': str(_EPOCH + int(columns['date'][last])),
+        'avg_volume': _finite(np.mean(volume)) if len(volume) else None,
+        'volatility': _finite(np.std(returns) * np.sqrt(252) * 100) if len(returns) else None,
+        'latest': {name: value(name, last) for name in BUNDLE_COLUMNS[1:]},
+        'change_pct': _finite((close[last] - close[prev]) / close[prev] * 100) if close[prev] else 0.0,
+    }
+
+
+def build_bundle(symbol, df, indicators=None, name=None, level_points=LEVEL_POINTS):
+    """在内存中生成一只股票的数据包，返回 (meta 字典, {文件名: 字节})"""
+    columns = _columns_from_frames(df, indicators)
+    n = len(columns['close'])
+
+    levels = [{'level': 0, 'points': n, 'file': 'L0.bin'}]
+    files = {'L0.bin': _level_bytes(columns)}
+    for points in sorted(level_points, reverse=True):
+        if points >= n:
+            continue
+        indices = lttb_indices(columns['close'], points, columns['date'])
+        level_columns = aggregate_bars(columns, indices)
+        level = len(levels)
+        filename = f'L{level}.bin'
+        files[filename] = _level_bytes(level_columns)
+        levels.append({'level': level, 'points': int(len(indices)), 'file': filename})
+
+    meta = {
+        'symbol': symbol,
+        'name': name or symbol,
+        'columns': list(BUNDLE_COLUMNS),
+        'dtype': 'float32',
+        'date_unit': 'days_since_epoch',
+        'levels': levels,
+        'target_points': TARGET_VISIBLE_POINTS,
+        **_stats(columns),
+    }
+    return meta, files
+
+
+def export_bundle(symbol, df, indicators=None, out_dir=DEFAULT_OUT_DIR, name=None,
+                  level_points=LEVEL_POINTS, bundle_dir=None):
+    """导出一只股票的数据包，返回 meta 字典；bundle_dir 默认为 <out_dir>/<SYMBOL>"""
+    meta, files = build_bundle(symbol, df, indicators, name, level_points)
+    bundle_dir = bundle_dir or os.path.join(out_dir, _safe_name(symbol))
+    os.makedirs(bundle_dir, exist_ok=True)
+    for filename, data in files.items():
+        with open(os.path.join(bundle_dir, filename), 'wb') as f:
+            f.write(data)
+    with open(os.path.join(bundle_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+
+def index_entry(symbol, meta):
+    """index.json 中一只股票的条目"""
+    return {'symbol': symbol, 'name': meta['name'], 'path': f"{_safe_name(symbol)}/meta.json",
+            'last_date': meta['last_date'], 'close': meta['latest']['close'],
+            'change_pct': round(meta['change_pct'], 2) if meta['change_pct'] is not None else None}
+
+
+def export_timeframes(exported, out_dir=DEFAULT_OUT_DIR, level_points=LEVEL_POINTS, timeframes=()):
+    """
+    exported 为 (index 条目, 日K线) 列表。每个周期把全部股票一次聚合、一次算指标，
+    写入 <SYMBOL>/<周期>/ 并在条目的 timeframes 中登记路径
+    """
+    daily = [df if isinstance(df, OHLCVSeries) else OHLCVSeries.from_frame(df) for _, df in exported]
+    for rule in timeframes:
+        bars_list = compute_indicators_many(resample_many(daily, rule))
+        for (entry, _), bars in zip(exported, bars_list):
+            bundle_dir = os.path.join(out_dir, _safe_name(entry['symbol']), _safe_name(rule))
+            export_bundle(entry['symbol'], bars, bars, out_dir, entry['name'], level_points, bundle_dir)
+            entry.setdefault('timeframes', {})[rule] = f"{_safe_name(entry['symbol'])}/{_safe_name(rule)}/meta.json"
+
+
+def export_bundles(items, out_dir=DEFAULT_OUT_DIR, level_points=LEVEL_POINTS, timeframes=()):
+    """
+    批量导出。items 为 (symbol, df, indicators_df[, name]) 列表；
+    timeframes 为额外导出的周期K线（如 ('W', 'M')）。额外写出 index.json 供网页生成股票列表。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    index = []
+    exported = []
+    for item in items:
+        symbol, df, indicators = item[:3]
+        name = item[3] if len(item) > 3 else None
+        if df is None or not len(df):
+            continue
+        meta = export_bundle(symbol, df, indicators, out_dir, name, level_points)
+        index.append(index_entry(symbol, meta))
+        exported.append((index[-1], df))
+    if timeframes and exported:
+        export_timeframes(exported, out_dir, level_points, timeframes)
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+                   'symbols': index}, f, ensure_ascii=False)
+    logger.info(f"已导出 {len(index)} 个网页数据包至 {out_dir}")
+    return index
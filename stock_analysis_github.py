@@ -5,260 +5,199 @@
 适用于GitHub Actions和静态环境运行
 """
 
-import yfinance as yf
-import akshare as ak
-import pandas as pd
+import argparse
+import os
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from backtest import DEFAULT_COST, run_backtest
+from adjustment import AdjustmentCache, normalize_mode
+from data_sources import SourceUnavailable, default_registry
+from data_store import OHLCVStore, period_to_range
+from fetch_pool import ConcurrentFetcher
+import instrumentation
+from indicators import build_panel, compute_frame, compute_universe, rsi as wilder_rsi
+from metadata import METADATA_FIELDS, MetadataCache
+from parallel import analyze_panel, compute_indicators_parallel
+from pipeline import ArtifactCache, Pipeline, Stage
+from rendering import CandleRenderer, render_many
+from resample import resample_many
+from series import OHLCVSeries, as_columns
+from web_export import export_bundles
+
 class StockAnalyzer:
     """股票分析器主类"""
     
-    def __init__(self):
-        self.data_source = "yfinance"  # 默认数据源
+    def __init__(self, cache_dir="data_cache", adjust="none"):
+        self.data_source = "auto"  # 默认按代码格式路由数据源
+        self.adjust = normalize_mode(adjust)  # A股复权方式：none / qfq / hfq
         self.cache_data = {}  # 数据缓存
+        # 本地增量行情缓存，cache_dir=None 时每次都完整请求上游
+        self.store = OHLCVStore(cache_dir) if cache_dir else None
+        self.sources = default_registry(self.store)  # 数据源注册表（超时/重试/熔断）
+        # 只缓存不复权行情和复权因子，前/后复权序列由因子换算
+        self.adjustments = AdjustmentCache(self.store, self.sources)
+        # 币种/交易所等元数据：读取时才请求，磁盘缓存带 TTL
+        self.metadata = MetadataCache(os.path.join(cache_dir, "metadata.json") if cache_dir else None,
+                                      registry=self.sources)
+        self._renderer = None  # 图表渲染器，多只股票之间复用
         
     def set_data_source(self, source):
         """设置数据源"""
-        valid_sources = ["yfinance", "akshare", "simulated"]
+        valid_sources = ["auto", "yfinance", "akshare", "simulated"]
         if source in valid_sources:
             self.data_source = source
             return True
         return False
     
-    def fetch_stock_data(self, symbol, period="3mo"):
-        """获取股票数据"""
-        print(f"🔍 从 {self.data_source} 获取 {symbol} 的 {period} 数据...")
+    def fetch_stock_data(self, symbol, period="3mo", source=None):
+        """获取股票数据；auto 按代码格式选择数据源，全部失败时退回模拟数据"""
+        source = source or self.data_source
+        print(f"🔍 从 {source} 获取 {symbol} 的 {period} 数据...")
         
         try:
-            if self.data_source == "yfinance":
+            if source == "yfinance":
                 return self._fetch_yfinance_data(symbol, period)
-            elif self.data_source == "akshare":
+            elif source == "akshare":
                 return self._fetch_akshare_data(symbol, period)
+            elif source == "auto":
+                return self._fetch_from(None, symbol, period)
             else:
                 return self._generate_simulated_data(symbol, period)
         except Exception as e:
             print(f"❌ 数据获取失败: {e}")
             return None
     
-    def _fetch_yfinance_data(self, symbol, period):
-        """从yfinance获取国际股票数据"""
+    def fetch_many(self, symbols, period="3mo", source=None, fetcher=None):
+        """
+        批量获取多个股票数据，返回 {symbol: stock_data 或 None}。
+        按数据源分组，每组合并为尽量少的上游请求；全部数据源失败的代码退回模拟数据
+        """
+        source = source or self.data_source
+        start, end = period_to_range(period)
+        names = None if source == "auto" else [source]
+        print(f"🔍 从 {source} 批量获取 {len(symbols)} 个代码的 {period} 数据...")
+        
+        fetched = self.sources.fetch_many(symbols, start, end, names, self.store, fetcher)
+        results = {}
+        for symbol, item in fetched.items():
+            if item is None:
+                results[symbol] = self._generate_simulated_data(symbol, period)
+                continue
+            try:
+                results[symbol] = self._make_series(symbol, *item)
+            except SourceUnavailable as e:
+                print(f"⚠️ {e}")
+                results[symbol] = self._generate_simulated_data(symbol, period)
+        return results
+    
+    def refresh_metadata(self, symbols, source="yfinance", fields=METADATA_FIELDS):
+        """批量刷新多只股票缺失或过期的元数据，返回刷新的代码数"""
+        data_source = self.sources.get(source)
+        keys = [data_source.normalize(symbol) for symbol in symbols]
+        return self.metadata.refresh(data_source, keys, fields)
+    
+    def _fetch_from(self, names, symbol, period):
+        """经数据源注册表获取（超时、重试、熔断），失败时退回模拟数据"""
+        start, end = period_to_range(period)
         try:
-            # 添加常见后缀
-            if not any(symbol.endswith(suffix) for suffix in ['.SI', '.HK', '.TW', '.SS', '.SZ']):
-                symbol_clean = symbol
-            else:
-                symbol_clean = symbol
-            
-            ticker = yf.Ticker(symbol_clean)
-            hist = ticker.history(period=period)
-            
-            if hist.empty:
-                # 尝试常见后缀
-                for suffix in ['.SI', '.HK']:
-                    try:
-                        ticker = yf.Ticker(symbol + suffix)
-                        hist = ticker.history(period=period)
-                        if not hist.empty:
-                            symbol += suffix
-                            break
-                    except:
-                        continue
-            
-            if hist.empty:
-                raise ValueError("未找到股票数据")
-            
-            # 处理数据格式
-            hist = hist.reset_index()
-            hist['Date'] = pd.to_datetime(hist['Date'])
-            hist = hist.rename(columns={
-                'Date': 'date',
-                'Open': 'open',
-                'High': 'high', 
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume'
-            })
-            
-            return {
-                'symbol': symbol,
-                'data': hist[['date', 'open', 'high', 'low', 'close', 'volume']],
-                'info': ticker.info,
-                'source': 'yfinance'
-            }
-            
-        except Exception as e:
-            print(f"yfinance数据获取失败: {e}")
+            source, key, df = self.sources.fetch(symbol, start, end, names, self.store)
+            return self._make_series(symbol, source, key, df)
+        except SourceUnavailable as e:
+            print(f"⚠️ {e}")
             return self._generate_simulated_data(symbol, period)
     
+    def _make_series(self, symbol, source, key, df):
+        """
+        把数据源返回的表（按 adjust 复权后）转换为紧凑的 OHLCVSeries（兼容原 stock_data 字典的访问方式）；
+        取不到复权因子时抛 SourceUnavailable
+        """
+        df = self.adjustments.adjust_frame(source, key, df, self.adjust)
+        return OHLCVSeries.from_frame(df,
+                                      symbol=key if source.name == 'yfinance' else symbol,
+                                      source=source.name,
+                                      info=self.metadata.info(source, key))
+    
+    def _fetch_yfinance_data(self, symbol, period):
+        """从yfinance获取国际股票数据"""
+        return self._fetch_from(['yfinance'], symbol, period)
+    
     def _fetch_akshare_data(self, symbol, period):
         """从AkShare获取A股数据"""
-        try:
-            # 处理A股代码格式
-            if symbol.startswith('6'):
-                symbol_ak = f"sh{symbol}"
-            elif symbol.startswith('0') or symbol.startswith('3'):
-                symbol_ak = f"sz{symbol}"
-            else:
-                symbol_ak = symbol
-            
-            # 计算时间范围
-            end_date = datetime.now().strftime('%Y%m%d')
-            if period == "1mo":
-                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
-            elif period == "3mo":
-                start_date = (datetime.now() - timedelta(days=90)).strftime('%Y%m%d')
-            elif period == "6mo":
-                start_date = (datetime.now() - timedelta(days=180)).strftime('%Y%m%d')
-            elif period == "1y":
-                start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
-            else:
-                start_date = (datetime.now() - timedelta(days=90)).strftime('%Y%m%d')
-            
-            # 获取A股数据
-            stock_data = ak.stock_zh_a_hist(symbol=symbol_ak[2:], 
-                                          period="daily", 
-                                          start_date=start_date, 
-                                          end_date=end_date,
-                                          adjust="")
-            
-            if stock_data.empty:
-                raise ValueError("AkShare未找到股票数据")
-            
-            # 处理数据格式
-            stock_data = stock_data.rename(columns={
-                '日期': 'date',
-                '开盘': 'open',
-                '最高': 'high',
-                '最低': 'low', 
-                '收盘': 'close',
-                '成交量': 'volume'
-            })
-            
-            stock_data['date'] = pd.to_datetime(stock_data['date'])
-            
-            return {
-                'symbol': symbol,
-                'data': stock_data[['date', 'open', 'high', 'low', 'close', 'volume']],
-                'info': {'currency': 'CNY', 'exchange': 'SSE/SZSE'},
-                'source': 'akshare'
-            }
-            
-        except Exception as e:
-            print(f"AkShare数据获取失败: {e}")
-            return self._generate_simulated_data(symbol, period)
+        return self._fetch_from(['akshare'], symbol, period)
     
     def _generate_simulated_data(self, symbol, period):
         """生成模拟数据（备用）"""
         print("📊 使用模拟数据...")
-        
-        # 根据周期确定数据点数
-        periods = {
-            "1d": 1, "5d": 5, "1mo": 21, "3mo": 63, 
-            "6mo": 126, "1y": 252, "2y": 504
-        }
-        n_points = periods.get(period, 63)
-        
-        # 生成日期范围
-        end_date = datetime.now()
-        dates = pd.date_range(end=end_date, periods=n_points, freq='D')
-        
-        # 生成价格数据
-        base_price = 100 + np.random.random() * 50
-        returns = np.random.normal(0, 0.02, n_points)
-        prices = base_price * np.exp(np.cumsum(returns))
-        
-        # 生成OHLC数据
-        data = []
-        for i, date in enumerate(dates):
-            close = prices[i]
-            open_price = close * (1 + np.random.normal(0, 0.01))
-            high = max(open_price, close) * (1 + abs(np.random.normal(0, 0.015)))
-            low = min(open_price, close) * (1 - abs(np.random.normal(0, 0.015)))
-            volume = np.random.randint(1000000, 10000000)
-            
-            data.append({
-                'date': date,
-                'open': max(open_price, 0.01),
-                'high': max(high, 0.01),
-                'low': max(low, 0.01),
-                'close': max(close, 0.01),
-                'volume': volume
-            })
-        
-        df = pd.DataFrame(data)
-        return {
-            'symbol': symbol,
-            'data': df,
-            'info': {'currency': 'USD', 'exchange': 'SIMULATED'},
-            'source': 'simulated'
-        }
+        start, end = period_to_range(period)
+        source, key, df = self.sources.fetch(symbol, start, end, ['simulated'], self.store)
+        return self._make_series(symbol, source, key, df)
     
     def calculate_technical_indicators(self, df):
-        """计算技术指标"""
-        closes = df['close'].values
-        highs = df['high'].values
-        lows = df['low'].values
-        opens = df['open'].values
-        
-        # 移动平均线
-        df['MA5'] = df['close'].rolling(window=5).mean()
-        df['MA10'] = df['close'].rolling(window=10).mean()
-        df['MA20'] = df['close'].rolling(window=20).mean()
-        
-        # RSI
-        df['RSI'] = self._calculate_rsi(closes, 14)
-        
-        # MACD
-        exp1 = df['close'].ewm(span=12).mean()
-        exp2 = df['close'].ewm(span=26).mean()
-        df['MACD'] = exp1 - exp2
-        df['MACD_Signal'] = df['MACD'].ewm(span=9).mean()
-        df['MACD_Histogram'] = df['MACD'] - df['MACD_Signal']
-        
-        # 布林带
-        df['BB_Middle'] = df['close'].rolling(window=20).mean()
-        bb_std = df['close'].rolling(window=20).std()
-        df['BB_Upper'] = df['BB_Middle'] + (bb_std * 2)
-        df['BB_Lower'] = df['BB_Middle'] - (bb_std * 2)
-        
-        # 成交量指标
-        df['Volume_MA20'] = df['volume'].rolling(window=20).mean()
-        
+        """计算技术指标；传入 OHLCVSeries 时指标保存在其 indicators 中并返回该序列"""
+        if isinstance(df, OHLCVSeries):
+            return df.compute_indicators()
+        indicators = compute_frame(df)
+        for name in indicators:
+            df[name] = indicators[name]
         return df
     
+    def calculate_universe_indicators(self, stock_data_list, processes=None):
+        """
+        一次性计算多只股票的技术指标，返回与输入顺序一致的 DataFrame 列表；
+        输入为 OHLCVSeries 时直接写入各自的 indicators 并返回这些序列。
+        processes > 1 时价格面板放入共享内存，由进程池按股票分块计算
+        """
+        stock_data_list = list(stock_data_list)
+        if all(isinstance(stock_data, OHLCVSeries) for stock_data in stock_data_list):
+            return compute_indicators_parallel(stock_data_list, processes)
+        frames = [stock_data['data'] for stock_data in stock_data_list]
+        if not processes or processes <= 1:
+            tables = compute_universe(frames)
+            for df, indicators in zip(frames, tables):
+                for name in indicators:
+                    df[name] = indicators[name]
+            return frames
+        length = max((len(df) for df in frames), default=0)
+        result = analyze_panel(build_panel(frames, 'close', length), build_panel(frames, 'volume', length), processes,
+                               high=build_panel(frames, 'high', length), low=build_panel(frames, 'low', length))
+        for i, df in enumerate(frames):
+            for name in result:
+                df[name] = result[name][i, length - len(df):]
+        return frames
+    
+    def resample(self, stock_data_list, rule="W"):
+        """
+        由日K线聚合出周/月等周期K线（rule 如 'W'、'M'、'Q'、'2W'），多只股票一次完成，
+        返回顺序一致的 OHLCVSeries 列表（不含指标，可再交给 calculate_universe_indicators）
+        """
+        return resample_many([OHLCVSeries.from_stock_data(stock_data) for stock_data in stock_data_list], rule)
+    
     def _calculate_rsi(self, prices, period=14):
         """计算RSI指标"""
-        deltas = np.diff(prices)
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        
-        avg_gains = np.zeros_like(prices)
-        avg_losses = np.zeros_like(prices)
-        
-        # 初始值
-        avg_gains[period] = np.mean(gains[:period])
-        avg_losses[period] = np.mean(losses[:period])
-        
-        # 计算RSI
-        for i in range(period+1, len(prices)):
-            avg_gains[i] = (avg_gains[i-1] * (period-1) + gains[i-1]) / period
-            avg_losses[i] = (avg_losses[i-1] * (period-1) + losses[i-1]) / period
-        
-        rs = avg_gains / avg_losses
-        rsi = 100 - (100 / (1 + rs))
-        rsi[:period] = 50  # 前period个数据设为50
-        
-        return rsi
+        return wilder_rsi(np.asarray(prices, dtype=float)[None, :], period)[0]
+    
+    def backtest(self, stock_data_list, strategy="ma_cross", cost=DEFAULT_COST, **params):
+        """
+        用历史数据检验指标信号，返回每只股票一行的绩效表（收益、回撤、胜率等）。
+        strategy: ma_cross(fast, slow) / rsi(period, lower, upper) / macd(fast, slow, signal)
+        """
+        stock_data_list = list(stock_data_list)
+        close = build_panel([as_columns(stock_data) for stock_data in stock_data_list], 'close')
+        return run_backtest(close, strategy, symbols=[stock_data['symbol'] for stock_data in stock_data_list],
+                            cost=cost, **params)
     
     def generate_report(self, stock_data, indicators_df):
         """生成分析报告"""
-        current_price = stock_data['data']['close'].iloc[-1]
-        prev_price = stock_data['data']['close'].iloc[-2] if len(stock_data['data']) > 1 else current_price
+        data = as_columns(stock_data)
+        close = np.asarray(data['close'])
+        current_price = float(close[-1])
+        prev_price = float(close[-2]) if len(close) > 1 else current_price
         change = current_price - prev_price
         change_pct = (change / prev_price) * 100
         
@@ -267,8 +206,8 @@ class StockAnalyzer:
             'current_price': current_price,
             'change': change,
             'change_pct': change_pct,
-            'volume': stock_data['data']['volume'].iloc[-1],
-            'data_points': len(stock_data['data']),
+            'volume': np.asarray(data['volume'])[-1].item(),
+            'data_points': len(close),
             'source': stock_data['source'],
             'currency': stock_data['info'].get('currency', 'USD'),
             'exchange': stock_data['info'].get('exchange', 'Unknown'),
@@ -276,77 +215,129 @@ class StockAnalyzer:
         }
         
         # 技术指标状态
-        if not indicators_df.empty:
-            latest = indicators_df.iloc[-1]
+        if indicators_df is not None and len(indicators_df):
+            def latest(name):
+                return float(np.asarray(indicators_df[name])[-1]) if name in indicators_df else None
+            
             report.update({
-                'ma5': latest.get('MA5', None),
-                'ma10': latest.get('MA10', None),
-                'ma20': latest.get('MA20', None),
-                'rsi': latest.get('RSI', None),
-                'macd': latest.get('MACD', None),
-                'bb_upper': latest.get('BB_Upper', None),
-                'bb_lower': latest.get('BB_Lower', None)
+                'ma5': latest('MA5'),
+                'ma10': latest('MA10'),
+                'ma20': latest('MA20'),
+                'rsi': latest('RSI'),
+                'macd': latest('MACD'),
+                'bb_upper': latest('BB_Upper'),
+                'bb_lower': latest('BB_Lower')
             })
         
         return report
     
-    def plot_stock_chart(self, stock_data, indicators_df, save_path=None):
-        """绘制股票图表"""
-        plt.style.use('seaborn-v0_8')
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), 
-                                      gridspec_kw={'height_ratios': [3, 1]})
-        
-        df = stock_data['data']
-        
-        # K线图
-        for i in range(len(df)):
-            date = df['date'].iloc[i]
-            open_p = df['open'].iloc[i]
-            high = df['high'].iloc[i]
-            low = df['low'].iloc[i]
-            close = df['close'].iloc[i]
-            
-            color = 'red' if close > open_p else 'green'
-            ax1.vlines(x=date, ymin=low, ymax=high, color=color, linewidth=1)
-            ax1.vlines(x=date, ymin=min(open_p, close), ymax=max(open_p, close), 
-                      color=color, linewidth=6)
-        
-        # 移动平均线
-        if 'MA5' in indicators_df.columns:
-            ax1.plot(df['date'], indicators_df['MA5'], label='MA5', linewidth=1, alpha=0.8)
-        if 'MA20' in indicators_df.columns:
-            ax1.plot(df['date'], indicators_df['MA20'], label='MA20', linewidth=1, alpha=0.8)
-        
-        ax1.set_title(f"{stock_data['symbol']} 股票价格走势", fontsize=14, fontweight='bold')
-        ax1.set_ylabel('价格', fontsize=12)
-        ax1.legend()
-        ax1.grid(True, alpha=0.3)
+    def plot_stock_chart(self, stock_data, indicators_df, save_path=None, dpi=300):
+        """绘制股票图表（复用同一个画布，K线批量绘制）"""
+        if self._renderer is None:
+            self._renderer = CandleRenderer()
         
-        # 成交量
-        colors = ['green' if df['close'].iloc[i] >= df['open'].iloc[i] else 'red' 
-                 for i in range(len(df))]
-        ax2.bar(df['date'], df['volume'], color=colors, alpha=0.7)
-        ax2.set_ylabel('成交量', fontsize=12)
-        ax2.grid(True, alpha=0.3)
-        
-        # 日期格式
-        for ax in [ax1, ax2]:
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
-            ax.xaxis.set_major_locator(mdates.WeekdayLocator(interval=2))
-        
-        plt.tight_layout()
+        fig = self._renderer.render(as_columns(stock_data), indicators_df,
+                                    title=f"{stock_data['symbol']} 股票价格走势",
+                                    save_path=save_path, dpi=dpi)
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
             print(f"📈 图表已保存至: {save_path}")
         else:
+            import matplotlib.pyplot as plt
             plt.show()
         
         return fig
+    
+    def plot_many_charts(self, items, processes=None, dpi=100):
+        """
+        批量绘制图表。items 为 (stock_data, indicators_df, save_path) 列表，
+        processes>1 时使用多进程（非交互后端）。返回保存成功的路径。
+        """
+        jobs = [(as_columns(stock_data), indicators_df, f"{stock_data['symbol']} 股票价格走势", save_path)
+                for stock_data, indicators_df, save_path in items]
+        return render_many(jobs, processes=processes, dpi=dpi)
+
+def _fetch_measured(analyzer, symbol, period, source):
+    """获取一只股票的数据并记录耗时、行数和字节数"""
+    with instrumentation.stage('fetch', symbol) as record:
+        stock_data = analyzer.fetch_stock_data(symbol, period, source=source)
+        if stock_data is not None:
+            data = as_columns(stock_data)
+            record.update(rows=len(data), bytes=instrumentation.frame_bytes(data))
+        return stock_data
 
-def main():
+def main(argv=None):
     """主函数 - 示例用法"""
-    analyzer = StockAnalyzer()
+    parser = argparse.ArgumentParser(description='股票分析工具')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='把按阶段/股票的运行指标汇总写入 JSON（默认不记录；只给 --profile 时写入 metrics.json）')
+    parser.add_argument('--track-memory', action='store_true',
+                        help='同时用 tracemalloc 统计各阶段峰值内存（明显变慢，与 --profile 同用时忽略）')
+    parser.add_argument('--profile', nargs='?', const='profile.prof', metavar='PATH',
+                        help='用 cProfile 运行并保存统计文件（默认 profile.prof）')
+    parser.add_argument('--force', action='store_true', help='忽略产物缓存，全部阶段重新执行')
+    parser.add_argument('--adjust', choices=('none', 'qfq', 'hfq'), default='none',
+                        help='A股复权方式：none 不复权（默认）、qfq 前复权、hfq 后复权')
+    args = parser.parse_args(argv)
+    
+    metrics = args.metrics or ('metrics.json' if args.profile else None)
+    if not metrics:
+        run(args.force, args.adjust)
+        return
+    
+    if args.track_memory and args.profile:
+        print("⚠️ --track-memory 与 --profile 同用时不统计内存（tracemalloc 会扭曲性能分析结果）")
+    recorder = instrumentation.enable(track_memory=args.track_memory and not args.profile)
+    try:
+        if args.profile:
+            instrumentation.profiled(run, args.profile, args.force, args.adjust)
+        else:
+            run(args.force, args.adjust)
+    finally:
+        recorder.write(metrics)
+        instrumentation.disable()
+        print(f"⏱️ 运行指标已写入 {metrics}" + (f"，性能分析结果: {args.profile}" if args.profile else ""))
+
+def _build_pipeline(analyzer, chart_paths):
+    """fetch → indicators → report/chart；行情内容和参数都未变化的阶段直接使用上次的产物"""
+    
+    def fetch(requests, inputs):
+        # 并发获取所有测试案例的数据，按各自数据源限速
+        prefetched = ConcurrentFetcher().fetch_many(
+            requests,
+            lambda req: _fetch_measured(analyzer, req[0], req[2], req[1]),
+            source_of=lambda req: req[1])
+        return [prefetched[req] for req in requests]
+    
+    def indicators(req, inputs):
+        stock_data = inputs['fetch']
+        with instrumentation.stage('indicators', stock_data['symbol'], rows=len(as_columns(stock_data))):
+            return analyzer.calculate_technical_indicators(stock_data)
+    
+    def report(req, inputs):
+        stock_data = inputs['indicators']
+        with instrumentation.stage('report', stock_data['symbol'], rows=len(as_columns(stock_data))):
+            report = analyzer.generate_report(stock_data, stock_data)
+        # 缓存的报告不带生成时间，命中缓存时打印的是本次运行的时间
+        report.pop('timestamp', None)
+        return report
+    
+    def chart(req, inputs, dpi):
+        stock_data = inputs['indicators']
+        with instrumentation.stage('chart', stock_data['symbol'], rows=len(as_columns(stock_data))):
+            analyzer.plot_stock_chart(stock_data, stock_data, chart_paths[req], dpi=dpi)
+        return chart_paths[req]
+    
+    return Pipeline([
+        Stage('fetch', fetch, batch=True, volatile=True),
+        Stage('indicators', indicators, deps=('fetch',), version='2'),
+        Stage('report', report, deps=('indicators',)),
+        Stage('chart', chart, deps=('indicators',), params={'dpi': 300}, valid=os.path.exists),
+    ], ArtifactCache(os.path.join("data_cache", "artifacts", "examples")))
+
+def run(force=False, adjust="none"):
+    """运行全部测试案例"""
+    analyzer = StockAnalyzer(adjust=adjust)
     
     # 测试不同数据源
     test_cases = [
@@ -355,23 +346,25 @@ def main():
         {"symbol": "TEST", "source": "simulated", "period": "1mo"}
     ]
     
+    requests = [(test['symbol'], test['source'], test['period']) for test in test_cases]
+    chart_paths = {req: f"stock_chart_{req[0]}_{i+1}.png" for i, req in enumerate(requests)}
+    pipeline = _build_pipeline(analyzer, chart_paths)
+    outputs = pipeline.run(requests, force=force)
+    run_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    pipeline.cache.prune(outputs.artifacts())
+    print("♻️ 阶段执行/缓存命中: " + ", ".join(f"{name} {s['run']}/{s['cached']}" for name, s in outputs.stats.items()))
+    
+    bundles = []
     for i, test in enumerate(test_cases):
         print(f"\n{'='*50}")
         print(f"测试案例 {i+1}: {test['symbol']} ({test['source']})")
         print(f"{'='*50}")
         
-        # 设置数据源
-        analyzer.set_data_source(test['source'])
-        
-        # 获取数据
-        stock_data = analyzer.fetch_stock_data(test['symbol'], test['period'])
+        req = requests[i]
+        stock_data = outputs.value('indicators', req)
         
         if stock_data is not None:
-            # 计算技术指标
-            indicators_df = analyzer.calculate_technical_indicators(stock_data['data'])
-            
-            # 生成报告
-            report = analyzer.generate_report(stock_data, indicators_df)
+            report = outputs.value('report', req)
             
             # 打印报告
             print(f"📊 股票代码: {report['symbol']}")
@@ -379,17 +372,23 @@ def main():
             print(f"📈 涨跌幅: {report['change_pct']:+.2f}%")
             print(f"📅 数据点数: {report['data_points']}")
             print(f"🌐 数据源: {report['source']}")
-            print(f"⏰ 更新时间: {report['timestamp']}")
+            print(f"⏰ 更新时间: {run_time}")
             
             if report['rsi'] is not None:
                 rsi_status = "超买" if report['rsi'] > 70 else "超卖" if report['rsi'] < 30 else "正常"
                 print(f"📊 RSI(14): {report['rsi']:.1f} ({rsi_status})")
             
-            # 绘制图表（保存为文件）
-            chart_path = f"stock_chart_{test['symbol']}_{i+1}.png"
-            analyzer.plot_stock_chart(stock_data, indicators_df, chart_path)
+            # 图表在流水线中绘制（保存为文件），行情未变化时沿用上次的文件
+            print(f"📈 图表: {outputs.value('chart', req)}")
+            bundles.append((stock_data['symbol'], stock_data, stock_data))
             
         print(f"{'='*50}")
+    
+    # 导出K线网页使用的预计算数据包
+    if bundles:
+        with instrumentation.stage('export', rows=len(bundles)):
+            export_bundles(bundles, out_dir="data", timeframes=("W", "M"))
+        print(f"🌐 网页数据包已导出至 data/ ({len(bundles)} 只股票)")
 
 if __name__ == "__main__":
     print("🚀 股票分析工具启动...")
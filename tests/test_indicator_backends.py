@@ -0,0 +1,52 @@
+"""NumPy 与 TA-Lib 指标后端的一致性（未安装 TA-Lib 时跳过）"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+pytest.importorskip('talib')
+
+from indicators import EXTENDED_COLUMNS, INDICATOR_COLUMNS, compute_frame, compute_universe  # noqa: E402
+from simulation import simulate_market  # noqa: E402
+
+TOLERANCE = 1e-8
+N_SYMBOLS, N_BARS = 6, 400
+
+
+def _assert_close(expected, actual, name):
+    x, y = np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64)
+    np.testing.assert_array_equal(np.isnan(x), np.isnan(y), err_msg=f"{name} 的 NaN 位置不一致")
+    both = ~np.isnan(x)
+    error = np.max(np.abs(x[both] - y[both]) / np.maximum(np.abs(x[both]), 1.0), initial=0.0)
+    assert error <= TOLERANCE, f"{name} 最大相对误差 {error:.2e}"
+
+
+@pytest.fixture(scope='module')
+def frames():
+    # 一半股票截短（面板左侧补 NaN），一只股票中间停牌一天
+    market = simulate_market(N_SYMBOLS, N_BARS, seed=7)
+    frames = [market.frame(i).iloc[(i % 2) * N_BARS // 3:].reset_index(drop=True) for i in range(N_SYMBOLS)]
+    frames[0].loc[N_BARS // 2, ['open', 'high', 'low', 'close']] = np.nan
+    return frames
+
+
+@pytest.mark.parametrize('name', INDICATOR_COLUMNS + EXTENDED_COLUMNS)
+def test_universe_parity(frames, name):
+    expected = compute_universe(frames, backend='numpy')
+    actual = compute_universe(frames, backend='talib')
+    for i, (x, y) in enumerate(zip(expected, actual)):
+        assert name in x.columns and name in y.columns
+        _assert_close(x[name], y[name], f"{name}[{i}]")
+
+
+def test_frame_parity(frames):
+    df = frames[1]
+    expected = compute_frame(df, backend='numpy')
+    actual = compute_frame(df, backend='talib')
+    assert list(expected.columns) == list(actual.columns)
+    for name in expected.columns:
+        _assert_close(expected[name], actual[name], name)